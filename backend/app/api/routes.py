@@ -1,15 +1,19 @@
 """API routes for the application."""
 
+import io
 import os
 import uuid
 import logging
+from collections import Counter
 from pathlib import Path
 from typing import List, Optional
 from datetime import datetime
 from urllib.parse import quote
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, BackgroundTasks
-from fastapi.responses import FileResponse
+import psutil
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
 
 from app.models import (
     VoiceProfile,
@@ -22,49 +26,224 @@ from app.models import (
     TaskResponse,
     ScriptOptimizationRequest,
 )
-from app.services import VoiceService, AudioService, LLMService
 from app.config import settings
+from app.services import batch_service
+from app.services.batch_service import BatchJob
+from app.services.container import services
+from app.services.checkpoint_service import (
+    STATE_CANCELLED,
+    STATE_FAILED,
+    STATE_RUNNING,
+    TaskCheckpoint,
+)
+from app.services.generation_scheduler import (
+    PRIORITIES,
+    PRIORITY_PREVIEW,
+    GenerationCancelled,
+    GenerationScheduler,
+)
+from app.services.model_registry import configured_models
+from app.services.project_render_service import ProjectRender
+from app.services.quality_presets import DEFAULT_PRESET, preset_stats
+from app.services.singleflight import SingleFlight, request_fingerprint
+from app.services.thread_budget import thread_budget
+from app.tracing import tracer, request_id_var
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api")
 
-voice_service = VoiceService()
-audio_service = AudioService()
-llm_service = LLMService()
+# Built on first use (see container); importing this module loads no model
+voice_service = services.proxy("voice")
+audio_service = services.proxy("audio")
+llm_service = services.proxy("llm")
 
 
 # In-memory task store
 tasks: dict[str, dict] = {}
 
+# Identical requests submitted while a job is pending or running share it
+generation_jobs = SingleFlight(tasks)
+
+def _init_generation_thread():
+    # Without the engine call queue these threads run the model, so they take the CPU slots
+    if voice_service.service.call_queue is None:
+        thread_budget.pin_current_thread()
+
+
+def _release_generation_thread():
+    thread_budget.release_current_thread()
+
+
+# Bounded set of generation workers; requests beyond this queue as PENDING,
+# interactive ones first.
+generation_scheduler = GenerationScheduler(
+    workers=settings.GENERATION_WORKERS,
+    thread_name_prefix="generation",
+    initializer=_init_generation_thread,
+    finalizer=_release_generation_thread,
+)
+
 def process_generation(task_id: str, request: GenerationRequest):
-    """Background task wrapper for generation."""
+    """Background task wrapper for generation.
+
+    `task_id` is the job id: the task that opened the job. Tasks attached
+    to it later see every state change through generation_jobs.
+    """
+    task_checkpoint = TaskCheckpoint(task_id)
+    if not task_checkpoint.exists():
+        task_checkpoint = None
+
+    with tracer.span(
+        "process_generation",
+        task_id=task_id,
+        request_id=tasks[task_id].get("request_id"),
+        text_length=len(request.text),
+        voice_id=request.voice_id,
+        checkpointed=task_checkpoint is not None,
+    ) as span:
+        try:
+            _run_generation(task_id, request, task_checkpoint)
+        finally:
+            job = generation_jobs.finish(task_id)
+            # No job left means every task sharing it was cancelled
+            status = job["status"] if job else TaskStatus.CANCELLED
+            span.set_attribute("status", status.value)
+            span.set_attribute("ref_count", len(job["task_ids"]) if job else 0)
+            if task_checkpoint is not None:
+                if status == TaskStatus.COMPLETED:
+                    task_checkpoint.discard()
+                else:
+                    # Kept for POST /tasks/{id}/resume
+                    task_checkpoint.set_state(
+                        STATE_CANCELLED if status == TaskStatus.CANCELLED else STATE_FAILED
+                    )
+                    task_checkpoint.release()
+
+
+def _request_quality(request: GenerationRequest) -> str:
+    if request.quality:
+        return request.quality
+    return settings.PREVIEW_QUALITY_PRESET if request.preview else DEFAULT_PRESET
+
+
+def _request_model(request: GenerationRequest) -> Optional[str]:
+    if request.model:
+        return request.model
+    return (settings.PREVIEW_MODEL or None) if request.preview else None
+
+
+def _submit_generation(task_id: str, request: GenerationRequest) -> dict:
+    """Attach `task_id` to an identical in-flight job, or schedule a new one."""
+    job, created = generation_jobs.attach(request_fingerprint(request), task_id)
+    if not created:
+        print(f"--- [Backend] Task {task_id} attached to in-flight job {job['job_id']} ---")
+        task_checkpoint = TaskCheckpoint(task_id)
+        if task_checkpoint.exists():
+            # A resumed task served by another job: its own checkpoint is not run,
+            # so no teardown would hand it back. It stays resumable.
+            task_checkpoint.set_state(STATE_CANCELLED)
+            task_checkpoint.release()
+        return job
+
+    # Previews are a single sentence; nothing worth checkpointing
+    checkpointed = not request.preview and 0 <= settings.CHECKPOINT_MIN_CHARS <= len(request.text)
+    if checkpointed and not TaskCheckpoint(task_id).exists():
+        TaskCheckpoint.create(
+            task_id, request.model_dump(mode="json"), tasks[task_id]["created_at"],
+            tasks[task_id].get("request_id"),
+        )
+    generation_scheduler.submit(
+        process_generation, task_id, request,
+        priority=PRIORITY_PREVIEW if request.preview else PRIORITIES[request.priority], job_id=task_id,
+    )
+    return job
+
+
+def resume_interrupted_tasks() -> int:
+    """Re-register checkpointed tasks after a restart and resume running ones.
+
+    Cancelled and failed tasks come back with their status so they can
+    still be resumed explicitly. Returns how many tasks were resumed.
+    """
+    resumed = 0
+    for task_checkpoint in TaskCheckpoint.load_all():
+        task = task_checkpoint.task()
+        if task is not None and task["state"] == STATE_RUNNING:
+            # Every worker process runs this at startup; only one may resume each task
+            if not task_checkpoint.claim():
+                continue
+            # Re-read: the previous owner may have finished it meanwhile
+            task = task_checkpoint.task()
+            if task is None or task["state"] != STATE_RUNNING:
+                task_checkpoint.release()
+                continue
+        try:
+            request = GenerationRequest(**task["request"])
+        except Exception as e:
+            logger.warning(f"Dropping checkpoint {task_checkpoint.task_id}: {e}")
+            task_checkpoint.discard()
+            continue
+
+        task_id = task_checkpoint.task_id
+        running = task["state"] == STATE_RUNNING
+        tasks[task_id] = {
+            "task_id": task_id,
+            "status": TaskStatus.PENDING if running else (
+                TaskStatus.CANCELLED if task["state"] == STATE_CANCELLED else TaskStatus.FAILED
+            ),
+            "created_at": datetime.fromisoformat(task["created_at"]),
+            "result": None,
+            "error": None if running else "Interrupted; resumable from checkpoint",
+            "request_id": task.get("request_id"),
+            "job_id": task_id,
+            "ref_count": 1,
+        }
+        if running:
+            _submit_generation(task_id, request)
+            resumed += 1
+
+    if resumed:
+        print(f"--- [Backend] Resuming {resumed} interrupted generation task(s) from checkpoints ---")
+    return resumed
+
+
+def _run_generation(task_id: str, request: GenerationRequest, task_checkpoint: Optional[TaskCheckpoint] = None):
     try:
-        tasks[task_id]["status"] = TaskStatus.PROCESSING
+        generation_jobs.update(task_id, status=TaskStatus.PROCESSING)
         print(f"\n--- [Backend] Starting background generation task: {task_id} ---")
         
         # Get voice profile
         voice_profile = voice_service.get_voice_profile(request.voice_id)
         voice_name = voice_profile.name if voice_profile else "unknown"
 
+        quality = _request_quality(request)
+        model = _request_model(request)
+        text = voice_service.service.preview_text(request.text) if request.preview else request.text
+        if request.preview:
+            print(f"--- [Backend] Preview ({quality}, model {model or 'default'}): {text[:60]} ---")
+
         # Generate speech (Heavy CPU task)
-        # Note: run_in_threadpool is handled automatically by FastAPI BackgroundTasks for sync functions,
-        # but here we are calling sync function inside a sync wrapper.
-        # Ideally, we should confirm voice_service.generate_speech is blocking. 
-        # Since it is, running it here in background task (which runs in threadpool) is correct.
+        # This runs on a generation_scheduler worker thread, so blocking here is fine.
         
         gen_result = voice_service.generate_speech(
-            text=request.text,
+            text=text,
             voice_id=request.voice_id,
             num_speakers=request.num_speakers,
             cfg_scale=request.cfg_scale,
             guest_voice_id=request.guest_voice_id,
             speed=request.speed,
             pitch=request.pitch,
+            pitch_unit=request.pitch_unit,
+            # A preview's one sentence must not replace the project's line manifest
+            project_id=None if request.preview else request.project_id,
+            latency_mode=request.priority,
+            task_checkpoint=task_checkpoint,
+            quality=quality,
+            model=model,
         )
 
         if gen_result is None:
-             tasks[task_id]["status"] = TaskStatus.FAILED
-             tasks[task_id]["error"] = "Speech generation failed"
+             generation_jobs.update(task_id, status=TaskStatus.FAILED, error="Speech generation failed")
              return
 
         audio_array, actual_sr = gen_result
@@ -78,6 +257,8 @@ def process_generation(task_id: str, request: GenerationRequest):
             filename = f"{base_name}.wav"
         else:
             filename = f"{voice_name}_{timestamp}.wav"
+        if request.preview:
+            filename = f"{filename[:-4]}_preview.wav"
 
         filepath = audio_service.save_audio(audio_array, filename=filename, sample_rate=actual_sr)
         logger.info(f"Saved generated audio to: {filepath} at {actual_sr}Hz")
@@ -97,7 +278,7 @@ def process_generation(task_id: str, request: GenerationRequest):
 
         # Save metadata
         audio_service.save_audio_metadata(
-            filename, voice_name, duration, request.text[:100]
+            filename, voice_name, duration, text[:100]
         )
         
         # Prepare success result
@@ -109,24 +290,27 @@ def process_generation(task_id: str, request: GenerationRequest):
             message="Audio generated successfully",
         )
         
-        tasks[task_id]["status"] = TaskStatus.COMPLETED
-        tasks[task_id]["result"] = result
+        generation_jobs.update(task_id, status=TaskStatus.COMPLETED, result=result)
         print(f"--- [Backend] Task {task_id} completed successfully ---")
 
+    except GenerationCancelled:
+        # Every task was detached (and marked cancelled) by DELETE /tasks
+        print(f"--- [Backend] Task {task_id} cancelled ---")
     except Exception as e:
         logger.error(f"Background generation error: {e}")
-        tasks[task_id]["status"] = TaskStatus.FAILED
-        tasks[task_id]["error"] = str(e)
+        generation_jobs.update(task_id, status=TaskStatus.FAILED, error=str(e))
 
 @router.get("/voices", response_model=List[VoiceProfile])
-async def get_voices(search: Optional[str] = Query(None)):
-    """Get all voice profiles with optional search."""
-    voices = voice_service.get_voice_profiles()
-
-    if search:
-        search_lower = search.lower()
-        voices = [v for v in voices if search_lower in v.name.lower()]
-
+async def get_voices(
+    response: Response,
+    search: Optional[str] = Query(None),
+    type: Optional[VoiceType] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """Get voice profiles with optional search, type filter and pagination."""
+    voices, total = voice_service.search_voice_profiles(search, type, offset, limit)
+    response.headers["X-Total-Count"] = str(total)
     return voices
 
 
@@ -164,23 +348,17 @@ async def upload_voice(file: UploadFile = File(...), name: str = Form(...)):
                 400, f"File too large. Max {settings.MAX_AUDIO_SIZE_MB}MB"
             )
 
-        # save raw
         raw_path = settings.VOICES_DIR / f"{name}_{uuid.uuid4().hex[:8]}{file_ext}"
         settings.VOICES_DIR.mkdir(exist_ok=True, parents=True)
-        with open(raw_path, "wb") as f:
-            f.write(content)
-        logger.info(f"Saved voice file to: {raw_path}")
-
-        # convert to wav if needed
         final_path = raw_path
-        if file_ext != ".wav":
-            wav_path = raw_path.with_suffix(".wav")
-            audio_service.convert_to_wav(str(raw_path), str(wav_path))
-            try:
-                os.remove(raw_path)
-            except Exception:
-                pass
-            final_path = wav_path
+        if file_ext == ".wav":
+            with open(raw_path, "wb") as f:
+                f.write(content)
+            logger.info(f"Saved voice file to: {raw_path}")
+        else:
+            # decode straight from the upload bytes; the raw file is never written
+            final_path = raw_path.with_suffix(".wav")
+            audio_service.convert_to_wav(io.BytesIO(content), str(final_path))
             logger.info(f"Converted to WAV: {final_path}")
 
         profile = await voice_service.enroll_voice(
@@ -266,7 +444,10 @@ async def record_voice(recording: AudioRecording):
 
 
 @router.post("/generate", response_model=TaskResponse)
-async def generate_speech(request: GenerationRequest, background_tasks: BackgroundTasks):
+async def generate_speech(request: GenerationRequest):
+    model = _request_model(request)
+    if model and model not in configured_models():
+        raise HTTPException(400, f"Unknown model '{model}' (available: {', '.join(configured_models())})")
     try:
         print(f"\n--- [Backend] Received Generation Request ---")
         print(f"Text length: {len(request.text)}")
@@ -278,15 +459,12 @@ async def generate_speech(request: GenerationRequest, background_tasks: Backgrou
             "status": TaskStatus.PENDING,
             "created_at": datetime.now(),
             "result": None,
-            "error": None
+            "error": None,
+            "request_id": request_id_var.get(),
         }
-        
-        background_tasks.add_task(process_generation, task_id, request)
-        
-        return TaskResponse(
-            task_id=task_id,
-            status=TaskStatus.PENDING
-        )
+
+        _submit_generation(task_id, request)
+        return TaskResponse(**tasks[task_id])
 
     except Exception as e:
         logger.error(f"Generation request error: {e}")
@@ -302,6 +480,97 @@ async def get_task_status(task_id: str):
     return TaskResponse(**task_data)
 
 
+@router.delete("/tasks/{task_id}", response_model=TaskResponse)
+async def cancel_task(task_id: str):
+    """Cancel a pending or running task.
+
+    The task is detached from its job at once. The job stops at its next
+    sub-chunk boundary once no other task shares it.
+    """
+    if task_id not in tasks:
+        raise HTTPException(404, "Task not found")
+    if tasks[task_id]["status"] not in (TaskStatus.PENDING, TaskStatus.PROCESSING):
+        raise HTTPException(409, f"Task is already {tasks[task_id]['status'].value}")
+
+    job_id = tasks[task_id]["job_id"]
+    remaining = generation_jobs.detach(task_id, status=TaskStatus.CANCELLED, error="Cancelled by user")
+    if remaining == 0:
+        job = generation_scheduler.cancel(job_id)
+        if job is not None and not job.started:
+            # Never reaches process_generation, whose teardown would hand the checkpoint back
+            task_checkpoint = TaskCheckpoint(job_id)
+            task_checkpoint.set_state(STATE_CANCELLED)
+            task_checkpoint.release()
+    print(f"--- [Backend] Task {task_id} cancelled ({remaining} task(s) still share job {job_id}) ---")
+    return TaskResponse(**tasks[task_id])
+
+
+@router.post("/tasks/{task_id}/resume", response_model=TaskResponse)
+async def resume_task(task_id: str):
+    """Continue a cancelled or failed task from its checkpoint."""
+    if task_id not in tasks:
+        raise HTTPException(404, "Task not found")
+    if tasks[task_id]["status"] not in (TaskStatus.CANCELLED, TaskStatus.FAILED):
+        raise HTTPException(409, f"Task is {tasks[task_id]['status'].value}")
+
+    task_checkpoint = TaskCheckpoint(task_id)
+    task = task_checkpoint.task()
+    if task is None:
+        raise HTTPException(409, "Task has no checkpoint to resume from")
+    if not task_checkpoint.claim():
+        raise HTTPException(409, "Task is being resumed by another worker")
+
+    task_checkpoint.set_state(STATE_RUNNING)
+    tasks[task_id].update(status=TaskStatus.PENDING, result=None, error=None)
+    print(f"--- [Backend] Resuming task {task_id} ({len(task_checkpoint.units)} units done) ---")
+    _submit_generation(task_id, GenerationRequest(**task["request"]))
+    return TaskResponse(**tasks[task_id])
+
+
+@router.post("/generate/batch")
+async def generate_batch(
+    file: UploadFile = File(...),
+    voice_id: Optional[str] = Form(None),
+):
+    """Generate many independent utterances from a CSV/JSONL file.
+
+    Columns/keys: id, text, voice (or voice_id), emotion, speed. `voice_id`
+    is used for rows without a voice. Streams one NDJSON line per finished
+    row, then a summary line with the archive URL.
+    """
+    content = await file.read()
+    try:
+        rows = batch_service.parse_batch_rows(content, file.filename, default_voice_id=voice_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"Invalid batch file: {e}")
+
+    print(f"\n--- [Backend] Received batch of {len(rows)} rows ---")
+    job = BatchJob(rows, voice_service)
+    job.start(generation_scheduler)
+    return StreamingResponse(
+        job.stream(), media_type="application/x-ndjson", headers={"X-Batch-ID": job.batch_id}
+    )
+
+
+@router.get("/batches/{batch_id}/archive")
+async def get_batch_archive(batch_id: str):
+    if not batch_id.isalnum():
+        raise HTTPException(400, "Invalid batch id")
+    archive = BatchJob.archive_path(batch_id)
+    if not archive.exists():
+        raise HTTPException(404, "Archive not found")
+    return FileResponse(archive, media_type="application/zip", filename=f"batch_{batch_id}.zip")
+
+
+@router.get("/projects/{project_id}")
+async def get_project_manifest(project_id: str):
+    """Render manifest of a project: script lines and their spans in the last output."""
+    manifest = ProjectRender.load_manifest(project_id)
+    if manifest is None:
+        raise HTTPException(404, "Project not found")
+    return manifest
+
+
 @router.post("/generate/file")
 async def generate_from_file(
     file: UploadFile = File(...),
@@ -465,10 +734,73 @@ async def get_audio(filename: str):
     )
 
 
+@router.get("/presets")
+async def get_quality_presets():
+    """Speed/quality presets with the knobs they set and their measured real-time factor."""
+    return {
+        "default": DEFAULT_PRESET,
+        "preview_default": settings.PREVIEW_QUALITY_PRESET,
+        "presets": preset_stats.describe(
+            voice_service.service.preset_knobs if services.loaded("voice") else []
+        ),
+    }
+
+
+@router.get("/models")
+async def get_models():
+    """Configured model variants with residency and per-model request metrics."""
+    if not services.loaded("voice"):
+        return {
+            "budget_mb": settings.MODEL_MEMORY_BUDGET_MB or None,
+            "models": {
+                name: {"model_dir": str(path), "state": "not_created"}
+                for name, path in configured_models().items()
+            },
+        }
+    return voice_service.models.describe()
+
+
+@router.get("/ready")
+async def readiness_check():
+    """200 once the voice engine is loaded, 503 while it is still starting.
+
+    A probe arriving before anything loaded the engine starts loading it.
+    """
+    if not services.loaded("voice"):
+        services.warm_up(["voice"])
+        raise HTTPException(503, "Voice engine not loaded yet")
+    if voice_service.service.describe_residency()["state"] == "failed":
+        raise HTTPException(503, "Voice engine failed to load")
+    return {"ready": True, "services": services.describe()}
+
+
 @router.get("/health")
 async def health_check():
+    task_counts = Counter(t["status"].value for t in list(tasks.values()))
+    # Reported without forcing a model load: health must answer during startup
+    engine = voice_service.service if services.loaded("voice") else None
+    call_queue = engine.call_queue if engine else None
+    chunk_costs = engine.chunk_costs if engine else None
+    prompt_cache = engine.prompt_cache if engine else None
+    text_cache = engine.text_cache if engine else None
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "model_loaded": voice_service.is_model_loaded(),
+        "model_loaded": engine is not None and engine.model is not None,
+        "services": services.describe(),
+        "model_weights": engine.weights.describe() if engine and engine.weights else None,
+        "model_residency": engine.describe_residency() if engine else None,
+        "models": voice_service.models.describe() if engine else None,
+        "generation_workers": settings.GENERATION_WORKERS,
+        "engine_call_queue": call_queue.stats() if call_queue else None,
+        "generation_jobs": generation_jobs.stats(),
+        "scheduler": generation_scheduler.stats(),
+        "cpu_layout": thread_budget.describe(),
+        "chunk_cost_model": chunk_costs.describe() if chunk_costs else None,
+        "prompt_cache": prompt_cache.stats() if prompt_cache else None,
+        "text_frontend_cache": text_cache.stats() if text_cache else None,
+        "preset_rtf": {p["name"]: p["measured_rtf"] for p in preset_stats.describe([])},
+        "trace_exports_dropped": tracer.dropped_exports,
+        "tasks": {"total": len(tasks), **task_counts},
+        "rss_mb": round(psutil.Process().memory_info().rss / 1e6, 1),
     }
@@ -1,6 +1,7 @@
 """Configuration module for Lyrebird application."""
 
 from pathlib import Path
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -37,11 +38,23 @@ class Settings(BaseSettings):
     OUTPUTS_DIR: Path = BASE_DIR / "outputs"
     UPLOADS_DIR: Path = BASE_DIR / "uploads"
     PROMPT_DIR: Path = BASE_DIR / "prompt"
+    PROJECTS_DIR: Path = BASE_DIR / "projects"  # per-project render manifests and line audio
+    CHECKPOINTS_DIR: Path = BASE_DIR / "checkpoints"  # per-task progress of long generations
+    VOICE_MANIFEST_PATH: Optional[Path] = None  # defaults to VOICES_DIR/manifest.json
 
     # Audio settings
     SAMPLE_RATE: int = 48000
     MAX_AUDIO_SIZE_MB: int = 50
     SUPPORTED_FORMATS: list = [".wav", ".mp3", ".m4a", ".flac", ".ogg"]
+    AUDIO_DECODE_BLOCK_SIZE: int = 65536  # frames per decode/resample block
+    EFFECTS_WORKERS: int = 2  # threads for speed/pitch processing
+    EFFECTS_BLOCK_FRAMES: int = 512  # WSOLA frames aligned per batch (bounds memory)
+
+    # Loudness normalisation of generated speech (per speaker, streaming)
+    LOUDNESS_NORMALIZE: bool = True
+    LOUDNESS_TARGET_LUFS: float = -16.0
+    LOUDNESS_TRUE_PEAK_DB: float = -1.0  # dBTP ceiling of the limiter
+    LOUDNESS_LOOKAHEAD_MS: float = 5.0
 
     # Voice Enrollment settings
     PUBLIC_URL: str = "" # Set this to your ngrok/public URL if using cloud API
@@ -51,7 +64,7 @@ class Settings(BaseSettings):
     OSS_BUCKET: str = ""
     OSS_ENDPOINT: str = ""
 
-    # keep non-blocking startup
+    # Load the voice model in the background at startup (else on first use or readiness probe)
     LOAD_MODEL_ON_STARTUP: bool = False
 
     # Silence HF tokenizers fork/parallelism warning
@@ -62,12 +75,86 @@ class Settings(BaseSettings):
     Lyrebird_BASE_DIR: Path = BASE_DIR / "CosyVoice"
     MODEL_DIR: Path = BASE_DIR / "pretrained_models" / "Fun-CosyVoice3-0.5B"
     LOCAL_DEVICE: str = "cpu" # Mac usually uses CPU for stability, or "mps" if compatible
+    # Map converted checkpoints read-only so all worker processes share one copy (CPU only)
+    MODEL_WEIGHTS_MMAP: bool = True
+    MODEL_WEIGHTS_CACHE_DIR: Path = BASE_DIR / "pretrained_models" / ".mmap"
+    # Extra model variants by name (JSON in env); MODEL_DIR is served as "default"
+    MODEL_VARIANTS: Dict[str, Path] = {}
+    PREVIEW_MODEL: str = "" # Variant used for preview renders that name no model
+    # Total memory for resident models; least recently used idle ones are unloaded beyond it (0 = unlimited)
+    MODEL_MEMORY_BUDGET_MB: float = 0.0
+    # Expected MB per variant, used by the budget before its first load (JSON in env)
+    MODEL_SIZES_MB: Dict[str, float] = {}
+
+    # Engine backend: "local" (CosyVoice) or "stub" (deterministic synthetic audio, no weights)
+    VOICE_ENGINE: str = "local"
+    STUB_SAMPLE_RATE: int = 24000
+    STUB_LATENCY_SEC: float = 0.05 # Fixed overhead per model call
+    STUB_RTF: float = 0.3 # Compute seconds per second of audio produced
+    STUB_CHARS_PER_SEC: float = 15.0 # Speaking rate used to size synthetic audio
+    STUB_PROMPT_SEC: float = 0.05 # Reference-clip feature extraction per uncached call
+    STUB_NORMALIZE_SEC: float = 0.01 # Text normalisation per call
+
+    # Release the model (and its caches) after this many seconds without requests; 0 keeps it loaded
+    MODEL_IDLE_UNLOAD_SEC: float = 0.0
+
+    # Number of generation tasks that may run concurrently
+    GENERATION_WORKERS: int = 2
+
+    # Queue model calls onto ENGINE_WORKERS threads; calls still run one at a time (no batched
+    # forward pass). Off (default): each generation worker calls the model directly
+    ENGINE_CALL_QUEUE: bool = False
+    ENGINE_CALL_QUEUE_WINDOW_MS: float = 5.0 # Calls collected this long run grouped by voice
+
+    # CPU partitioning of the threads that run the model (see calibrate_threads.py)
+    ENGINE_WORKERS: int = 1 # Engine threads behind the call queue (when enabled), each with its own cores
+    ENGINE_THREADS_PER_WORKER: int = 0 # Intra-op threads (and cores) per worker; 0 = split evenly
+    ENGINE_INTEROP_THREADS: int = 1
+    ENGINE_PIN_CPUS: bool = True # Bind each worker to its cores / NUMA node (Linux)
+
+    # Adaptive sub-chunk sizing from a learned per-call cost model
+    CHUNK_ADAPTIVE: bool = True
+    CHUNK_COST_MODEL_PATH: Optional[Path] = BASE_DIR / "data" / "chunk_cost_model.json"
+    CHUNK_FIRST_AUDIO_TARGET_SEC: float = 1.0 # Interactive: latency budget of the first model call
+    CHUNK_MIN_CHARS: int = 20
+    CHUNK_MAX_CHARS: int = 300
+
+    # Checkpointed generation: tasks this long save each model call and resume after a restart
+    CHECKPOINT_MIN_CHARS: int = 500 # 0 checkpoints every task; negative disables
+    CHECKPOINT_RETENTION_HOURS: float = 24.0 # Cancelled/failed checkpoints kept for explicit resume
+
+    # Prompt features (instruction tokens, reference clip tokens/embedding) kept per voice and instruction
+    PROMPT_CACHE_MAX_MB: float = 256.0 # 0 disables
+
+    # Memoised text normalisation/tokenisation; the SQLite tier is shared by worker processes
+    TEXT_CACHE_MAX_ENTRIES: int = 50000 # In-memory LRU size; 0 disables
+    TEXT_CACHE_PATH: Optional[Path] = BASE_DIR / "data" / "text_frontend_cache.sqlite3" # None: memory only
+    TEXT_CACHE_DISK_MAX_ENTRIES: int = 500000
+
+    # Speed/quality presets (draft, standard, studio; see GET /api/presets)
+    DEFAULT_QUALITY_PRESET: str = "standard"
+    PREVIEW_QUALITY_PRESET: str = "draft" # Used by preview requests that name no preset
+
+    # Batch generation (/api/generate/batch)
+    BATCH_MAX_ROWS: int = 10000
+    BATCH_GROUP_SIZE: int = 32  # rows of one voice scheduled as a single job
+
+    # Tracing settings
+    TRACING_ENABLED: bool = True
+    TRACE_EXPORT_PATH: Optional[Path] = None # OTLP/JSON lines file (opt-in), e.g. traces/spans.jsonl
+    TRACE_COLLECTOR_URL: str = "" # OTLP/HTTP collector, e.g. http://localhost:4318
+    SLOW_TASK_THRESHOLD_SEC: float = 60.0
+    SLOW_TASK_LOG_PATH: Optional[Path] = BASE_DIR / "traces" / "slow_tasks.jsonl"
+    TRACE_FILE_MAX_MB: float = 100.0 # Trace and slow-task files rotate to <name>.1 past this; 0 = never
 
     class Config:
         env_file = ".env"
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # Derived here so a VOICES_DIR override also moves the manifest
+        if self.VOICE_MANIFEST_PATH is None:
+            self.VOICE_MANIFEST_PATH = self.VOICES_DIR / "manifest.json"
         # Create directories if they don't exist
         self.VOICES_DIR.mkdir(exist_ok=True)
         self.OUTPUTS_DIR.mkdir(exist_ok=True)
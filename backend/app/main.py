@@ -4,8 +4,10 @@ import os
 # Force MPS fallback for unimplemented operators before any torch imports
 os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"
 
+import uuid
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
@@ -13,6 +15,9 @@ from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
 from app.api import router
+from app.api.routes import resume_interrupted_tasks
+from app.services.container import services
+from app.tracing import request_id_var
 
 # Configure logging
 logging.basicConfig(
@@ -28,11 +33,21 @@ class EndpointFilter(logging.Filter):
 
 logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model in the background; /api/ready reports when it is done
+    if settings.LOAD_MODEL_ON_STARTUP:
+        services.warm_up(["voice"])
+    # Pick up long generations interrupted by a crash or deploy
+    resume_interrupted_tasks()
+    yield
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="Beautiful AI Voice Synthesis Application",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -44,6 +59,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Propagate a request id into traces and echo it back to the client
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Include API routes
 app.include_router(router)
 
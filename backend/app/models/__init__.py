@@ -3,6 +3,7 @@
 from .voice_model import (
     VoiceProfile,
     GenerationRequest,
+    BatchRow,
     GenerationResponse,
     AudioRecording,
     VoiceType,
@@ -17,6 +18,7 @@ from .voice_model import (
 __all__ = [
     "VoiceProfile",
     "GenerationRequest",
+    "BatchRow",
     "GenerationResponse",
     "AudioRecording",
     "VoiceType",
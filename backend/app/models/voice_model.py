@@ -1,7 +1,7 @@
 """Data models for the application."""
 
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Literal, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -39,7 +39,45 @@ class GenerationRequest(BaseModel):
     guest_voice_id: Optional[str] = None
     custom_filename: Optional[str] = None
     speed: float = Field(default=1.0, ge=0.5, le=2.0)
-    pitch: float = Field(default=1.0, ge=0.5, le=2.0)
+    # None means no shift in either unit (1.0 as a ratio, 0.0 in semitones)
+    pitch: Optional[float] = Field(default=None, ge=-12.0, le=12.0)
+    pitch_unit: Literal["ratio", "semitones"] = "ratio"
+    # Re-submissions with the same project_id only synthesise changed lines
+    project_id: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9_\-]{1,64}$")
+    # "batch" jobs yield their worker to interactive ones at sub-chunk boundaries
+    priority: Literal["interactive", "batch"] = "interactive"
+    # Speed/quality preset; None uses DEFAULT_QUALITY_PRESET (PREVIEW_QUALITY_PRESET for previews)
+    quality: Optional[Literal["draft", "standard", "studio"]] = None
+    # Render only the first sentence, ahead of every other job
+    preview: bool = False
+    # Model variant (MODEL_VARIANTS); None uses the default model (PREVIEW_MODEL for previews)
+    model: Optional[str] = Field(default=None, max_length=64)
+
+    @model_validator(mode="after")
+    def check_pitch_range(self):
+        if self.pitch is None:
+            self.pitch = 1.0 if self.pitch_unit == "ratio" else 0.0
+        # Ratio 0.5-2.0 and +/-12 semitones both span one octave either way
+        if self.pitch_unit == "ratio" and not 0.5 <= self.pitch <= 2.0:
+            raise ValueError("pitch ratio must be between 0.5 and 2.0")
+        return self
+
+
+class BatchRow(BaseModel):
+    """One utterance of a batch generation request."""
+
+    id: str
+    text: str = Field(min_length=1)
+    voice_id: str
+    emotion: Optional[str] = Field(default=None, pattern=r"^[A-Za-z_]+$")
+    speed: float = Field(default=1.0, ge=0.5, le=2.0)
+
+    def tagged_text(self) -> str:
+        """Text wrapped in the engine's emotion tag, if any."""
+        emotion = (self.emotion or "neutral").lower()
+        if emotion == "neutral":
+            return self.text
+        return f"<{emotion}>{self.text}</{emotion}>"
 
 
 class TaskStatus(str, Enum):
@@ -49,6 +87,7 @@ class TaskStatus(str, Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class GenerationResponse(BaseModel):
@@ -70,6 +109,9 @@ class TaskResponse(BaseModel):
     result: Optional[GenerationResponse] = None
     error: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
+    # Identical concurrent requests share one job; ref_count tasks point at it
+    job_id: Optional[str] = None
+    ref_count: int = 1
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat()}
@@ -1,7 +1,18 @@
 """Services module."""
 
-from .voice_service import VoiceService
-from .audio_service import AudioService
-from .llm_service import LLMService
+import importlib
 
 __all__ = ["VoiceService", "AudioService", "LLMService"]
+
+# Resolved on first access, so importing one service module does not import them all
+_EXPORTS = {
+    "VoiceService": ".voice_service",
+    "AudioService": ".audio_service",
+    "LLMService": ".llm_service",
+}
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
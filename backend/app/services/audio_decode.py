@@ -0,0 +1,220 @@
+"""Single-pass, block-wise audio decoding to mono WAV.
+
+Sources are decoded block by block, mixed down to mono float32, resampled
+with a streaming soxr resampler and written straight to the output, so a
+long recording never sits in memory as a whole (or as float64).
+
+Decoders are tried in order until one succeeds:
+
+1. ``soundfile`` (libsndfile: wav, flac, ogg, mp3)
+2. ``av`` (PyAV / in-process FFmpeg libraries: m4a, webm, ...), if installed
+3. the ``ffmpeg`` binary, streaming raw PCM over a pipe (last resort)
+"""
+
+import os
+import logging
+import subprocess
+import tempfile
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+from app.config import settings
+
+try:
+    import av
+except ImportError:  # PyAV is optional; compressed formats fall back to ffmpeg
+    av = None
+
+logger = logging.getLogger(__name__)
+
+AudioSource = Union[str, os.PathLike, BinaryIO]
+Block = Tuple[np.ndarray, int]  # (mono float32 samples, sample rate)
+
+RESAMPLE_QUALITY = "HQ"
+
+
+class BlockResampler:
+    """Streaming mono resampler; the soxr filter is designed once per stream."""
+
+    def __init__(self, sr_in: int, sr_out: int):
+        self.sr_in = sr_in
+        self.sr_out = sr_out
+        self._stream = None
+        if sr_in != sr_out:
+            self._stream = soxr.ResampleStream(
+                sr_in, sr_out, 1, dtype="float32", quality=RESAMPLE_QUALITY
+            )
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self._stream is None:
+            return block
+        return self._stream.resample_chunk(block)
+
+    def flush(self) -> np.ndarray:
+        if self._stream is None:
+            return np.zeros(0, dtype=np.float32)
+        return self._stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def resample(audio: np.ndarray, sr_in: int, sr_out: int) -> np.ndarray:
+    """One-shot resample of an in-memory mono signal."""
+    if sr_in == sr_out:
+        return audio
+    return soxr.resample(audio.astype(np.float32, copy=False), sr_in, sr_out, quality=RESAMPLE_QUALITY)
+
+
+def _to_mono(block: np.ndarray) -> np.ndarray:
+    if block.ndim > 1:
+        block = block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+    return np.ascontiguousarray(block, dtype=np.float32)
+
+
+def _rewind(source: AudioSource) -> AudioSource:
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+# --- Decoders ---
+
+def _decode_soundfile(source: AudioSource, target_sr: int) -> Iterator[Block]:
+    with sf.SoundFile(_rewind(source)) as f:
+        for block in f.blocks(blocksize=settings.AUDIO_DECODE_BLOCK_SIZE, dtype="float32", always_2d=True):
+            yield _to_mono(block), f.samplerate
+
+
+def _decode_pyav(source: AudioSource, target_sr: int) -> Iterator[Block]:
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+
+    # libswresample does mixdown and rate conversion while decoding
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=target_sr)
+    with av.open(_rewind(source), mode="r") as container:
+        stream = container.streams.audio[0]
+        for frame in container.decode(stream):
+            for out in resampler.resample(frame):
+                yield out.to_ndarray().reshape(-1), target_sr
+        for out in resampler.resample(None):
+            yield out.to_ndarray().reshape(-1), target_sr
+
+
+def _decode_ffmpeg(source: AudioSource, target_sr: int) -> Iterator[Block]:
+    tmp_path = None
+    if hasattr(source, "read"):
+        # The ffmpeg binary needs a path; only this fallback touches disk
+        settings.UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix="decode_", dir=settings.UPLOADS_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(_rewind(source).read())
+        in_path = tmp_path
+    else:
+        in_path = os.fspath(source)
+
+    cmd = [
+        "ffmpeg", "-nostdin", "-v", "error", "-i", in_path,
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-ar", str(target_sr), "pipe:1",
+    ]
+    block_bytes = settings.AUDIO_DECODE_BLOCK_SIZE * 4
+    try:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+            while True:
+                chunk = proc.stdout.read(block_bytes)
+                if not chunk:
+                    break
+                usable = len(chunk) - len(chunk) % 4
+                yield np.frombuffer(chunk[:usable], dtype=np.float32), target_sr
+            stderr = proc.stderr.read().decode("utf-8", "replace").strip()
+            if proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {stderr[-300:]}")
+    finally:
+        if tmp_path:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+DECODERS: List[Tuple[str, Callable[[AudioSource, int], Iterator[Block]]]] = [
+    ("soundfile", _decode_soundfile),
+    ("pyav", _decode_pyav),
+    ("ffmpeg", _decode_ffmpeg),
+]
+
+
+# --- Pipeline ---
+
+def _pump(blocks: Iterator[Block], target_sr: int, sink: Callable[[np.ndarray], None]) -> int:
+    """Resample decoded blocks into `sink`; returns output sample count."""
+    resampler: Optional[BlockResampler] = None
+    written = 0
+    for block, sr in blocks:
+        if resampler is None:
+            resampler = BlockResampler(sr, target_sr)
+        out = resampler.process(block)
+        if out.size:
+            sink(out)
+            written += out.size
+    if resampler is not None:
+        tail = resampler.flush()
+        if tail.size:
+            sink(tail)
+            written += tail.size
+    return written
+
+
+def _run_decoders(source: AudioSource, target_sr: int, open_sink) -> Tuple[str, int]:
+    """Try each decoder in turn; `open_sink()` returns a fresh (sink, close) pair."""
+    errors = []
+    for name, decoder in DECODERS:
+        sink, close = open_sink()
+        try:
+            written = _pump(decoder(source, target_sr), target_sr, sink)
+        except Exception as e:
+            close(failed=True)
+            errors.append(f"{name}: {e}")
+            logger.debug(f"Decoder '{name}' failed: {e}")
+            continue
+        close(failed=False)
+        if written == 0:
+            errors.append(f"{name}: no audio decoded")
+            continue
+        return name, written
+    raise RuntimeError("Could not decode audio (" + "; ".join(errors) + ")")
+
+
+def transcode_to_wav(source: AudioSource, output_path: str, target_sr: int) -> Tuple[str, int]:
+    """Decode `source` (path or file object) to a mono WAV at `target_sr`.
+
+    Returns (decoder name, samples written).
+    """
+
+    def open_sink():
+        out = sf.SoundFile(output_path, mode="w", samplerate=target_sr, channels=1, format="WAV")
+
+        def close(failed: bool):
+            out.close()
+            if failed and os.path.exists(output_path):
+                os.remove(output_path)
+
+        return out.write, close
+
+    return _run_decoders(source, target_sr, open_sink)
+
+
+def decode_to_array(source: AudioSource, target_sr: int) -> Tuple[np.ndarray, str]:
+    """Decode `source` to an in-memory mono float32 array at `target_sr`.
+
+    Returns (audio, decoder name).
+    """
+    blocks: List[np.ndarray] = []
+
+    def open_sink():
+        blocks.clear()
+        return blocks.append, lambda failed: None
+
+    name, _ = _run_decoders(source, target_sr, open_sink)
+    audio = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    return audio, name
@@ -0,0 +1,150 @@
+"""Speed and pitch effects for long mono audio.
+
+Time stretching uses WSOLA (waveform-similarity overlap-add): each output
+frame is read from near its nominal input position, shifted by up to
+``SEARCH_MS`` so it lines up with the natural continuation of the previous
+frame. The search runs on a 4x-decimated copy of the signal and is refined
+at full rate; gathering, windowing and overlap-add are vectorised per block.
+Blocks of ``EFFECTS_BLOCK_FRAMES`` frames are independent and run in a
+worker pool, so memory per task is bounded by the block size.
+
+Pitch shifting stretches by the pitch ratio and resamples back with soxr,
+so speed and pitch are applied in a single stretch + resample pass.
+"""
+
+import math
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services import audio_decode
+
+logger = logging.getLogger(__name__)
+
+PITCH_UNITS = ("ratio", "semitones")
+
+FRAME_MS = 40.0
+SEARCH_MS = 10.0
+DECIMATION = 4  # coarse alignment runs at 1/4 of the sample rate
+
+_effects_pool = ThreadPoolExecutor(
+    max_workers=settings.EFFECTS_WORKERS, thread_name_prefix="effects"
+)
+
+
+def pitch_ratio(pitch: float, unit: str = "ratio") -> float:
+    """Convert a pitch value in `unit` to a frequency ratio."""
+    if unit == "semitones":
+        return float(2.0 ** (pitch / 12.0))
+    if unit == "ratio":
+        if pitch <= 0:
+            raise ValueError(f"Pitch ratio must be positive, got {pitch}")
+        return float(pitch)
+    raise ValueError(f"Unknown pitch unit '{unit}', expected one of {PITCH_UNITS}")
+
+
+def _geometry(sample_rate: int, rate: float) -> Tuple[int, int, float, int]:
+    """(frame length, synthesis hop, analysis hop, search radius) in samples."""
+    frame = int(sample_rate * FRAME_MS / 1000) // (2 * DECIMATION) * (2 * DECIMATION)
+    hop_out = frame // 2
+    return frame, hop_out, hop_out * rate, int(sample_rate * SEARCH_MS / 1000)
+
+
+def _align_block(
+    padded: np.ndarray, coarse: np.ndarray, k0: int, k1: int,
+    frame: int, hop_out: int, hop_in: float, tol: int,
+) -> np.ndarray:
+    """WSOLA search for frames k0..k1-1; returns their start offsets in `padded`."""
+    nominal = np.round(np.arange(k0, k1) * hop_in).astype(np.int64) + tol
+    starts = nominal.copy()
+    frame_d, tol_d = frame // DECIMATION, tol // DECIMATION
+
+    # The first frame of each block keeps its nominal position
+    for i in range(1, k1 - k0):
+        natural = starts[i - 1] + hop_out
+        lo = (nominal[i] - tol) // DECIMATION
+        template = coarse[natural // DECIMATION : natural // DECIMATION + frame_d]
+        region = coarse[lo : lo + frame_d + 2 * tol_d]
+        guess = lo * DECIMATION + int(np.argmax(np.correlate(region, template, "valid"))) * DECIMATION
+
+        # Refine to the exact sample around the coarse match
+        lo = max(guess - DECIMATION, 0)
+        fine = np.correlate(
+            padded[lo : lo + frame + 2 * DECIMATION], padded[natural : natural + frame], "valid"
+        )
+        starts[i] = lo + int(np.argmax(fine))
+    return starts
+
+
+def _stretch_block(
+    padded: np.ndarray, coarse: np.ndarray, k0: int, k1: int,
+    frame: int, hop_out: int, hop_in: float, tol: int,
+) -> np.ndarray:
+    """Overlap-add frames k0..k1-1; returns the block's output span."""
+    starts = _align_block(padded, coarse, k0, k1, frame, hop_out, hop_in, tol)
+    idx = np.arange(frame)
+    window = np.hanning(frame + 1)[:-1].astype(np.float32)
+
+    out = np.zeros((k1 - k0 - 1) * hop_out + frame, dtype=np.float32)
+    for parity in range(2):  # 50% overlap: even and odd frames tile without collisions
+        frames = padded[starts[parity::2, None] + idx] * window
+        positions = (np.arange(parity, k1 - k0, 2) * hop_out)[:, None] + idx
+        out[positions.ravel()] += frames.ravel()
+    return out
+
+
+def time_stretch(audio: np.ndarray, rate: float, sample_rate: int) -> np.ndarray:
+    """Play `audio` `rate` times faster without changing pitch."""
+    audio = np.ascontiguousarray(audio, dtype=np.float32).reshape(-1)
+    if abs(rate - 1.0) < 1e-3 or audio.size == 0:
+        return audio
+
+    frame, hop_out, hop_in, tol = _geometry(sample_rate, rate)
+    out_len = int(round(audio.size / rate))
+    n_frames = out_len // hop_out + 2
+
+    # Zero padding so every candidate window is in range
+    last_needed = int(math.ceil((n_frames + 1) * hop_in)) + 2 * frame + 4 * tol
+    padded = np.zeros(max(last_needed, audio.size + tol), dtype=np.float32)
+    padded[tol : tol + audio.size] = audio
+    coarse = audio_decode.resample(padded, DECIMATION, 1)
+
+    block = max(2, settings.EFFECTS_BLOCK_FRAMES)
+    bounds: List[Tuple[int, int]] = [
+        (k0, min(k0 + block, n_frames)) for k0 in range(0, n_frames, block)
+    ]
+    futures = [
+        _effects_pool.submit(_stretch_block, padded, coarse, k0, k1, frame, hop_out, hop_in, tol)
+        for k0, k1 in bounds
+    ]
+
+    out = np.zeros(n_frames * hop_out + frame, dtype=np.float32)
+    for (k0, _), future in zip(bounds, futures):
+        chunk = future.result()
+        start = k0 * hop_out
+        out[start : start + chunk.size] += chunk
+
+    return out[:out_len]
+
+
+def apply_effects(
+    audio: np.ndarray,
+    sample_rate: int,
+    speed: float = 1.0,
+    pitch: float = 1.0,
+    pitch_unit: str = "ratio",
+) -> np.ndarray:
+    """Change speed and pitch independently in one stretch + resample pass."""
+    ratio = pitch_ratio(pitch, pitch_unit)
+    audio = np.ascontiguousarray(audio, dtype=np.float32).reshape(-1)
+    if abs(ratio - 1.0) < 1e-3:
+        return time_stretch(audio, speed, sample_rate)
+
+    # Stretch to `ratio` times the target length, then resample it back down:
+    # resampling raises the pitch by `ratio` and restores the duration.
+    stretched = time_stretch(audio, speed / ratio, sample_rate)
+    resampled = audio_decode.resample(stretched, sample_rate * ratio, sample_rate)
+    return resampled.astype(np.float32, copy=False)
@@ -1,5 +1,6 @@
 """Audio processing service (robust recording save & format conversion)."""
 
+import io
 import os
 import re
 import base64
@@ -7,16 +8,17 @@ import shutil
 import json
 import soundfile as sf
 import numpy as np
-import librosa
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import BinaryIO, Optional, Tuple, List, Union
 import logging
 import uuid
-import subprocess
 from datetime import datetime
 
 from app.config import settings
 from app.models import AudioFile
+from app.services import audio_decode, audio_effects
+from app.services.loudness import LoudnessNormalizer
+from app.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -62,26 +64,35 @@ class AudioService:
         filepath = output_dir / filename
         _ensure_dir(filepath)
 
-        try:
-            # Ensure audio is 1D float32 in [-1,1]
-            if audio_data.ndim > 1:
-                audio_data = audio_data.squeeze()
-            audio_data = np.clip(audio_data, -1.0, 1.0)
-            if audio_data.dtype != np.float32:
-                audio_data = audio_data.astype(np.float32)
-
-            sf.write(str(filepath), audio_data, sample_rate)
-            logger.info(f"Audio saved to {filepath}")
-            return str(filepath)
-        except Exception as e:
-            logger.error(f"Failed to save audio: {e}")
-            raise
+        with tracer.span("audio_service.save_audio", filename=filename) as span:
+            try:
+                # Ensure audio is 1D float32 in [-1,1]
+                if audio_data.ndim > 1:
+                    audio_data = audio_data.squeeze()
+                audio_data = np.clip(audio_data, -1.0, 1.0)
+                if audio_data.dtype != np.float32:
+                    audio_data = audio_data.astype(np.float32)
+
+                sf.write(str(filepath), audio_data, sample_rate)
+                span.set_attribute("samples", int(audio_data.size))
+                logger.info(f"Audio saved to {filepath}")
+                return str(filepath)
+            except Exception as e:
+                logger.error(f"Failed to save audio: {e}")
+                raise
 
     @staticmethod
     def save_audio_metadata(
         filename: str, voice_name: str, duration: float, text_preview: str
     ):
         """Save metadata for generated audio file."""
+        with tracer.span("audio_service.save_audio_metadata", filename=filename):
+            AudioService._write_audio_metadata(filename, voice_name, duration, text_preview)
+
+    @staticmethod
+    def _write_audio_metadata(
+        filename: str, voice_name: str, duration: float, text_preview: str
+    ):
         try:
             filepath = settings.OUTPUTS_DIR / filename
             metadata_file = filepath.with_suffix(".json")
@@ -158,12 +169,12 @@ class AudioService:
     def load_audio(
         filepath: str, target_sr: Optional[int] = None
     ) -> Tuple[np.ndarray, int]:
-        """Load audio to mono float32 with librosa."""
+        """Load audio to mono float32, resampled to `target_sr`."""
         try:
             if target_sr is None:
                 target_sr = settings.SAMPLE_RATE
-            audio, sr = librosa.load(filepath, sr=target_sr, mono=True)
-            return audio.astype(np.float32), sr
+            audio, _ = audio_decode.decode_to_array(filepath, target_sr)
+            return audio, target_sr
         except Exception as e:
             logger.error(f"Failed to load audio: {e}")
             raise
@@ -175,9 +186,8 @@ class AudioService:
         """
         Convert base64-encoded audio to a WAV file.
 
-        - If `format != 'wav'`, we first write the raw
-          bytes into a temp file in `uploads/`
-          with the correct extension, then convert that to WAV at `output_path`.
+        - If `format != 'wav'`, the decoded bytes are converted straight from
+          memory to WAV at `output_path` (no temp file).
         - If `output_path` is not provided, we write the final WAV into `uploads/`.
         """
         try:
@@ -197,27 +207,15 @@ class AudioService:
                     final_wav = final_wav.with_suffix(".wav")
             _ensure_dir(final_wav)
 
+            raw = _safe_b64decode(base64_data)
+
             # If the incoming is already WAV, write directly
             if fmt == "wav":
-                raw = _safe_b64decode(base64_data)
                 with open(final_wav, "wb") as f:
                     f.write(raw)
                 return str(final_wav)
 
-            # Otherwise, write to temp with ORIGINAL extension, then convert to WAV
-            tmp_src = settings.UPLOADS_DIR / f"tmp_{uuid.uuid4().hex[:8]}.{fmt}"
-            _ensure_dir(tmp_src)
-            raw = _safe_b64decode(base64_data)
-            with open(tmp_src, "wb") as f:
-                f.write(raw)
-
-            # Convert temp -> final WAV
-            AudioService.convert_to_wav(str(tmp_src), str(final_wav))
-            try:
-                tmp_src.unlink(missing_ok=True)
-            except Exception:
-                pass
-
+            AudioService.convert_to_wav(io.BytesIO(raw), str(final_wav))
             return str(final_wav)
 
         except Exception as e:
@@ -225,75 +223,36 @@ class AudioService:
             raise
 
     @staticmethod
-    def convert_to_wav(input_path: str, output_path: str) -> bool:
+    def convert_to_wav(input_path: Union[str, BinaryIO], output_path: str) -> bool:
         """
-        Convert an arbitrary audio file to mono WAV @ SAMPLE_RATE.
-        Uses (1) soundfile if possible, (2) ffmpeg, (3) librosa as last resort.
-        Ensures input and output are NOT the same temp path.
+        Convert an audio file (path or file object) to mono WAV @ SAMPLE_RATE.
+
+        Decodes in a single block-wise pass: soundfile, then PyAV, then the
+        ffmpeg binary as a last resort. The decoder used is recorded on the
+        span as `decode_path`.
         """
+        name = os.path.basename(input_path) if isinstance(input_path, (str, os.PathLike)) else "<memory>"
+        with tracer.span("audio_service.convert_to_wav", input=name) as span:
+            decode_path, samples = AudioService._convert_to_wav(input_path, output_path)
+            span.set_attribute("decode_path", decode_path)
+            span.set_attribute("samples", samples)
+            logger.info(f"Converted {name} to WAV via {decode_path} ({samples} samples)")
+            return True
+
+    @staticmethod
+    def _convert_to_wav(input_path: Union[str, BinaryIO], output_path: str) -> Tuple[str, int]:
         try:
-            in_path = os.path.abspath(input_path)
             out_path = os.path.abspath(output_path)
-            out_dir = os.path.dirname(out_path)
-            os.makedirs(out_dir, exist_ok=True)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
 
             # If same path, use a temporary target
-            need_move = False
-            if in_path == out_path:
-                tmp_out = out_path + ".tmp.wav"
-                out_target = tmp_out
-                need_move = True
-            else:
-                out_target = out_path
+            same_file = isinstance(input_path, (str, os.PathLike)) and os.path.abspath(input_path) == out_path
+            out_target = out_path + ".tmp.wav" if same_file else out_path
 
-            # Try direct read/write with soundfile
-            try:
-                data, sr = sf.read(in_path, always_2d=False)
-                if data.ndim > 1:
-                    # Mixdown to mono
-                    data = np.mean(data, axis=-1)
-                data = AudioService._resample_if_needed(data, sr, settings.SAMPLE_RATE)
-                data = data.astype(np.float32)
-                sf.write(out_target, data, settings.SAMPLE_RATE)
-                if need_move:
-                    shutil.move(out_target, out_path)
-                return True
-            except Exception as e1:
-                logger.warning(f"Soundfile conversion failed: {e1}, trying ffmpeg")
-
-            # Try ffmpeg
-            try:
-                cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-i",
-                    in_path,
-                    "-acodec",
-                    "pcm_s16le",
-                    "-ar",
-                    str(settings.SAMPLE_RATE),
-                    "-ac",
-                    "1",
-                    out_target,
-                ]
-                subprocess.run(cmd, check=True, capture_output=True)
-                if need_move:
-                    shutil.move(out_target, out_path)
-                return True
-            except Exception as e2:
-                logger.error(f"FFmpeg conversion also failed: {e2}")
-
-            # Last resort: librosa
-            try:
-                audio, sr = librosa.load(in_path, sr=settings.SAMPLE_RATE, mono=True)
-                audio = audio.astype(np.float32)
-                sf.write(out_target, audio, settings.SAMPLE_RATE)
-                if need_move:
-                    shutil.move(out_target, out_path)
-                return True
-            except Exception as e3:
-                logger.error(f"All conversion methods failed: {e3}")
-                raise
+            result = audio_decode.transcode_to_wav(input_path, out_target, settings.SAMPLE_RATE)
+            if same_file:
+                shutil.move(out_target, out_path)
+            return result
 
         except Exception as e:
             logger.error(f"convert_to_wav fatal error: {e}")
@@ -301,12 +260,7 @@ class AudioService:
 
     @staticmethod
     def _resample_if_needed(audio: np.ndarray, sr_in: int, sr_out: int) -> np.ndarray:
-        if sr_in == sr_out:
-            return audio
-        # Use librosa for high-quality resample
-        return librosa.resample(
-            audio.astype(np.float32), orig_sr=sr_in, target_sr=sr_out
-        )
+        return audio_decode.resample(audio, sr_in, sr_out)
 
     @staticmethod
     def audio_to_base64(filepath: str) -> str:
@@ -320,48 +274,36 @@ class AudioService:
             raise
 
     @staticmethod
-    def normalize_audio(audio: np.ndarray, target_db: float = -20) -> np.ndarray:
-        """Normalize audio to target dB."""
-        rms = float(np.sqrt(np.mean(np.square(audio)))) if audio.size else 0.0
-        if rms > 0:
-            target_rms = 10 ** (target_db / 20)
-            scalar = target_rms / rms
-            normalized = audio * scalar
-            max_val = float(np.max(np.abs(normalized))) if normalized.size else 0.0
-            if max_val > 0.95:
-                normalized = normalized * (0.95 / max_val)
-            return normalized.astype(np.float32)
-        return audio.astype(np.float32)
+    def normalize_audio(
+        audio: np.ndarray, target_db: float = -20, sample_rate: Optional[int] = None
+    ) -> np.ndarray:
+        """Normalize audio to `target_db` integrated loudness (LUFS), true-peak limited."""
+        if audio.size == 0:
+            return audio.astype(np.float32)
+        normalizer = LoudnessNormalizer(sample_rate or settings.SAMPLE_RATE, target_lufs=target_db)
+        return normalizer.normalize(audio)
 
     @staticmethod
     def process_effects(
-        audio_data: np.ndarray, speed: float = 1.0, pitch: float = 0.0, sample_rate: int = None
+        audio_data: np.ndarray,
+        speed: float = 1.0,
+        pitch: float = 1.0,
+        sample_rate: int = None,
+        pitch_unit: str = "ratio",
     ) -> np.ndarray:
-        """Apply speed (time stretch) and pitch (pitch shift) effects."""
+        """Apply speed (time stretch) and pitch (ratio or semitones) effects."""
         try:
             if sample_rate is None:
                 sample_rate = settings.SAMPLE_RATE
 
-            if audio_data.ndim > 1:
-                audio_data = audio_data.squeeze()
-
-            # Ensure float32
-            processed = audio_data.astype(np.float32)
-
-            # Apply pitch shift
-            if abs(pitch) > 0.1:
-                logger.info(f"Applying pitch shift: {pitch}")
-                # n_steps is the number of semitones
-                processed = librosa.effects.pitch_shift(
-                    processed, sr=sample_rate, n_steps=pitch
+            with tracer.span(
+                "audio_service.process_effects", speed=speed, pitch=pitch, pitch_unit=pitch_unit
+            ) as span:
+                processed = audio_effects.apply_effects(
+                    audio_data, sample_rate, speed=speed, pitch=pitch, pitch_unit=pitch_unit
                 )
-
-            # Apply time stretch (speed)
-            if abs(speed - 1.0) > 0.01:
-                logger.info(f"Applying time stretch: {speed}")
-                processed = librosa.effects.time_stretch(processed, rate=speed)
-
-            return processed.astype(np.float32)
+                span.set_attribute("samples", int(processed.size))
+                return processed
         except Exception as e:
             logger.error(f"Failed to process audio effects: {e}")
             return audio_data
@@ -0,0 +1,229 @@
+import io
+import csv
+import json
+import uuid
+import shutil
+import asyncio
+import logging
+import zipfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.models import BatchRow
+from app.services.audio_service import AudioService, sanitize_filename
+from app.services.generation_scheduler import PRIORITY_BATCH, GenerationScheduler
+from app.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Columns accepted as the voice of a row
+_VOICE_COLUMNS = ("voice_id", "voice")
+
+
+def parse_batch_rows(
+    content: bytes, filename: str = "", default_voice_id: Optional[str] = None
+) -> List[BatchRow]:
+    """Parse a CSV or JSONL batch file into validated rows.
+
+    Raises ValueError naming the first bad row.
+    """
+    text = content.decode("utf-8-sig")
+    suffix = Path(filename or "").suffix.lower()
+    is_jsonl = suffix in (".jsonl", ".ndjson") or (
+        suffix != ".csv" and text.lstrip().startswith("{")
+    )
+
+    if is_jsonl:
+        records = []
+        for line_no, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_no}: invalid JSON ({e})")
+            if not isinstance(record, dict):
+                raise ValueError(f"Line {line_no}: expected a JSON object, got {type(record).__name__}")
+            records.append((line_no, record))
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        records = [(line_no, dict(record)) for line_no, record in enumerate(reader, start=2)]
+
+    if len(records) > settings.BATCH_MAX_ROWS:
+        raise ValueError(f"Batch has {len(records)} rows; the limit is {settings.BATCH_MAX_ROWS}")
+
+    rows: List[BatchRow] = []
+    seen_ids: Dict[str, int] = {}
+    for line_no, record in records:
+        record = {k.strip().lower(): v for k, v in record.items() if k and v not in (None, "")}
+        voice = next((record.pop(c) for c in _VOICE_COLUMNS if c in record), default_voice_id)
+        # JSON may carry numeric ids
+        record["voice_id"] = str(voice) if voice is not None else None
+        record["id"] = str(record.get("id", f"row_{line_no}"))
+        try:
+            row = BatchRow(**record)
+        except ValidationError as e:
+            raise ValueError(f"Line {line_no}: {e.errors()[0]['loc'][0]}: {e.errors()[0]['msg']}")
+
+        # Row ids become archive member names, so keep them safe and unique
+        base_id = safe_id = sanitize_filename(row.id)
+        # Suffixed ids may collide with later (or earlier) literal ids too
+        while safe_id in seen_ids:
+            seen_ids[base_id] += 1
+            safe_id = f"{base_id}_{seen_ids[base_id]}"
+        seen_ids[safe_id] = 0
+        row.id = safe_id
+        rows.append(row)
+
+    if not rows:
+        raise ValueError("Batch file has no rows")
+    return rows
+
+
+class BatchJob:
+    """Runs one batch of independent utterances and streams per-row results.
+
+    Rows are grouped by voice and each group runs as one batch-priority job
+    on the generation scheduler, so consecutive model calls share a voice prompt and
+    no per-row task or polling is needed. Large groups are split so a batch
+    can use every worker. Results are pushed to the client as NDJSON while
+    the batch runs; the worker that finishes the last group zips the audio
+    into an archive and emits a summary line.
+    """
+
+    def __init__(self, rows: List[BatchRow], voice_service):
+        self.batch_id = uuid.uuid4().hex
+        self.rows = rows
+        self.voice_service = voice_service
+        self.work_dir = self.batches_dir() / self.batch_id
+        self.results: List[dict] = []
+        self._lock = threading.Lock()
+        self._pending_groups = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+
+    @staticmethod
+    def batches_dir() -> Path:
+        return settings.OUTPUTS_DIR / "batches"
+
+    @classmethod
+    def archive_path(cls, batch_id: str) -> Path:
+        return cls.batches_dir() / f"{batch_id}.zip"
+
+    def groups(self) -> List[List[BatchRow]]:
+        """Rows by voice (first-appearance order), split into BATCH_GROUP_SIZE runs."""
+        by_voice: Dict[str, List[BatchRow]] = {}
+        for row in self.rows:
+            by_voice.setdefault(row.voice_id, []).append(row)
+        size = max(1, settings.BATCH_GROUP_SIZE)
+        return [rows[i : i + size] for rows in by_voice.values() for i in range(0, len(rows), size)]
+
+    def start(self, scheduler: GenerationScheduler) -> None:
+        """Schedule every voice group; must be called from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+
+        groups = self.groups()
+        self._pending_groups = len(groups)
+        logger.info(f"Batch {self.batch_id}: {len(self.rows)} rows in {len(groups)} voice groups")
+        for rows in groups:
+            scheduler.submit(self._run_group, rows, priority=PRIORITY_BATCH)
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """NDJSON lines: one per finished row, then a summary."""
+        while True:
+            event = await self._queue.get()
+            yield (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            if event.get("type") == "summary":
+                return
+
+    def _emit(self, event: dict) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def _run_group(self, rows: List[BatchRow]) -> None:
+        try:
+            for row in rows:
+                result = self._run_row(row)
+                with self._lock:
+                    self.results.append(result)
+                self._emit({"type": "row", **result})
+        finally:
+            with self._lock:
+                self._pending_groups -= 1
+                last = self._pending_groups == 0
+            if last:
+                self._finish()
+
+    def _run_row(self, row: BatchRow) -> dict:
+        result = {"id": row.id, "voice_id": row.voice_id, "status": "failed", "filename": None,
+                  "duration": None, "error": None}
+        with tracer.span(
+            "process_batch_row", task_id=f"{self.batch_id}:{row.id}", voice_id=row.voice_id,
+            text_length=len(row.text),
+        ) as span:
+            try:
+                gen_result = self.voice_service.generate_speech(
+                    text=row.tagged_text(), voice_id=row.voice_id, speed=row.speed,
+                    latency_mode="batch",
+                )
+                if gen_result is None:
+                    result["error"] = "Speech generation failed"
+                else:
+                    audio, sample_rate = gen_result
+                    filename = f"{row.id}.wav"
+                    AudioService.save_audio(
+                        audio, filename=filename, output_dir=self.work_dir, sample_rate=sample_rate
+                    )
+                    result.update(status="completed", filename=filename,
+                                  duration=round(float(len(audio)) / sample_rate, 3))
+            except Exception as e:
+                logger.error(f"Batch {self.batch_id} row {row.id} failed: {e}")
+                result["error"] = str(e)
+            span.set_attribute("status", result["status"])
+        return result
+
+    def _finish(self) -> None:
+        succeeded = sum(1 for r in self.results if r["status"] == "completed")
+        summary = {
+            "type": "summary",
+            "batch_id": self.batch_id,
+            "total": len(self.rows),
+            "succeeded": succeeded,
+            "failed": len(self.rows) - succeeded,
+            "archive_url": None,
+        }
+        try:
+            self._write_archive()
+            summary["archive_url"] = f"/api/batches/{self.batch_id}/archive"
+        except Exception as e:
+            logger.error(f"Batch {self.batch_id}: failed to write archive: {e}")
+            summary["error"] = str(e)
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        logger.info(f"Batch {self.batch_id} finished: {succeeded}/{len(self.rows)} rows")
+        self._emit(summary)
+
+    def _write_archive(self) -> None:
+        # In input order, with a results manifest alongside the audio
+        order = {row.id: i for i, row in enumerate(self.rows)}
+        results = sorted(self.results, key=lambda r: order[r["id"]])
+        archive = self.archive_path(self.batch_id)
+        tmp_path = archive.with_suffix(".zip.tmp")
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for result in results:
+                if result["filename"]:
+                    zf.write(self.work_dir / result["filename"], arcname=result["filename"])
+            manifest = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results)
+            zf.writestr("results.jsonl", manifest)
+            zf.writestr("batch.json", json.dumps({
+                "batch_id": self.batch_id,
+                "created_at": datetime.now().isoformat(),
+                "rows": len(self.rows),
+            }))
+        tmp_path.replace(archive)
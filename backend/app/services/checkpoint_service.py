@@ -0,0 +1,231 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: claims only hold within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+# Checkpoint states; "running" ones are resumed when the server starts
+STATE_RUNNING = "running"
+STATE_CANCELLED = "cancelled"
+STATE_FAILED = "failed"
+
+# task id -> open lock file of the checkpoints this process is running
+_claims: Dict[str, object] = {}
+_claims_lock = threading.Lock()
+
+
+class TaskCheckpoint:
+    """On-disk progress of one generation task.
+
+    ``task.json`` holds the original request and the task's state. Every
+    model call's raw (un-normalised) output is saved as a unit under
+    ``units/``, keyed by its position and content; the unit files are the
+    record of what is done. Each sub-chunk plan is appended to
+    ``plans.jsonl`` the first time it is made, so a resumed task splits the
+    text exactly as before even if the cost model has moved on. Saving a
+    unit or plan writes only that unit or plan. On resume, stored
+    units are replayed through the loudness normaliser in order, which gives
+    the same output as an uninterrupted run. Only missing units reach the
+    model.
+
+    A process runs a checkpointed task only while it holds the task's claim,
+    an exclusive lock on ``owner.lock``. Other worker processes starting up
+    skip claimed tasks instead of rendering them again, and the OS drops the
+    claim if the owner dies, so the next start resumes the task.
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.dir = Path(settings.CHECKPOINTS_DIR) / task_id
+        self.units_dir = self.dir / "units"
+        self.task_path = self.dir / "task.json"
+        self.plans_path = self.dir / "plans.jsonl"
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.rendered = 0
+
+        self.units: Set[str] = self._stored_units()
+        self.plans: Dict[str, List[str]] = self._read_plans()
+
+    @classmethod
+    def create(cls, task_id: str, request: dict, created_at: datetime, request_id: Optional[str]) -> "TaskCheckpoint":
+        checkpoint = cls(task_id)
+        checkpoint.units_dir.mkdir(parents=True, exist_ok=True)
+        checkpoint.claim()
+        checkpoint._write_json(checkpoint.task_path, {
+            "version": CHECKPOINT_VERSION,
+            "task_id": task_id,
+            "request": request,
+            "created_at": created_at.isoformat(),
+            "request_id": request_id,
+            "state": STATE_RUNNING,
+        })
+        return checkpoint
+
+    @staticmethod
+    def _read_json(path: Path) -> Optional[dict]:
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint file {path}: {e}")
+            return None
+
+    @staticmethod
+    def _write_json(path: Path, data: dict) -> None:
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _stored_units(self) -> Set[str]:
+        if not self.units_dir.exists():
+            return set()
+        return {
+            path.name[:-len(".npy")] for path in self.units_dir.glob("*.npy")
+            if not path.name.endswith(".tmp.npy")
+        }
+
+    def _read_plans(self) -> Dict[str, List[str]]:
+        plans: Dict[str, List[str]] = {}
+        if not self.plans_path.exists():
+            return plans
+        with open(self.plans_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    plans[record["key"]] = record["pieces"]
+                except (ValueError, KeyError, TypeError):
+                    # A record torn by a crash; that plan is simply made again
+                    logger.warning(f"Checkpoint {self.task_id}: skipping unreadable plan record")
+        return plans
+
+    def exists(self) -> bool:
+        return self.task_path.exists()
+
+    def task(self) -> Optional[dict]:
+        return self._read_json(self.task_path)
+
+    def set_state(self, state: str) -> None:
+        task = self.task()
+        if task is not None:
+            task["state"] = state
+            task["updated_at"] = datetime.now().isoformat()
+            self._write_json(self.task_path, task)
+
+    def claim(self) -> bool:
+        """Take the task for this process; False if another process holds it."""
+        with _claims_lock:
+            if self.task_id in _claims:
+                return True
+            if not self.dir.exists():
+                return False
+            lock_file = open(self.dir / "owner.lock", "a")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+            _claims[self.task_id] = lock_file
+            return True
+
+    def release(self) -> None:
+        with _claims_lock:
+            lock_file = _claims.pop(self.task_id, None)
+        if lock_file is not None:
+            lock_file.close()
+
+    def discard(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.release()
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:24]
+
+    def plan(self, key: str, make_plan: Callable[[], List[str]]) -> List[str]:
+        """The stored sub-chunk plan for `key`, or a new one (then stored)."""
+        with self._lock:
+            if key not in self.plans:
+                self.plans[key] = make_plan()
+                self._append_plan(key, self.plans[key])
+            return self.plans[key]
+
+    def _append_plan(self, key: str, pieces: List[str]) -> None:
+        # Caller holds self._lock
+        line = json.dumps({"key": key, "pieces": pieces}, ensure_ascii=False) + "\n"
+        with open(self.plans_path, "a+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    line = "\n" + line  # after a record torn by a crash
+            f.write(line.encode("utf-8"))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if key not in self.units:
+            return None
+        try:
+            audio = np.load(self.units_dir / f"{key}.npy")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint {self.task_id}: unit {key} unreadable, re-rendering: {e}")
+            return None
+        self.reused += 1
+        return audio
+
+    def put(self, key: str, audio: np.ndarray) -> None:
+        path = self.units_dir / f"{key}.npy"
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, np.asarray(audio, dtype=np.float32))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.units.add(key)
+        self.rendered += 1
+
+    @staticmethod
+    def load_all() -> List["TaskCheckpoint"]:
+        """Every checkpoint on disk, dropping expired or unreadable ones."""
+        root = Path(settings.CHECKPOINTS_DIR)
+        if not root.exists():
+            return []
+        cutoff = datetime.now() - timedelta(hours=settings.CHECKPOINT_RETENTION_HOURS)
+        checkpoints = []
+        for task_dir in sorted(root.iterdir()):
+            if not task_dir.is_dir():
+                continue
+            checkpoint = TaskCheckpoint(task_dir.name)
+            task = checkpoint.task()
+            # A claimed checkpoint without task.json is still being created elsewhere
+            if task is None or task.get("version") != CHECKPOINT_VERSION:
+                if checkpoint.claim():
+                    checkpoint.discard()
+                continue
+            updated = datetime.fromisoformat(task.get("updated_at") or task["created_at"])
+            if task["state"] != STATE_RUNNING and updated < cutoff:
+                if checkpoint.claim():
+                    checkpoint.discard()
+                continue
+            checkpoints.append(checkpoint)
+        return checkpoints
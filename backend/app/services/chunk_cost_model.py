@@ -0,0 +1,221 @@
+"""Online cost model of model calls, used to size sub-chunks.
+
+Every model call is recorded as (characters, latency, audio seconds). Two
+least-squares fits are kept with exponential forgetting:
+
+    latency   = overhead + per_char * chars + per_char2 * chars**2
+    audio_sec = audio_per_char * chars
+
+The quadratic term captures attention cost growing with sequence length.
+
+From those, text is packed into sentence-aligned pieces:
+
+* interactive: the first piece is as long as fits in
+  ``CHUNK_FIRST_AUDIO_TARGET_SEC``, and each following piece is as long as
+  can be synthesised while the audio already produced plays, so pieces grow
+  until they reach the throughput size.
+* batch: pieces are packed up to the throughput size, the length with the
+  lowest latency per character, sqrt(overhead / per_char2) (or
+  ``CHUNK_MAX_CHARS`` when cost per character keeps falling).
+
+Until enough calls have been seen the model is not ready and text is left
+as the engine split it (by speaker and emotion tag). The fit is persisted
+to ``CHUNK_COST_MODEL_PATH`` per engine, so it survives restarts.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_MODES = ("interactive", "batch")
+DECAY = 0.98  # weight kept by past observations per new observation
+MIN_OBSERVATIONS = 5.0  # effective (decayed) count before the model is used
+SAVE_EVERY = 20
+
+# Sentence ends: Latin punctuation followed by whitespace, or CJK punctuation
+_SENTENCE_END = re.compile(r"[.!?;…]+[\"'”’)]*\s+|[。！？；]+[”’」』）]*")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of `text`, each keeping its punctuation and trailing space."""
+    sentences, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        sentences.append(text[start : match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return [s for s in sentences if s.strip()]
+
+
+class _PolyFit:
+    """Least squares of y = sum(c_k * x**k) for k in `powers`, with forgetting."""
+
+    def __init__(self, powers: tuple, state: Optional[dict] = None):
+        self.powers = powers
+        size = len(powers)
+        self.n = float(state.get("n", 0.0)) if state else 0.0
+        self.xtx = np.array(state["xtx"], dtype=np.float64) if state else np.zeros((size, size))
+        self.xty = np.array(state["xty"], dtype=np.float64) if state else np.zeros(size)
+
+    def add(self, x: float, y: float) -> None:
+        row = np.array([x ** k for k in self.powers], dtype=np.float64)
+        self.n = self.n * DECAY + 1.0
+        self.xtx = self.xtx * DECAY + np.outer(row, row)
+        self.xty = self.xty * DECAY + row * y
+
+    def coefficients(self) -> Optional[np.ndarray]:
+        if self.n < MIN_OBSERVATIONS:
+            return None
+        # Tiny ridge term keeps the fit defined while call lengths are similar
+        ridge = np.diag(1e-9 * np.diag(self.xtx))
+        try:
+            return np.linalg.solve(self.xtx + ridge, self.xty)
+        except np.linalg.LinAlgError:
+            return None
+
+    def state(self) -> dict:
+        return {"n": self.n, "xtx": self.xtx.tolist(), "xty": self.xty.tolist()}
+
+
+class ChunkCostModel:
+    """Per-engine latency and audio-length model with sentence packing."""
+
+    def __init__(self, engine_key: str, path: Optional[Path] = None):
+        self.engine_key = engine_key
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        state = self._load()
+        self.latency = _PolyFit((0, 1, 2), state=state.get("latency"))
+        self.audio = _PolyFit((1,), state=state.get("audio"))
+
+    def _load(self) -> dict:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get(self.engine_key, {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable chunk cost model {self.path}: {e}")
+            return {}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            state = {"latency": self.latency.state(), "audio": self.audio.state()}
+            self._unsaved = 0
+        try:
+            models = {}
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    models = json.load(f)
+            models[self.engine_key] = state
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(models, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not save chunk cost model: {e}")
+
+    def observe(self, chars: int, latency_sec: float, audio_sec: float) -> None:
+        if chars <= 0 or latency_sec <= 0:
+            return
+        with self._lock:
+            self.latency.add(chars, latency_sec)
+            if audio_sec > 0:
+                self.audio.add(chars, audio_sec)
+            self._unsaved += 1
+            due = self._unsaved >= SAVE_EVERY
+        if due:
+            self.save()
+
+    def _fits(self) -> tuple:
+        with self._lock:
+            latency, audio = self.latency.coefficients(), self.audio.coefficients()
+        # Calls must get slower with length and produce audio for the fit to be usable
+        if latency is None or audio is None or audio[0] <= 0:
+            return None, None
+        if latency[1] + 2 * latency[2] * settings.CHUNK_MAX_CHARS <= 0:
+            return None, None
+        return latency, audio
+
+    def describe(self) -> Dict[str, Optional[float]]:
+        latency, audio = self._fits()
+        return {
+            "observations": round(self.latency.n, 1),
+            "overhead_sec": round(float(latency[0]), 4) if latency is not None else None,
+            "sec_per_char": round(float(latency[1]), 6) if latency is not None else None,
+            "sec_per_char2": float(latency[2]) if latency is not None else None,
+            "audio_sec_per_char": round(float(audio[0]), 5) if audio is not None else None,
+            "batch_chunk_chars": self._batch_chars(latency) if latency is not None else None,
+        }
+
+    @staticmethod
+    def _batch_chars(latency: np.ndarray) -> int:
+        overhead, _, per_char2 = latency
+        if per_char2 <= 0 or overhead <= 0:
+            chars = settings.CHUNK_MAX_CHARS
+        else:
+            # d/dn of (overhead + b*n + c*n^2) / n is zero at n = sqrt(overhead / c)
+            chars = np.sqrt(overhead / per_char2)
+        return int(min(max(chars, settings.CHUNK_MIN_CHARS), settings.CHUNK_MAX_CHARS))
+
+    def _chars_within(self, latency: np.ndarray, budget_sec: float) -> float:
+        """Longest piece predicted to finish within `budget_sec`."""
+        overhead, per_char, per_char2 = latency
+        remaining = budget_sec - overhead
+        if remaining <= 0:
+            return 0.0
+        if per_char2 <= 1e-12:
+            return remaining / per_char if per_char > 0 else float(settings.CHUNK_MAX_CHARS)
+        return (-per_char + np.sqrt(per_char * per_char + 4 * per_char2 * remaining)) / (2 * per_char2)
+
+    def plan(self, text: str, mode: str = "interactive", speed: float = 1.0) -> List[str]:
+        """Pack `text` into sentence-aligned pieces sized for `mode`."""
+        latency, audio = self._fits()
+        if latency is None:
+            return [text]
+        sentences = split_sentences(text)
+        if len(sentences) <= 1:
+            return [text]
+
+        audio_per_char = float(audio[0]) / max(speed, 0.1)
+        batch_chars = self._batch_chars(latency)
+
+        def limit(produced_chars: int, first: bool) -> int:
+            if mode == "batch":
+                return batch_chars
+            if first:
+                budget = settings.CHUNK_FIRST_AUDIO_TARGET_SEC
+            else:
+                # Synthesise the next piece while the audio so far plays
+                budget = produced_chars * audio_per_char
+            chars = self._chars_within(latency, budget)
+            return int(min(max(chars, settings.CHUNK_MIN_CHARS), batch_chars))
+
+        pieces: List[str] = []
+        current = ""
+        produced = 0
+        target = limit(0, first=True)
+        for sentence in sentences:
+            if current.strip() and len(current) + len(sentence) > target:
+                pieces.append(current.strip())
+                produced += len(current)
+                current = ""
+                target = limit(produced, first=False)
+            current += sentence
+        if current.strip():
+            pieces.append(current.strip())
+        return pieces
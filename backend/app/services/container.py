@@ -0,0 +1,113 @@
+"""Lazily constructed application services.
+
+Importing the API must not load the voice model (or torch, or the OpenAI
+client): the process should start serving health checks at once. Each
+service is built on first use, exactly once even under concurrent first
+requests, and ``warm_up`` builds chosen services on a background thread so
+the model loads while the server is already up.
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Named services created by their factory on first access."""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self._warming = set()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.load_seconds[name] = round(time.perf_counter() - started, 3)
+                logger.info(f"Service '{name}' ready in {self.load_seconds[name]}s")
+            return self._instances[name]
+
+    def loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def proxy(self, name: str) -> "ServiceProxy":
+        return ServiceProxy(self, name)
+
+    def warm_up(self, names: Iterable[str]) -> None:
+        """Build `names` on a background thread; failures are logged, not raised.
+
+        Services already built or being warmed up are skipped.
+        """
+        names = [name for name in names if not self.loaded(name) and name not in self._warming]
+        if not names:
+            return
+        self._warming.update(names)
+
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.error(f"Warm-up of service '{name}' failed: {e}", exc_info=True)
+                finally:
+                    self._warming.discard(name)
+
+        threading.Thread(target=run, name="service_warm_up", daemon=True).start()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            name: {"loaded": self.loaded(name), "load_sec": self.load_seconds.get(name)}
+            for name in self._factories
+        }
+
+
+class ServiceProxy:
+    """Stands in for a service at module level; the first attribute access builds it."""
+
+    def __init__(self, container: ServiceContainer, name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._container.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._container.get(self._name), attr, value)
+
+
+def _voice_service():
+    from app.services.voice_service import VoiceService
+
+    return VoiceService()
+
+
+def _audio_service():
+    from app.services.audio_service import AudioService
+
+    return AudioService()
+
+
+def _llm_service():
+    from app.services.llm_service import LLMService
+
+    return LLMService()
+
+
+services = ServiceContainer()
+services.register("voice", _voice_service)
+services.register("audio", _audio_service)
+services.register("llm", _llm_service)
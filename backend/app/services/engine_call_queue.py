@@ -0,0 +1,133 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("group_key", "fn", "future", "enqueued_at")
+
+    def __init__(self, group_key: Hashable, fn: Callable[[], Any]):
+        self.group_key = group_key
+        self.fn = fn
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EngineCallQueue:
+    """Serialises model calls from all generation workers onto a few engine threads.
+
+    CosyVoice exposes no batched forward pass, so every call still runs on
+    its own. Each of the `workers` engine threads takes the first queued
+    call, keeps collecting for up to `window_ms`, then runs what it collected
+    grouped by `group_key` (voice, instruction, speed) so calls that share a
+    voice prompt run back to back. Each caller blocks until its own result
+    is ready.
+
+    Model concurrency becomes `workers` (ENGINE_WORKERS) instead of
+    GENERATION_WORKERS, and every call can wait up to `window_ms` longer.
+    That only pays off where workers would otherwise fight over the same
+    cores, so it is off by default (ENGINE_CALL_QUEUE=false); measure with
+    load_test.py before enabling it. `initializer` runs first on every
+    engine thread (used to pin it to its cores).
+    """
+
+    def __init__(
+        self,
+        window_ms: float,
+        name: str = "engine",
+        workers: int = 1,
+        initializer: Optional[Callable[[], Any]] = None,
+    ):
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._calls = 0
+        self._wait_sec = 0.0
+        self._same_voice_runs = 0
+        self._initializer = initializer
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"{name}_{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, group_key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+        """Run `fn` on an engine thread; returns (result, queueing info)."""
+        pending = _Pending(group_key, fn)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def _collect(self) -> List[_Pending]:
+        window = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                window.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return window
+
+    def _loop(self) -> None:
+        if self._initializer is not None:
+            try:
+                self._initializer()
+            except Exception as e:
+                logger.warning(f"Engine thread initializer failed: {e}")
+        while True:
+            window = self._collect()
+
+            # Group by key, keeping first-arrival order between groups
+            groups: Dict[Hashable, List[_Pending]] = {}
+            for pending in window:
+                groups.setdefault(pending.group_key, []).append(pending)
+
+            for group in groups.values():
+                for position, pending in enumerate(group):
+                    wait_sec = time.perf_counter() - pending.enqueued_at
+                    with self._stats_lock:
+                        self._calls += 1
+                        self._wait_sec += wait_sec
+                        self._same_voice_runs += position > 0
+                    info = {
+                        "queue_window_calls": len(window),
+                        "queue_same_voice_calls": len(group),
+                        "queue_wait_ms": round(wait_sec * 1000, 2),
+                    }
+                    try:
+                        pending.future.set_result((pending.fn(), info))
+                    except BaseException as e:
+                        pending.future.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "workers": len(self._threads),
+                "window_ms": self.window * 1000,
+                "calls": self._calls,
+                "queued": self._queue.qsize(),
+                "mean_wait_ms": round(self._wait_sec / self._calls * 1000, 2) if self._calls else 0.0,
+                # Calls that ran right after one for the same voice prompt
+                "same_voice_runs": self._same_voice_runs,
+            }
+
+
+def create_call_queue(
+    enabled: bool,
+    window_ms: float,
+    workers: int = 1,
+    initializer: Optional[Callable[[], Any]] = None,
+) -> Optional[EngineCallQueue]:
+    """An EngineCallQueue, or None when disabled: generation workers then call the model directly."""
+    if not enabled:
+        return None
+    logger.info(f"Model calls serialised onto engine threads (window={window_ms}ms, engine_workers={workers})")
+    return EngineCallQueue(window_ms, workers=workers, initializer=initializer)
@@ -0,0 +1,211 @@
+"""Priority scheduling of generation jobs with cooperative cancellation.
+
+Jobs run on their own threads, but only ``workers`` of them may hold a slot
+(run the engine) at once. The engine calls ``checkpoint()`` between model
+calls (sub-chunk pieces). At a checkpoint a job:
+
+* raises ``GenerationCancelled`` if it was cancelled, which releases its slot
+  straight away;
+* yields its slot if it is lower priority than a job waiting for one. It
+  then waits, keeping its place in the queue, and carries on from the same
+  point once a slot is free again.
+
+A checkpoint outside a scheduled job (scripts, benchmarks) does nothing.
+
+``initializer`` runs on a job's thread each time it takes a slot (start and
+resume after preemption) and ``finalizer`` each time it gives one up (end
+and preemption), so per-slot resources such as CPU cores follow the slot.
+Both are best effort: a failing hook is logged and the job still runs, so
+its own error handling always settles the task.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_PREVIEW = -1
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "batch": PRIORITY_BATCH}
+
+
+class GenerationCancelled(Exception):
+    """Raised at a checkpoint of a job that has been cancelled."""
+
+
+class ScheduledJob:
+    """One unit of work submitted to the scheduler."""
+
+    def __init__(
+        self, scheduler: "GenerationScheduler", job_id: str, priority: int, seq: int, fn: Callable, args: tuple
+    ):
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.priority = priority
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.cancelled = threading.Event()
+        self.started = False
+        self.holds_slot = False
+        self.preemptions = 0
+        self._resume = threading.Event()
+
+    def __lt__(self, other: "ScheduledJob") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+current_job: ContextVar[Optional[ScheduledJob]] = ContextVar("current_job", default=None)
+
+
+class GenerationScheduler:
+    """Runs jobs by priority on a fixed number of slots; see module docstring."""
+
+    def __init__(
+        self,
+        workers: int,
+        thread_name_prefix: str = "generation",
+        initializer: Optional[Callable[[], Any]] = None,
+        finalizer: Optional[Callable[[], Any]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.thread_name_prefix = thread_name_prefix
+        self.initializer = initializer
+        self.finalizer = finalizer
+        self._cond = threading.Condition()
+        self._waiting: List[ScheduledJob] = []  # heap of new and preempted jobs
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._running = 0
+        self._seq = itertools.count()
+        self._threads = itertools.count()
+        self.preemptions = 0
+        self.cancelled = 0
+
+    def submit(
+        self, fn: Callable, *args: Any, priority: int = PRIORITY_INTERACTIVE, job_id: Optional[str] = None
+    ) -> ScheduledJob:
+        with self._cond:
+            seq = next(self._seq)
+            job = ScheduledJob(self, job_id or f"job-{seq}", priority, seq, fn, args)
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._waiting, job)
+            self._dispatch()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[ScheduledJob]:
+        """Flag a job; it stops at its next checkpoint (or never starts).
+
+        Returns the job, or None if it is unknown or over. A returned job
+        that has not `started` never will, so its fn does no cleanup.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancelled.set()
+            self.cancelled += 1
+            if job in self._waiting:
+                self._waiting.remove(job)
+                heapq.heapify(self._waiting)
+                if job.started:
+                    # Preempted job: let its thread unwind without a slot
+                    job._resume.set()
+                else:
+                    self._jobs.pop(job_id, None)
+            return job
+
+    def _dispatch(self) -> None:
+        # Caller holds self._cond
+        while self._running < self.workers and self._waiting:
+            job = heapq.heappop(self._waiting)
+            self._running += 1
+            job.holds_slot = True
+            if job.started:
+                job._resume.set()
+            else:
+                job.started = True
+                # A new thread starts with an empty context, so no trace leaks in
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(job,),
+                    name=f"{self.thread_name_prefix}_{next(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+
+    def _hook(self, hook: Optional[Callable[[], Any]], job: ScheduledJob) -> None:
+        if hook is None:
+            return
+        try:
+            hook()
+        except Exception as e:
+            logger.warning(f"Job {job.job_id}: slot hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def _finish(self, job: ScheduledJob) -> None:
+        self._hook(self.finalizer, job)
+        with self._cond:
+            if job.holds_slot:
+                job.holds_slot = False
+                self._running -= 1
+            self._jobs.pop(job.job_id, None)
+            self._dispatch()
+
+    def _run(self, job: ScheduledJob) -> None:
+        current_job.set(job)
+        self._hook(self.initializer, job)
+        try:
+            job.fn(*job.args)
+        except GenerationCancelled:
+            logger.info(f"Job {job.job_id} cancelled")
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}", exc_info=True)
+        finally:
+            self._finish(job)
+
+    def checkpoint(self, job: ScheduledJob) -> None:
+        if job.cancelled.is_set():
+            raise GenerationCancelled(job.job_id)
+
+        with self._cond:
+            top = self._waiting[0] if self._waiting else None
+            if top is None or top.priority >= job.priority:
+                return
+            # A more urgent job is waiting for a slot: hand ours over
+            job.preemptions += 1
+            self.preemptions += 1
+            # Before the slot is handed over, so the next job finds it free
+            self._hook(self.finalizer, job)
+            job._resume.clear()
+            job.holds_slot = False
+            self._running -= 1
+            heapq.heappush(self._waiting, job)
+            self._dispatch()
+        logger.info(f"Job {job.job_id} preempted by {top.job_id}")
+
+        job._resume.wait()
+        if job.cancelled.is_set():
+            raise GenerationCancelled(job.job_id)
+        self._hook(self.initializer, job)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": sum(1 for job in self._waiting if not job.started),
+                "preempted": sum(1 for job in self._waiting if job.started),
+                "preemptions": self.preemptions,
+                "cancelled": self.cancelled,
+            }
+
+
+def checkpoint() -> None:
+    """Cancellation and preemption point; call between model calls."""
+    job = current_job.get()
+    if job is not None:
+        job.scheduler.checkpoint(job)
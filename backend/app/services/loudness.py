@@ -0,0 +1,280 @@
+"""Streaming loudness normalisation with a true-peak limiter.
+
+Loudness is measured per speaker as BS.1770 / EBU R128 integrated loudness:
+K-weighted mean square over 400 ms blocks with 75% overlap, an absolute gate
+at -70 LUFS and a relative gate 10 LU below the ungated mean. Measurement is
+incremental (filter state and block energies are carried between chunks),
+so each chunk is levelled using everything heard from that speaker so far,
+including the chunk itself.
+
+The limiter estimates true peak from a 4x-oversampled signal and applies a
+smoothed gain with ``LOUDNESS_LOOKAHEAD_MS`` of lookahead, so output lags
+input by that much until ``flush()``. Nothing ever needs a second pass over
+the whole output.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+BLOCK_SEC = 0.4
+STEP_SEC = 0.1  # 75% block overlap
+MAX_GAIN_DB = 20.0  # never boost near-silence by more than this
+GAIN_RAMP_SEC = 0.05
+TRUE_PEAK_OVERSAMPLE = 4
+PROCESS_BLOCK = 1 << 16  # samples per internal block; bounds float64/oversampled temporaries
+
+
+def k_weighting_sos(sample_rate: int) -> np.ndarray:
+    """BS.1770 K-weighting (high shelf + high pass) as second-order sections."""
+    # Stage 1: high shelf modelling the acoustic effect of the head
+    gain_db, q, fc = 3.99984385397, 0.7071752369554193, 1681.9744509555319
+    k = np.tan(np.pi * fc / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+        1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0,
+    ]
+
+    # Stage 2: RLB high pass
+    q, fc = 0.5003270373253953, 38.13547087613982
+    k = np.tan(np.pi * fc / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    return np.array([shelf, highpass])
+
+
+# 48-tap, 4-phase interpolation filter for true-peak estimation (BS.1770 Annex 2)
+_PHASE_TAPS = 12
+
+
+@lru_cache(maxsize=1)
+def _polyphase() -> Tuple[List[np.ndarray], float]:
+    """Filter phases and the largest interpolated value for a signal bounded by 1.0.
+
+    Designed on first use so importing this module does not load scipy.signal.
+    """
+    from scipy.signal import firwin
+
+    taps = firwin(_PHASE_TAPS * TRUE_PEAK_OVERSAMPLE, 1 / TRUE_PEAK_OVERSAMPLE) * TRUE_PEAK_OVERSAMPLE
+    phases = [taps[p::TRUE_PEAK_OVERSAMPLE].astype(np.float32) for p in range(TRUE_PEAK_OVERSAMPLE)]
+    return phases, max(float(np.abs(phase).sum()) for phase in phases)
+
+
+def _energy_to_lufs(energy: float) -> float:
+    return -0.691 + 10 * np.log10(max(energy, 1e-12))
+
+
+class LoudnessMeter:
+    """Incremental gated integrated loudness of one mono stream."""
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self._sos = k_weighting_sos(sample_rate)
+        self._zi: Optional[np.ndarray] = None
+        self._step = int(round(STEP_SEC * sample_rate))
+        self._steps_per_block = int(round(BLOCK_SEC / STEP_SEC))
+        self._carry = np.zeros(0, dtype=np.float64)  # weighted samples < one step
+        self._step_energies: List[float] = []  # trailing steps for the next block
+        self._block_energies: List[float] = []
+        self._short_energy_sum = 0.0  # until the first full block exists
+        self._short_samples = 0
+
+    def add(self, audio: np.ndarray) -> None:
+        for start in range(0, audio.size, PROCESS_BLOCK):
+            self._add_block(audio[start : start + PROCESS_BLOCK])
+
+    def _add_block(self, audio: np.ndarray) -> None:
+        from scipy.signal import sosfilt, sosfilt_zi
+
+        if self._zi is None:
+            self._zi = sosfilt_zi(self._sos) * float(audio[0])
+        weighted, self._zi = sosfilt(self._sos, audio.astype(np.float64), zi=self._zi)
+
+        self._short_energy_sum += float(np.dot(weighted, weighted))
+        self._short_samples += weighted.size
+
+        weighted = np.concatenate([self._carry, weighted])
+        n_steps = weighted.size // self._step
+        if n_steps:
+            steps = weighted[: n_steps * self._step].reshape(n_steps, self._step)
+            self._step_energies.extend(np.mean(steps * steps, axis=1).tolist())
+        self._carry = weighted[n_steps * self._step :]
+
+        # Each block is the mean of four consecutive 100 ms steps
+        while len(self._step_energies) >= self._steps_per_block:
+            block = self._step_energies[: self._steps_per_block]
+            self._block_energies.append(sum(block) / self._steps_per_block)
+            del self._step_energies[0]
+
+    def integrated(self) -> Optional[float]:
+        """Gated integrated loudness in LUFS, or None if nothing was heard."""
+        if not self._block_energies:
+            if not self._short_samples:
+                return None
+            return _energy_to_lufs(self._short_energy_sum / self._short_samples)
+
+        energies = np.asarray(self._block_energies)
+        absolute = energies[energies > 10 ** ((ABSOLUTE_GATE_LUFS + 0.691) / 10)]
+        if absolute.size == 0:
+            return None
+        threshold = _energy_to_lufs(float(absolute.mean())) + RELATIVE_GATE_LU
+        relative = absolute[absolute > 10 ** ((threshold + 0.691) / 10)]
+        return _energy_to_lufs(float(relative.mean() if relative.size else absolute.mean()))
+
+
+class TruePeakLimiter:
+    """Lookahead limiter keeping the 4x-oversampled peak under a ceiling.
+
+    The gain at sample n is the trailing mean over L samples of the minimum
+    required gain within L samples either side, which never exceeds the
+    gain required at n itself. Output is delayed by L samples.
+    """
+
+    def __init__(self, sample_rate: int, ceiling_db: float, lookahead_ms: float):
+        self.ceiling = 10 ** (ceiling_db / 20)
+        self.lookahead = max(1, int(sample_rate * lookahead_ms / 1000))
+        history = 2 * self.lookahead - 2
+        self._pending = np.zeros(0, dtype=np.float32)  # samples not yet emitted
+        self._required = np.ones(history, dtype=np.float32)  # gains from n - history
+        self._context = np.zeros(16, dtype=np.float32)  # for oversampling edges
+        self.gain_reduction_db = 0.0
+
+    def _true_peak(self, audio: np.ndarray) -> np.ndarray:
+        polyphase, interpolation_gain = _polyphase()
+        peaks = np.abs(audio)
+        if peaks.max(initial=0.0) * interpolation_gain < self.ceiling:
+            # Interpolated samples cannot reach the ceiling; skip oversampling
+            self._context = np.concatenate([self._context, audio])[-self._context.size :]
+            return peaks
+
+        padded = np.concatenate([self._context, audio])
+        offset = self._context.size + _PHASE_TAPS // 2 - 1  # filter group delay
+        for phase in polyphase[1:]:
+            interpolated = np.convolve(padded, phase)[offset : offset + audio.size]
+            np.maximum(peaks, np.abs(interpolated), out=peaks)
+        self._context = padded[-self._context.size :]
+        return peaks
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        if audio.size <= PROCESS_BLOCK:
+            return self._process_block(audio)
+        return np.concatenate([
+            self._process_block(audio[start : start + PROCESS_BLOCK])
+            for start in range(0, audio.size, PROCESS_BLOCK)
+        ])
+
+    def _process_block(self, audio: np.ndarray) -> np.ndarray:
+        if audio.size:
+            peaks = self._true_peak(audio)
+            required = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-9)).astype(np.float32)
+            self._pending = np.concatenate([self._pending, audio])
+            self._required = np.concatenate([self._required, required])
+
+        from scipy.ndimage import minimum_filter1d
+
+        L = self.lookahead
+        ready = self._pending.size - L + 1
+        if ready <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # _required[i] is the gain needed at pending index i - (2L - 2)
+        window_min = minimum_filter1d(self._required, size=2 * L - 1, mode="nearest")
+        cumulative = np.concatenate([[0.0], np.cumsum(window_min, dtype=np.float64)])
+        # Trailing mean over L window minima ending at pending index j
+        end = np.arange(ready) + 2 * L - 2
+        gain = ((cumulative[end + 1] - cumulative[end + 1 - L]) / L).astype(np.float32)
+
+        out = self._pending[:ready] * gain
+        self.gain_reduction_db = min(self.gain_reduction_db, float(20 * np.log10(gain.min())))
+        self._pending = self._pending[ready:]
+        self._required = self._required[ready:]
+        return out
+
+    def flush(self) -> np.ndarray:
+        """Emit the samples still held back for lookahead."""
+        held = self._pending.size
+        if not held:
+            return np.zeros(0, dtype=np.float32)
+        tail = self._process_block(np.zeros(self.lookahead, dtype=np.float32))
+        return tail[:held]
+
+
+class LoudnessNormalizer:
+    """Levels each speaker to a target loudness as audio streams through.
+
+    ``process(chunk, speaker)`` returns normalised, limited audio (delayed by
+    the limiter lookahead); ``flush()`` returns the remainder. Concatenating
+    every returned array gives output of exactly the input length.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        target_lufs: Optional[float] = None,
+        true_peak_db: Optional[float] = None,
+        lookahead_ms: Optional[float] = None,
+    ):
+        self.sample_rate = sample_rate
+        self.target_lufs = settings.LOUDNESS_TARGET_LUFS if target_lufs is None else target_lufs
+        self.limiter = TruePeakLimiter(
+            sample_rate,
+            settings.LOUDNESS_TRUE_PEAK_DB if true_peak_db is None else true_peak_db,
+            settings.LOUDNESS_LOOKAHEAD_MS if lookahead_ms is None else lookahead_ms,
+        )
+        self._meters: Dict[str, LoudnessMeter] = {}
+        self._gains: Dict[str, float] = {}
+        self._ramp = max(1, int(GAIN_RAMP_SEC * sample_rate))
+
+    def _gain_for(self, speaker: str, audio: np.ndarray) -> float:
+        meter = self._meters.get(speaker)
+        if meter is None:
+            meter = self._meters[speaker] = LoudnessMeter(self.sample_rate)
+        meter.add(audio)
+        loudness = meter.integrated()
+        if loudness is None:
+            return self._gains.get(speaker, 1.0)
+        gain_db = min(self.target_lufs - loudness, MAX_GAIN_DB)
+        return float(10 ** (gain_db / 20))
+
+    def process(self, audio: np.ndarray, speaker: str = "0") -> np.ndarray:
+        audio = np.ascontiguousarray(audio, dtype=np.float32).reshape(-1)
+        if audio.size == 0:
+            return audio
+
+        previous = self._gains.get(speaker)
+        gain = self._gain_for(speaker, audio)
+        self._gains[speaker] = gain
+
+        if previous is None or previous == gain:
+            levelled = audio * gain
+        else:
+            # Ramp from the speaker's previous gain to avoid a level step
+            envelope = np.full(audio.size, gain, dtype=np.float32)
+            n = min(self._ramp, audio.size)
+            envelope[:n] = np.linspace(previous, gain, n, dtype=np.float32)
+            levelled = audio * envelope
+
+        return self.limiter.process(levelled)
+
+    def flush(self) -> np.ndarray:
+        return self.limiter.flush()
+
+    def normalize(self, audio: np.ndarray, speaker: str = "0") -> np.ndarray:
+        """Normalise a complete array (process + flush)."""
+        return np.concatenate([self.process(audio, speaker), self.flush()])
+
+    def loudness(self) -> Dict[str, Optional[float]]:
+        """Measured input loudness per speaker, in LUFS."""
+        return {speaker: meter.integrated() for speaker, meter in self._meters.items()}
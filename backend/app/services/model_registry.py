@@ -0,0 +1,159 @@
+"""Several CosyVoice variants served by one process.
+
+``MODEL_DIR`` is served as ``"default"``; ``MODEL_VARIANTS`` adds named
+variants (e.g. a small fast model for previews). Each variant gets its own
+engine, created on its first request. When model calls are queued onto
+engine threads (ENGINE_CALL_QUEUE), all engines share the first
+engine's queue, so they run on the same pinned threads instead of
+oversubscribing the cores.
+
+Resident models are kept under ``MODEL_MEMORY_BUDGET_MB``: before a model
+is created or reloaded, the least recently used models with no request in
+flight are unloaded until the resident ones plus the incoming one fit, so
+peak memory stays within the budget. The incoming size is the model's last
+measured footprint, else ``MODEL_SIZES_MB``; once loaded the budget is
+checked again against the measured size. An unloaded engine keeps its
+metrics and reloads on its next request (see model_residency).
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "default"
+
+
+class UnknownModelError(ValueError):
+    pass
+
+
+def configured_models() -> Dict[str, Path]:
+    """Model directories by name, from settings (nothing is loaded).
+
+    Relative variant paths are taken from the backend directory, like MODEL_DIR.
+    """
+    variants = {name: settings.BASE_DIR / path for name, path in settings.MODEL_VARIANTS.items()}
+    return {DEFAULT_MODEL: settings.MODEL_DIR, **variants}
+
+
+class ModelRegistry:
+    """Engines by model name, created on demand and evicted LRU under a memory budget."""
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        model_dirs: Dict[str, Path],
+        budget_mb: float = 0.0,
+        model_sizes_mb: Optional[Dict[str, float]] = None,
+    ):
+        """`factory(model_dir=, model_name=, call_queue=)` builds an engine.
+
+        `model_sizes_mb` gives the expected size of variants not loaded yet.
+        """
+        self._factory = factory
+        self.model_dirs = dict(model_dirs)
+        self.budget_mb = budget_mb
+        self.model_sizes_mb = dict(model_sizes_mb or {})
+        self._engines: Dict[str, Any] = {}
+        self._create_locks = {name: threading.Lock() for name in self.model_dirs}
+        self._lock = threading.Lock()
+        self.evictions: Dict[str, int] = {name: 0 for name in self.model_dirs}
+
+    def names(self) -> list:
+        return list(self.model_dirs)
+
+    def resolve(self, name: Optional[str]) -> str:
+        name = name or DEFAULT_MODEL
+        if name not in self.model_dirs:
+            raise UnknownModelError(f"Unknown model '{name}' (available: {', '.join(self.model_dirs)})")
+        return name
+
+    def get(self, name: Optional[str] = None) -> Any:
+        """The engine for `name`, created (and its model loaded) on first use."""
+        name = self.resolve(name)
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        with self._create_locks[name]:
+            if name not in self._engines:
+                with self._lock:
+                    call_queue = next((e.call_queue for e in self._engines.values()), None)
+                self.enforce_budget(incoming_mb=self.expected_mb(name))
+                engine = self._factory(
+                    model_dir=str(self.model_dirs[name]), model_name=name, call_queue=call_queue
+                )
+                with self._lock:
+                    self._engines[name] = engine
+                logger.info(f"Model '{name}' registered from {self.model_dirs[name]}")
+            return self._engines[name]
+
+    @contextmanager
+    def use(self, name: Optional[str] = None) -> Iterator[Any]:
+        """Hold the engine for `name` resident for the block, then enforce the budget."""
+        name = self.resolve(name)
+        engine = self.get(name)
+
+        def make_room():
+            # Before a reload; the check below then uses the measured size
+            self.enforce_budget(keep=engine, incoming_mb=self.expected_mb(name))
+
+        with engine.model_in_use(before_load=make_room):
+            self.enforce_budget(keep=engine)
+            yield engine
+
+    def expected_mb(self, name: str) -> float:
+        """Memory `name` needs when (re)loaded: last measured, else configured."""
+        engine = self._engines.get(name)
+        measured = engine is not None and (engine.footprint_mb or engine.load_rss_mb)
+        return measured or self.model_sizes_mb.get(name, 0.0)
+
+    def enforce_budget(self, keep: Any = None, incoming_mb: float = 0.0) -> None:
+        """Unload idle models, least recently used first, until resident + `incoming_mb` fit."""
+        if self.budget_mb <= 0:
+            return
+        with self._lock:
+            engines = dict(self._engines)
+        total = incoming_mb + sum(engine.memory_mb() for engine in engines.values())
+        # Least recently used first
+        for name, engine in sorted(engines.items(), key=lambda item: item[1].last_used):
+            if total <= self.budget_mb:
+                break
+            freed = engine.memory_mb()
+            if engine is keep or not freed:
+                continue
+            if engine.unload(f"memory budget {self.budget_mb:.0f} MB"):
+                total -= freed
+                with self._lock:
+                    self.evictions[name] += 1
+        if total > self.budget_mb:
+            logger.warning(
+                f"Resident models need {total:.0f} MB, over the {self.budget_mb:.0f} MB budget "
+                f"(the rest are in use)"
+            )
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            engines = dict(self._engines)
+            evictions = dict(self.evictions)
+        models = {}
+        for name, model_dir in self.model_dirs.items():
+            engine = engines.get(name)
+            entry = {"model_dir": str(model_dir), "evictions": evictions[name]}
+            if engine is None:
+                entry["state"] = "not_created"
+            else:
+                entry.update(engine.describe_residency())
+                entry["memory_mb"] = engine.memory_mb()
+                entry.update(engine.describe_metrics())
+            models[name] = entry
+        return {
+            "budget_mb": self.budget_mb or None,
+            "resident_mb": round(sum(engine.memory_mb() for engine in engines.values()), 1),
+            "models": models,
+        }
@@ -0,0 +1,80 @@
+"""Idle unloading of the voice model and memory accounting.
+
+An engine that has served no request for ``MODEL_IDLE_UNLOAD_SEC`` drops its
+model and the caches tied to it (prompt features, the in-memory text
+cache), then hands freed memory back to the OS. The next request reloads
+it transparently. Memory-mapped weights (see weight_store) stay in the page
+cache, so a reload is mostly mapping pages again. The disk text cache and
+the chunk cost model are kept across unloads.
+"""
+
+import gc
+import sys
+import ctypes
+import logging
+import threading
+from typing import Any, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+TORCH_MODULES = ("llm", "flow", "hift")
+
+
+def process_rss_mb() -> float:
+    return round(psutil.Process().memory_info().rss / 1e6, 1)
+
+
+def model_footprint_mb(model: Any) -> Optional[float]:
+    """Bytes of parameters and buffers in the model's torch modules, or None."""
+    inner = getattr(model, "model", None)
+    total = 0
+    found = False
+    for name in TORCH_MODULES:
+        module = getattr(inner, name, None)
+        if module is None or not hasattr(module, "parameters"):
+            continue
+        found = True
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return round(total / 1e6, 1) if found else None
+
+
+def release_memory() -> None:
+    """Collect garbage and return freed heap (and cached GPU memory) to the OS."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        try:
+            # glibc keeps freed arenas mapped unless asked to trim them
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class IdleUnloader:
+    """Background thread asking an engine to unload once it has been idle long enough."""
+
+    def __init__(self, engine: Any, idle_sec: float):
+        self.engine = engine
+        self.idle_sec = idle_sec
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model_idle_unloader", daemon=True)
+
+    def start(self) -> "IdleUnloader":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        interval = min(max(self.idle_sec / 4, 0.25), 30.0)
+        while not self._stop.wait(interval):
+            try:
+                self.engine.unload_if_idle(self.idle_sec)
+            except Exception as e:
+                logger.error(f"Idle unload failed: {e}", exc_info=True)
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.models import VoiceProfile
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+_project_locks: Dict[str, threading.Lock] = {}
+_project_locks_guard = threading.Lock()
+
+
+def _project_lock(project_id: str) -> threading.Lock:
+    with _project_locks_guard:
+        return _project_locks.setdefault(project_id, threading.Lock())
+
+
+class ProjectRender:
+    """Render manifest of one project: script lines mapped to stored audio spans.
+
+    Each line's raw (un-normalised) engine output is stored under a key
+    derived from everything that affects synthesis: speaker slot, voice,
+    text (including emotion tags), speed, engine and sample rate. When an
+    edited script is re-submitted, lines whose key is already stored are
+    reused and only new or changed lines reach the model. Loudness is
+    applied when the spans are stitched, so reused and fresh lines are
+    levelled together.
+    """
+
+    def __init__(self, project_id: str, engine: str, sample_rate: int):
+        self.project_id = project_id
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.project_dir = Path(settings.PROJECTS_DIR) / project_id
+        self.spans_dir = self.project_dir / "spans"
+        self.manifest_path = self.project_dir / "manifest.json"
+        self.lines: List[dict] = []
+        self.reused = 0
+        self.rendered = 0
+        self._position = 0  # samples stitched so far
+
+    @classmethod
+    @contextmanager
+    def open(cls, project_id: str, engine: str, sample_rate: int) -> Iterator["ProjectRender"]:
+        """Hold the project for one render; concurrent renders of it queue."""
+        with _project_lock(project_id):
+            render = cls(project_id, engine, sample_rate)
+            render.spans_dir.mkdir(parents=True, exist_ok=True)
+            yield render
+
+    @staticmethod
+    def load_manifest(project_id: str) -> Optional[dict]:
+        """The last saved manifest of `project_id`, or None."""
+        if not re.fullmatch(r"[A-Za-z0-9_\-]{1,64}", project_id):
+            return None
+        path = Path(settings.PROJECTS_DIR) / project_id / "manifest.json"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def line_key(
+        self, speaker: int, profile: Optional[VoiceProfile], text: str, speed: float,
+        quality: str = "standard",
+    ) -> str:
+        parts = [
+            self.engine,
+            str(self.sample_rate),
+            str(speaker),
+            profile.id if profile else "",
+            f"{speed:.3f}",
+            text.strip(),
+        ]
+        if quality != "standard":
+            # Standard renders keep the keys they had before presets existed
+            parts.append(quality)
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+    def _span_path(self, key: str) -> Path:
+        return self.spans_dir / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Stored raw audio for a line, or None if it must be synthesised."""
+        path = self._span_path(key)
+        if not path.exists():
+            return None
+        try:
+            return np.load(path)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable span {path.name}: {e}")
+            return None
+
+    def put(self, key: str, audio: np.ndarray) -> None:
+        path = self._span_path(key)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, np.asarray(audio, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def record(
+        self,
+        index: int,
+        speaker: int,
+        profile: Optional[VoiceProfile],
+        text: str,
+        speed: float,
+        key: str,
+        samples: int,
+        reused: bool,
+    ) -> None:
+        """Append a line and its span in the stitched output."""
+        self.lines.append({
+            "index": index,
+            "speaker": speaker,
+            "voice_id": profile.id if profile else None,
+            "text": text,
+            "speed": speed,
+            "key": key,
+            "start_sample": self._position,
+            "end_sample": self._position + samples,
+            "reused": reused,
+        })
+        self._position += samples
+        if reused:
+            self.reused += 1
+        else:
+            self.rendered += 1
+
+    def save(self) -> None:
+        """Write the manifest and drop spans no line refers to any more."""
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "project_id": self.project_id,
+            "engine": self.engine,
+            "sample_rate": self.sample_rate,
+            "updated_at": datetime.now().isoformat(),
+            "lines": self.lines,
+        }
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+        live = {line["key"] for line in self.lines}
+        for span_file in self.spans_dir.glob("*.npy"):
+            if span_file.stem not in live:
+                try:
+                    span_file.unlink()
+                except OSError:
+                    pass
+
+        logger.info(
+            f"Project {self.project_id}: {self.rendered} lines rendered, {self.reused} reused"
+        )
@@ -0,0 +1,144 @@
+"""Reuse of prompt features across model calls with the same voice and instruction.
+
+For every ``inference_instruct2`` call CosyVoice's frontend tokenises the
+instruction and runs the speech tokenizer and speaker encoder over the
+reference clip, although only the target text differs between sub-chunks.
+CosyVoice can keep those features under a ``zero_shot_spk_id``
+(``add_zero_shot_spk``) and skip that work on later calls. This cache
+registers one such id per (voice clip, instruction). Entries are evicted in
+least-recently-used order once their tensors exceed ``PROMPT_CACHE_MAX_MB``.
+Entries in use by a running call are never evicted.
+
+CosyVoice's ``frontend_zero_shot`` returns the stored entry itself and
+writes the target text into it, and ``frontend_instruct2`` then deletes the
+prompt speech tokens from it; on the shared entry the next call would fail
+and concurrent calls would race. The cache therefore swaps
+``frontend.spk2info`` for a mapping that hands out a shallow copy of an
+entry on every lookup.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _nbytes(value: Any) -> int:
+    if hasattr(value, "element_size") and hasattr(value, "numel"):
+        return int(value.element_size() * value.numel())  # torch tensor
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)  # numpy array
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class _CopyOnReadSpkInfo(dict):
+    """``spk2info`` whose lookups return a shallow copy, so callers may mutate it."""
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        return dict(value) if isinstance(value, dict) else value
+
+
+class PromptCache:
+    """Byte-bounded LRU of zero-shot speaker entries in ``model.frontend.spk2info``."""
+
+    def __init__(self, model: Any, max_bytes: int):
+        self.model = model
+        frontend = model.frontend
+        if not isinstance(frontend.spk2info, _CopyOnReadSpkInfo):
+            frontend.spk2info = _CopyOnReadSpkInfo(frontend.spk2info)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # spk id -> bytes
+        self._in_use: Dict[str, int] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def supported(model: Any) -> bool:
+        frontend = getattr(model, "frontend", None)
+        return hasattr(model, "add_zero_shot_spk") and isinstance(getattr(frontend, "spk2info", None), dict)
+
+    @staticmethod
+    def _key(prompt_wav: str, instruct_text: str) -> str:
+        try:
+            # Re-recorded clips under the same path get a new entry
+            mtime = os.path.getmtime(prompt_wav)
+        except OSError:
+            mtime = 0.0
+        digest = hashlib.sha256(f"{prompt_wav}\x1f{mtime}\x1f{instruct_text}".encode("utf-8")).hexdigest()
+        return f"lyrebird-prompt-{digest[:24]}"
+
+    @contextmanager
+    def acquire(self, prompt_wav: str, instruct_text: str) -> Iterator[Optional[str]]:
+        """Yield the zero-shot speaker id for this prompt, registering it if new.
+
+        Yields None if registration fails; the caller then runs uncached.
+        """
+        spk_id = self._key(prompt_wav, instruct_text)
+        with self._lock:
+            self._in_use[spk_id] = self._in_use.get(spk_id, 0) + 1
+            cached = spk_id in self._entries
+            if cached:
+                self._entries.move_to_end(spk_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        try:
+            registered = cached or self._register(spk_id, prompt_wav, instruct_text)
+            yield spk_id if registered else None
+        finally:
+            with self._lock:
+                self._in_use[spk_id] -= 1
+                if not self._in_use[spk_id]:
+                    del self._in_use[spk_id]
+                self._evict()
+
+    def _register(self, spk_id: str, prompt_wav: str, instruct_text: str) -> bool:
+        try:
+            # Concurrent misses for one key may both extract; the later one wins
+            self.model.add_zero_shot_spk(instruct_text, prompt_wav, spk_id)
+        except Exception as e:
+            logger.warning(f"Prompt cache: could not register {prompt_wav}: {e}")
+            return False
+        size = _nbytes(self.model.frontend.spk2info.get(spk_id))
+        with self._lock:
+            self.bytes += size - self._entries.get(spk_id, 0)
+            self._entries[spk_id] = size
+        return True
+
+    def _evict(self) -> None:
+        # Caller holds self._lock
+        for spk_id in list(self._entries):
+            if self.bytes <= self.max_bytes:
+                break
+            if spk_id in self._in_use:
+                continue
+            self.bytes -= self._entries.pop(spk_id)
+            self.model.frontend.spk2info.pop(spk_id, None)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "mb": round(self.bytes / 1e6, 2),
+                "max_mb": round(self.max_bytes / 1e6, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,170 @@
+"""Named speed/quality presets and the engine knobs behind them.
+
+A preset is chosen per request (``preset_scope``) and applied around each
+model call (``model_call_scope``), on whichever thread runs the call. Hooks installed once
+on the loaded CosyVoice model read the active preset:
+
+* flow matching: the ODE step count passed to ``flow.decoder`` (CosyVoice
+  hard-codes 10 in ``flow.inference``);
+* LLM sampling: ``top_k`` / ``top_p`` of ``llm.sampling``;
+* precision: bf16 autocast around the call on CPU (the checkpoint is loaded
+  once, so fp16/fp32 weights cannot change per request).
+
+The HiFT vocoder has no quality setting in CosyVoice, so presets do not
+change it. Hooks are installed only where the expected attribute exists;
+knobs a model does not expose are reported as unavailable.
+"""
+
+import sys
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QualityPreset(BaseModel):
+    name: str
+    description: str
+    flow_steps: int
+    top_k: int
+    top_p: float
+    autocast: Optional[str] = None  # torch dtype name used for CPU autocast
+
+
+PRESETS: Dict[str, QualityPreset] = {
+    preset.name: preset
+    for preset in (
+        QualityPreset(
+            name="draft",
+            description="Fastest; for auditioning lines",
+            flow_steps=4, top_k=10, top_p=0.7, autocast="bfloat16",
+        ),
+        QualityPreset(
+            name="standard",
+            description="CosyVoice defaults",
+            flow_steps=10, top_k=25, top_p=0.8,
+        ),
+        QualityPreset(
+            name="studio",
+            description="Final renders; more flow-matching steps",
+            flow_steps=20, top_k=25, top_p=0.8,
+        ),
+    )
+}
+DEFAULT_PRESET = settings.DEFAULT_QUALITY_PRESET if settings.DEFAULT_QUALITY_PRESET in PRESETS else "standard"
+
+_active_preset: ContextVar[QualityPreset] = ContextVar("quality_preset", default=PRESETS[DEFAULT_PRESET])
+
+
+def current_preset() -> QualityPreset:
+    return _active_preset.get()
+
+
+def get_preset(name: Optional[str]) -> QualityPreset:
+    return PRESETS.get(name or DEFAULT_PRESET, PRESETS[DEFAULT_PRESET])
+
+
+@contextmanager
+def preset_scope(name: Optional[str]) -> Iterator[QualityPreset]:
+    """Make preset `name` the one requested in this context."""
+    token = _active_preset.set(get_preset(name))
+    try:
+        yield _active_preset.get()
+    finally:
+        _active_preset.reset(token)
+
+
+@contextmanager
+def model_call_scope(name: Optional[str]) -> Iterator[QualityPreset]:
+    """Apply preset `name` to model calls made on this thread.
+
+    Engine threads do not inherit the caller's context, so the preset name
+    is handed over explicitly and re-entered here.
+    """
+    with preset_scope(name) as preset, ExitStack() as stack:
+        torch = sys.modules.get("torch")
+        if preset.autocast and torch is not None and settings.LOCAL_DEVICE == "cpu":
+            stack.enter_context(torch.autocast("cpu", dtype=getattr(torch, preset.autocast)))
+        yield preset
+
+
+def install_model_hooks(model: Any) -> List[str]:
+    """Route the knobs of the active preset into a loaded CosyVoice model.
+
+    Returns the names of the knobs that could be hooked.
+    """
+    inner = getattr(model, "model", None)
+    installed: List[str] = []
+
+    decoder = getattr(getattr(inner, "flow", None), "decoder", None)
+    if decoder is not None and hasattr(decoder, "forward"):
+        original_forward = decoder.forward
+
+        def forward(*args, **kwargs):
+            if "n_timesteps" in kwargs:
+                kwargs["n_timesteps"] = current_preset().flow_steps
+            return original_forward(*args, **kwargs)
+
+        decoder.forward = forward  # nn.Module.__call__ dispatches to the instance attribute
+        installed.append("flow_steps")
+
+    llm = getattr(inner, "llm", None)
+    if llm is not None and callable(getattr(llm, "sampling", None)):
+        original_sampling = llm.sampling
+
+        def sampling(*args, **kwargs):
+            preset = current_preset()
+            return original_sampling(*args, **{**kwargs, "top_k": preset.top_k, "top_p": preset.top_p})
+
+        llm.sampling = sampling
+        installed.append("sampling")
+
+    if "torch" in sys.modules and settings.LOCAL_DEVICE == "cpu":
+        installed.append("autocast")
+
+    logger.info(f"Quality preset knobs available: {installed or 'none'}")
+    return installed
+
+
+class PresetStats:
+    """Measured real-time factor (compute seconds per audio second) per preset."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compute: Dict[str, float] = {}
+        self._audio: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+
+    def record(self, preset: str, compute_sec: float, audio_sec: float) -> None:
+        if audio_sec <= 0:
+            return
+        with self._lock:
+            self._compute[preset] = self._compute.get(preset, 0.0) + compute_sec
+            self._audio[preset] = self._audio.get(preset, 0.0) + audio_sec
+            self._calls[preset] = self._calls.get(preset, 0) + 1
+
+    def rtf(self, preset: str) -> Optional[float]:
+        with self._lock:
+            audio = self._audio.get(preset)
+            return round(self._compute[preset] / audio, 4) if audio else None
+
+    def describe(self, knobs: List[str]) -> List[dict]:
+        return [
+            {
+                **preset.model_dump(),
+                "measured_rtf": self.rtf(name),
+                "calls": self._calls.get(name, 0),
+                "knobs_applied": knobs,
+            }
+            for name, preset in PRESETS.items()
+        ]
+
+
+preset_stats = PresetStats()
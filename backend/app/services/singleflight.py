@@ -0,0 +1,119 @@
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Fields of the task record that follow the shared job
+JOB_STATE_FIELDS = ("status", "result", "error")
+
+
+def request_fingerprint(request: BaseModel) -> str:
+    """Hash of every request field (text, voices, speed, pitch, format, ...)."""
+    payload = json.dumps(request.model_dump(mode="json"), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces identical in-flight generation requests into one job.
+
+    A request whose fingerprint matches a job that is still pending or
+    running attaches to that job instead of starting another synthesis.
+    Every task id keeps its own record in `tasks` (creation time, request
+    id) pointing at the shared job through `job_id`. State changes are
+    copied to every attached task, and `ref_count` says how many tasks share
+    the job. Cancelling a task detaches it; the job itself is only stopped
+    when no task is left. Once a job completes, fails or loses its last task
+    it leaves the in-flight table, so a later identical request starts fresh.
+    """
+
+    def __init__(self, tasks: Dict[str, dict]):
+        self.tasks = tasks
+        self._jobs: Dict[str, dict] = {}  # job_id -> job
+        self._inflight: Dict[str, str] = {}  # fingerprint -> job_id
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def attach(self, fingerprint: str, task_id: str) -> Tuple[dict, bool]:
+        """Join the in-flight job for `fingerprint`, or open one owned by `task_id`.
+
+        Returns (job, created); the caller must schedule the job if created.
+        """
+        with self._lock:
+            job_id = self._inflight.get(fingerprint)
+            created = job_id is None
+            if created:
+                job_id = task_id
+                job = {"job_id": job_id, "fingerprint": fingerprint, "task_ids": []}
+                job.update({field: self.tasks[task_id][field] for field in JOB_STATE_FIELDS})
+                self._jobs[job_id] = job
+                self._inflight[fingerprint] = job_id
+            else:
+                job = self._jobs[job_id]
+                self.coalesced += 1
+
+            job["task_ids"].append(task_id)
+            self.tasks[task_id].update({field: job[field] for field in JOB_STATE_FIELDS})
+            self.tasks[task_id]["job_id"] = job_id
+            self._sync_ref_count(job)
+            return job, created
+
+    def task_ids(self, job_id: str) -> List[str]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return list(job["task_ids"]) if job else []
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Set job state and mirror it on every attached task."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            for task_id in job["task_ids"]:
+                self.tasks[task_id].update(fields)
+
+    def detach(self, task_id: str, **fields: Any) -> int:
+        """Drop `task_id` from its job, setting `fields` on the task alone.
+
+        Returns how many tasks still share the job. At zero the job is closed
+        (as by finish), and the caller should stop its work.
+        """
+        with self._lock:
+            job = self._jobs.get(self.tasks[task_id].get("job_id"))
+            self.tasks[task_id].update(fields)
+            if job is None or task_id not in job["task_ids"]:
+                return 0
+            job["task_ids"].remove(task_id)
+            self._sync_ref_count(job)
+            self.tasks[task_id]["ref_count"] = 0
+            if not job["task_ids"]:
+                self._close(job)
+            return len(job["task_ids"])
+
+    def finish(self, job_id: str) -> Optional[dict]:
+        """Close the job to new attachments once it has a final state."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._close(job)
+                if len(job["task_ids"]) > 1:
+                    logger.info(f"Job {job_id} served {len(job['task_ids'])} identical requests")
+            return job
+
+    def _close(self, job: dict) -> None:
+        self._jobs.pop(job["job_id"], None)
+        if self._inflight.get(job["fingerprint"]) == job["job_id"]:
+            del self._inflight[job["fingerprint"]]
+
+    def _sync_ref_count(self, job: dict) -> None:
+        for task_id in job["task_ids"]:
+            self.tasks[task_id]["ref_count"] = len(job["task_ids"])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._jobs), "coalesced": self.coalesced}
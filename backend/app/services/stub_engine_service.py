@@ -0,0 +1,165 @@
+import time
+import hashlib
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.services.quality_presets import PRESETS, current_preset
+from app.services.voice_engine_service import LocalLyrebirdService
+
+logger = logging.getLogger(__name__)
+
+STUB_SPEAKERS = ["stub-female", "stub-male"]
+
+
+def _seed(*parts: str) -> int:
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+class StubFrontend:
+    """Text frontend stand-in: normalisation costs ``normalize_sec`` per call."""
+
+    def __init__(self, normalize_sec: float = 0.0):
+        self.normalize_sec = normalize_sec
+        self.spk2info = {}
+
+    def text_normalize(self, text, split=True, text_frontend=True):
+        time.sleep(self.normalize_sec)
+        return [text] if split else text
+
+
+class StubCosyVoiceModel:
+    """Stand-in for the CosyVoice AutoModel that needs no weights.
+
+    Each inference call sleeps for a fixed overhead plus ``rtf`` seconds per
+    second of audio, then yields deterministic synthetic speech: the same
+    (text, voice, instruction, speed) always produces the same samples.
+    The active quality preset scales the compute time as flow-matching steps
+    would: half of it is taken to be the LLM, half the flow decoder. Calls
+    that bring a reference clip also pay ``prompt_sec`` of prompt feature
+    extraction unless they name a speaker registered with
+    ``add_zero_shot_spk``. Such calls mutate the entry they look up the
+    way CosyVoice's frontend does (text written in, prompt speech tokens
+    deleted), so a second use of a shared entry fails as it would upstream.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        latency_sec: float = 0.05,
+        rtf: float = 0.3,
+        chars_per_sec: float = 15.0,
+        prompt_sec: float = 0.0,
+        normalize_sec: float = 0.0,
+    ):
+        self.sample_rate = sample_rate
+        self.latency_sec = latency_sec
+        self.rtf = rtf
+        self.chars_per_sec = chars_per_sec
+        self.prompt_sec = prompt_sec
+        self.frontend = StubFrontend(normalize_sec)
+
+    def list_available_spks(self) -> List[str]:
+        return list(STUB_SPEAKERS)
+
+    def _synthesize(self, text: str, voice: str, instruct: str, speed: float) -> np.ndarray:
+        text = "".join(self.frontend.text_normalize(text, split=True))
+        duration = max(len(text) / self.chars_per_sec, 0.2) / max(speed, 0.1)
+        n = int(duration * self.sample_rate)
+
+        # Emulate model compute time
+        flow_scale = current_preset().flow_steps / PRESETS["standard"].flow_steps
+        time.sleep(self.latency_sec + self.rtf * duration * (0.5 + 0.5 * flow_scale))
+
+        rng = np.random.default_rng(_seed(voice, instruct, text, f"{speed:.3f}"))
+        t = np.arange(n, dtype=np.float32) / self.sample_rate
+
+        # Voice-dependent fundamental with a slow "intonation" wobble
+        f0 = 90.0 + (_seed(voice) % 160)
+        wobble = 1.0 + 0.05 * np.sin(2 * np.pi * rng.uniform(0.5, 2.0) * t)
+        phase = 2 * np.pi * f0 * np.cumsum(wobble) / self.sample_rate
+        audio = sum(np.sin(k * phase) / k for k in range(1, 5))
+
+        # Syllable-like amplitude envelope plus a little breath noise
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4.0 * t + rng.uniform(0, np.pi)) ** 2
+        audio = audio * envelope + 0.02 * rng.standard_normal(n)
+        audio = 0.3 * audio / max(float(np.max(np.abs(audio))), 1e-6)
+        return audio.astype(np.float32)[np.newaxis, :]  # (1, samples) like tts_speech
+
+    def add_zero_shot_spk(self, prompt_text, prompt_wav, zero_shot_spk_id):
+        time.sleep(self.prompt_sec)
+        self.frontend.spk2info[zero_shot_spk_id] = {
+            "prompt_text": np.zeros(len(prompt_text), dtype=np.int32),
+            "llm_embedding": np.zeros(192, dtype=np.float32),
+            "llm_prompt_speech_token": np.zeros(25, dtype=np.int32),
+            "llm_prompt_speech_token_len": 25,
+        }
+        return True
+
+    def inference_instruct2(self, tts_text, instruct_text, prompt_wav, zero_shot_spk_id="", speed=1.0, **kwargs):
+        if zero_shot_spk_id in self.frontend.spk2info:
+            # As frontend_zero_shot + frontend_instruct2 treat the looked-up entry
+            model_input = self.frontend.spk2info[zero_shot_spk_id]
+            model_input["text"] = tts_text
+            model_input["text_len"] = len(tts_text)
+            del model_input["llm_prompt_speech_token"]
+            del model_input["llm_prompt_speech_token_len"]
+        else:
+            time.sleep(self.prompt_sec)
+        yield {"tts_speech": self._synthesize(tts_text, str(prompt_wav), instruct_text, speed)}
+
+    def inference_instruct(self, tts_text, spk_id, instruct_text, speed=1.0, **kwargs):
+        yield {"tts_speech": self._synthesize(tts_text, spk_id, instruct_text, speed)}
+
+    def inference_sft(self, tts_text, spk_id, speed=1.0, **kwargs):
+        yield {"tts_speech": self._synthesize(tts_text, spk_id, "", speed)}
+
+    def inference_cross_lingual(self, tts_text, prompt_wav, speed=1.0, **kwargs):
+        time.sleep(self.prompt_sec)
+        yield {"tts_speech": self._synthesize(tts_text, str(prompt_wav), "", speed)}
+
+
+class StubLyrebirdService(LocalLyrebirdService):
+    """Engine backend with the LocalLyrebirdService interface and synthetic audio.
+
+    Text parsing, sub-chunk splitting and tracing run through the real engine
+    code; only the model is replaced. Use it to benchmark and regression-test the
+    scheduler, caches, storage and API without the CosyVoice weights.
+    """
+
+    def __init__(
+        self,
+        sample_rate: Optional[int] = None,
+        latency_sec: Optional[float] = None,
+        rtf: Optional[float] = None,
+        **engine_kwargs,
+    ):
+        self.stub_sample_rate = sample_rate or settings.STUB_SAMPLE_RATE
+        self.stub_latency_sec = settings.STUB_LATENCY_SEC if latency_sec is None else latency_sec
+        self.stub_rtf = settings.STUB_RTF if rtf is None else rtf
+        super().__init__(**engine_kwargs)
+
+    def _setup_path(self):
+        """The stub needs no CosyVoice checkout."""
+
+    def _install_preset_hooks(self) -> List[str]:
+        # StubCosyVoiceModel reads the active preset itself
+        return ["flow_steps"]
+
+    def _load_model(self):
+        self.weights = None  # no checkpoints to map
+        self.model = StubCosyVoiceModel(
+            sample_rate=self.stub_sample_rate,
+            latency_sec=self.stub_latency_sec,
+            rtf=self.stub_rtf,
+            chars_per_sec=settings.STUB_CHARS_PER_SEC,
+            prompt_sec=settings.STUB_PROMPT_SEC,
+            normalize_sec=settings.STUB_NORMALIZE_SEC,
+        )
+        logger.info(
+            f"Stub engine ready (sr={self.stub_sample_rate}, latency={self.stub_latency_sec}s, "
+            f"rtf={self.stub_rtf})"
+        )
@@ -0,0 +1,177 @@
+"""Memoised text normalisation and tokenisation for the CosyVoice frontend.
+
+CosyVoice normalises (WeText or ttsfrd) and tokenises the target text on
+every call, and the instruction on every uncached prompt, although our
+scripts repeat the same phrases and instructions constantly. This wraps
+``frontend.text_normalize`` and ``frontend.tokenizer.encode`` with a
+two-tier cache:
+
+* an in-process LRU of ``TEXT_CACHE_MAX_ENTRIES`` results;
+* an optional SQLite file (``TEXT_CACHE_PATH``, WAL mode) shared by every
+  worker process on the host, pruned to ``TEXT_CACHE_DISK_MAX_ENTRIES``.
+
+Keys include the model directory, so a different model (and its text
+frontend) never sees another's results. Only plain-string inputs are
+cached; streamed (generator) text passes straight through.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _stable(value: Any) -> Any:
+    # Sets (e.g. allowed_special) iterate in a per-process order
+    return sorted(value, key=str) if isinstance(value, (set, frozenset)) else str(value)
+
+
+class _DiskTier:
+    """Results shared between processes through one SQLite file."""
+
+    def __init__(self, path: Path, max_entries: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Oldest rows (lowest rowid) go first
+        self._conn.execute(
+            "DELETE FROM memo WHERE rowid NOT IN (SELECT rowid FROM memo ORDER BY rowid DESC LIMIT ?)",
+            (max_entries,),
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM memo WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memo (key, value) VALUES (?, ?)", (key, json.dumps(value, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+
+class TextFrontendCache:
+    """LRU + disk memo of the model's text frontend; see module docstring."""
+
+    def __init__(
+        self, namespace: str, max_entries: int, disk_path: Optional[Path] = None, disk_max_entries: int = 0
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._disk = None
+        if disk_path is not None and disk_max_entries > 0:
+            try:
+                self._disk = _DiskTier(Path(disk_path), disk_max_entries)
+            except sqlite3.Error as e:
+                logger.warning(f"Text frontend cache: disk tier disabled ({disk_path}): {e}")
+        self.installed = []
+        self.counters: Dict[str, Dict[str, float]] = {}
+
+    def _key(self, name: str, args: tuple, kwargs: dict) -> str:
+        payload = json.dumps(
+            [self.namespace, name, args, sorted(kwargs.items())], ensure_ascii=False, default=_stable
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, field: str, amount: float = 1) -> None:
+        # Caller holds self._lock
+        counters = self.counters.setdefault(
+            name, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "miss_sec": 0.0}
+        )
+        counters[field] += amount
+
+    def memoise(self, name: str, fn: Callable) -> Callable:
+        """`fn` with its results cached under `name`; results must be JSON-serialisable."""
+
+        def wrapper(text, *args, **kwargs):
+            if not isinstance(text, str):
+                return fn(text, *args, **kwargs)
+            key = self._key(name, (text,) + args, kwargs)
+
+            with self._lock:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    self._count(name, "memory_hits")
+                    return json.loads(self._memory[key])
+
+            value = self._disk.get(key) if self._disk is not None else None
+            if value is not None:
+                with self._lock:
+                    self._count(name, "disk_hits")
+            else:
+                started = time.perf_counter()
+                value = fn(text, *args, **kwargs)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._count(name, "misses")
+                    self._count(name, "miss_sec", elapsed)
+                if self._disk is not None:
+                    try:
+                        self._disk.put(key, value)
+                    except (sqlite3.Error, TypeError, ValueError) as e:
+                        logger.warning(f"Text frontend cache: could not store {name} result: {e}")
+
+            with self._lock:
+                # Stored serialised so callers can never mutate a cached result
+                self._memory[key] = json.dumps(value, ensure_ascii=False)
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+            return value
+
+        return wrapper
+
+    def install(self, model: Any) -> "TextFrontendCache":
+        """Wrap the text normaliser and tokenizer of `model.frontend`, where present."""
+        self.installed = []
+        frontend = getattr(model, "frontend", None)
+        if callable(getattr(frontend, "text_normalize", None)):
+            frontend.text_normalize = self.memoise("text_normalize", frontend.text_normalize)
+            self.installed.append("text_normalize")
+        tokenizer = getattr(frontend, "tokenizer", None)
+        if callable(getattr(tokenizer, "encode", None)):
+            tokenizer.encode = self.memoise("tokenize", tokenizer.encode)
+            self.installed.append("tokenize")
+        logger.info(f"Text frontend cache installed on: {self.installed or 'nothing'}")
+        return self
+
+    def clear_memory(self) -> None:
+        """Drop the in-memory tier; the disk tier is kept for the next load."""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            functions = {}
+            for name, counters in self.counters.items():
+                hits = counters["memory_hits"] + counters["disk_hits"]
+                lookups = hits + counters["misses"]
+                avg_miss = counters["miss_sec"] / counters["misses"] if counters["misses"] else None
+                functions[name] = {
+                    "memory_hits": int(counters["memory_hits"]),
+                    "disk_hits": int(counters["disk_hits"]),
+                    "misses": int(counters["misses"]),
+                    "hit_rate": round(hits / lookups, 3) if lookups else None,
+                    # Hits times the average cost of computing a result (unknown before a miss)
+                    "est_saved_sec": round(hits * avg_miss, 3) if avg_miss is not None else None,
+                }
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk": self._disk is not None,
+                "functions": functions,
+            }
@@ -0,0 +1,203 @@
+"""CPU/NUMA thread budget for the threads that run the model.
+
+Each thread running the model holds a slot while it runs: a set of cores
+inside one NUMA node and an intra-op thread count sized to that set. A
+thread takes the least used slot (a free one if any) and hands it back
+when it stops running the model, so short-lived generation threads do not
+pile onto the same cores. Linux CPU
+affinity is per thread and inherited by threads it spawns, so pinning the
+worker before its first forward pass keeps torch's OpenMP pool on the same
+cores and the same memory node.
+"""
+
+import os
+import sys
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+NODE_DIR = Path("/sys/devices/system/node")
+
+
+def _parse_cpulist(text: str) -> List[int]:
+    """Parse a kernel cpulist such as "0-3,8-11"."""
+    cpus: List[int] = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _format_cpulist(cpus: List[int]) -> str:
+    ranges, start, prev = [], None, None
+    for cpu in sorted(cpus):
+        if start is None:
+            start = prev = cpu
+        elif cpu == prev + 1:
+            prev = cpu
+        else:
+            ranges.append(f"{start}-{prev}" if start != prev else str(start))
+            start = prev = cpu
+    if start is not None:
+        ranges.append(f"{start}-{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def _allowed_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def detect_topology() -> List[List[int]]:
+    """Usable CPUs per NUMA node (a single node when NUMA info is absent)."""
+    allowed = set(_allowed_cpus())
+    nodes: List[List[int]] = []
+    if NODE_DIR.exists():
+        for node in sorted(NODE_DIR.glob("node[0-9]*"), key=lambda p: int(p.name[4:])):
+            try:
+                cpus = [c for c in _parse_cpulist((node / "cpulist").read_text()) if c in allowed]
+            except (OSError, ValueError):
+                continue
+            if cpus:
+                nodes.append(cpus)
+    return nodes or [sorted(allowed)]
+
+
+class WorkerSlot:
+    """Cores and thread counts assigned to one engine worker."""
+
+    def __init__(self, index: int, numa_node: int, cpus: List[int], intra_op_threads: int):
+        self.index = index
+        self.numa_node = numa_node
+        self.cpus = cpus
+        self.intra_op_threads = intra_op_threads
+        self.threads: List[str] = []  # names of the threads holding the slot
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "threads": list(self.threads),
+            "numa_node": self.numa_node,
+            "cpus": _format_cpulist(self.cpus),
+            "intra_op_threads": self.intra_op_threads,
+        }
+
+
+def plan_layout(workers: int, threads_per_worker: int, topology: List[List[int]]) -> List[WorkerSlot]:
+    """Split the host into `workers` disjoint core sets.
+
+    Workers are spread across NUMA nodes in proportion to node size, and no
+    slot spans two nodes unless a node has fewer cores than one slot needs.
+    `threads_per_worker` <= 0 divides the cores evenly.
+    """
+    workers = max(1, workers)
+    total = sum(len(cpus) for cpus in topology)
+    per_worker = threads_per_worker if threads_per_worker > 0 else max(1, total // workers)
+    per_worker = min(per_worker, max(1, total // workers))
+
+    # Workers per node, proportional to node size
+    shares = [max(1, round(workers * len(cpus) / total)) for cpus in topology]
+    while sum(shares) > workers:
+        shares[shares.index(max(shares))] -= 1
+    while sum(shares) < workers:
+        shares[shares.index(min(shares))] += 1
+
+    slots: List[WorkerSlot] = []
+    for node, (cpus, share) in enumerate(zip(topology, shares)):
+        for i in range(share):
+            # Wraps round (sharing cores) only when the node is oversubscribed
+            width = min(per_worker, len(cpus))
+            core_set = [cpus[(i * width + k) % len(cpus)] for k in range(width)]
+            slots.append(WorkerSlot(len(slots), node, core_set, len(core_set)))
+    return slots
+
+
+class ThreadBudget:
+    """Hands out worker slots to threads and applies them to the calling thread."""
+
+    def __init__(self):
+        self.topology = detect_topology()
+        self.slots: List[WorkerSlot] = []
+        self.inter_op_threads = settings.ENGINE_INTEROP_THREADS
+        self._held: Dict[int, WorkerSlot] = {}  # thread ident -> slot
+        self._lock = threading.Lock()
+
+    def configure(self, workers: int) -> None:
+        """Plan a layout for `workers` model-running threads."""
+        with self._lock:
+            self.slots = plan_layout(workers, settings.ENGINE_THREADS_PER_WORKER, self.topology)
+            self._held = {}
+        logger.info(
+            "Thread budget: "
+            + "; ".join(f"worker {s.index} -> node {s.numa_node} cpus {_format_cpulist(s.cpus)}"
+                        for s in self.slots)
+        )
+
+    def pin_current_thread(self) -> Optional[WorkerSlot]:
+        """Take the least used slot and bind the calling thread to it.
+
+        A thread that already holds a slot keeps it. Pair with
+        `release_current_thread` once the thread stops running the model.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            if not self.slots:
+                return None
+            slot = self._held.get(ident)
+            if slot is not None:
+                return slot
+            slot = min(self.slots, key=lambda s: len(s.threads))
+            slot.threads.append(threading.current_thread().name)
+            self._held[ident] = slot
+
+        if settings.ENGINE_PIN_CPUS and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, slot.cpus)  # 0 = calling thread on Linux
+            except OSError as e:
+                logger.warning(f"Could not pin {threading.current_thread().name} to cpus {slot.cpus}: {e}")
+
+        self._set_torch_threads(slot.intra_op_threads)
+        return slot
+
+    def release_current_thread(self) -> None:
+        """Hand back the calling thread's slot, if it holds one."""
+        with self._lock:
+            slot = self._held.pop(threading.get_ident(), None)
+            if slot is not None:
+                slot.threads.remove(threading.current_thread().name)
+
+    def _set_torch_threads(self, intra_op_threads: int) -> None:
+        # Only touch torch if the engine already imported it
+        torch = sys.modules.get("torch")
+        if torch is None:
+            return
+        torch.set_num_threads(intra_op_threads)
+        try:
+            if torch.get_num_interop_threads() != self.inter_op_threads:
+                torch.set_num_interop_threads(self.inter_op_threads)
+        except RuntimeError:
+            # Inter-op pool size is fixed once parallel work has started
+            pass
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "numa_nodes": len(self.topology),
+            "cpus": sum(len(cpus) for cpus in self.topology),
+            "pinning": settings.ENGINE_PIN_CPUS and hasattr(os, "sched_setaffinity"),
+            "inter_op_threads": self.inter_op_threads,
+            "workers": [slot.describe() for slot in self.slots],
+        }
+
+
+thread_budget = ThreadBudget()
@@ -1,12 +1,13 @@
 import sys
 import os
 import re
+import time
 import logging
 import uuid
-import torch
+import threading
 import numpy as np
-import soundfile as sf
-from typing import Optional, List, Dict, Generator
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional, List, Dict, Generator
 from pathlib import Path
 
 # Enable MPS fallback for unimplemented operators on Mac
@@ -14,20 +15,129 @@ os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"
 
 from app.config import settings
 from app.models import VoiceProfile
+from app.tracing import tracer
+from app.services.checkpoint_service import TaskCheckpoint
+from app.services.chunk_cost_model import ChunkCostModel, split_sentences
+from app.services.generation_scheduler import GenerationCancelled, checkpoint
+from app.services.engine_call_queue import EngineCallQueue, create_call_queue
+from app.services.loudness import LoudnessNormalizer
+from app.services.model_residency import IdleUnloader, model_footprint_mb, process_rss_mb, release_memory
+from app.services.project_render_service import ProjectRender
+from app.services.prompt_cache import PromptCache
+from app.services.quality_presets import (
+    DEFAULT_PRESET,
+    current_preset,
+    install_model_hooks,
+    model_call_scope,
+    preset_scope,
+    preset_stats,
+)
+from app.services.text_frontend_cache import TextFrontendCache
+from app.services.thread_budget import thread_budget
+from app.services.weight_store import MmapWeightStore
 
 logger = logging.getLogger(__name__)
 
+# Advanced CosyVoice 3.0 Processing: instruction text per emotion tag
+EMOTION_MAP = {
+    "happy": "说话者语气充满快乐和兴奋，声音欢快，语调上扬，带有明显的笑意，语速适中。",
+    "sad": "说话者语气非常悲伤，声音低沉，语速缓慢，带有哽咽或叹息的感觉。",
+    "angry": "说话者非常愤怒，声音紧绷有力，语速较快，语气强烈不满。",
+    "fearful": "说话者感到恐惧和紧张，声音颤抖，呼吸急促，语速不稳定。",
+    "surprised": "说话者感到非常惊讶，难以置信，语调极高，带有强烈的疑问感。",
+    "disgusted": "说话者语气充满厌恶和不屑，声音冷淡，强调重读，带有排斥感。",
+    "neutral": "说话者语气平和自然，情绪稳定，像日常交谈一样放松。",
+    "whisper": "说话者在轻声耳语，声音极低，气息感强，像在说秘密。",
+    "affectionate": "说话者语气温柔深情，声音柔软，带有关切和爱意，语速舒缓。",
+    "serious": "说话者语气严肃认真，沉着冷静，声音笃定，语速适中，不带玩笑成分。",
+    "fast": "说话者语速非常快，情绪激动或着急。",
+    "slow": "说话者语速很慢，从容不迫或犹豫不决。",
+    "high_pitch": "说话者音调很高，情绪高昂。",
+    "low_pitch": "说话者音调很低，深沉稳重。"
+}
+
+def _to_numpy(speech) -> np.ndarray:
+    """Model outputs are torch tensors; stub engines may return arrays directly."""
+    return speech.numpy() if hasattr(speech, "numpy") else np.asarray(speech)
+
+
 class LocalLyrebirdService:
     """Service for Local CosyVoice inference using the official codebase."""
 
-    def __init__(self):
-        self.model_dir = str(settings.MODEL_DIR)
+    def __init__(
+        self,
+        model_dir: Optional[str] = None,
+        model_name: str = "default",
+        call_queue: Optional[EngineCallQueue] = None,
+    ):
+        """`call_queue` shares another engine's engine threads (see model_registry)."""
+        self.model_dir = str(model_dir or settings.MODEL_DIR)
+        self.model_name = model_name
         self.base_dir = str(settings.Lyrebird_BASE_DIR)
         self.model = None
+        # Checkpoints mapped read-only so worker processes share one copy (CPU only)
+        self.weights = (
+            MmapWeightStore(self.model_dir, settings.MODEL_WEIGHTS_CACHE_DIR)
+            if settings.MODEL_WEIGHTS_MMAP and settings.LOCAL_DEVICE == "cpu" else None
+        )
         
+        # Normalised/tokenised text memoised in memory and on disk
+        self.text_cache = (
+            TextFrontendCache(
+                Path(self.model_dir).name, settings.TEXT_CACHE_MAX_ENTRIES,
+                settings.TEXT_CACHE_PATH, settings.TEXT_CACHE_DISK_MAX_ENTRIES,
+            )
+            if settings.TEXT_CACHE_MAX_ENTRIES > 0 else None
+        )
+        self.preset_knobs: List[str] = []
+        self.prompt_cache: Optional[PromptCache] = None
+
+        # Residency: requests in flight hold the model; idle engines release it.
+        # The lock is only held for bookkeeping, never while a model loads, and
+        # describe_* read without it so health checks answer during a reload.
+        self._residency_lock = threading.Condition(threading.RLock())
+        self._loading = False
+        self._active = 0
+        self.last_used = time.monotonic()
+        self.loads = 0
+        self.unloads = 0
+        self.last_load_sec: Optional[float] = None
+        self.load_rss_mb: Optional[float] = None
+        self.footprint_mb: Optional[float] = None
+        self._sample_rate: Optional[int] = None
+        self.metrics = {"requests": 0, "failed": 0, "busy_sec": 0.0, "audio_sec": 0.0}
+
         # Ensure Lyrebird code is in python path
         self._setup_path() # setup path first
-        self._load_model()
+        self._load_and_attach()
+
+        # Sub-chunk calls from concurrent tasks are funnelled through the engine
+        # threads, each pinned to its own cores. Created after the model so torch
+        # is already imported when they set their thread counts. Without the queue
+        # the generation workers run the model and are pinned instead (see routes).
+        if call_queue is not None:
+            self.call_queue = call_queue
+        else:
+            queued = settings.ENGINE_CALL_QUEUE
+            if not thread_budget.slots:  # planned once per process, by the first engine
+                thread_budget.configure(settings.ENGINE_WORKERS if queued else settings.GENERATION_WORKERS)
+            self.call_queue = create_call_queue(
+                queued,
+                settings.ENGINE_CALL_QUEUE_WINDOW_MS,
+                workers=settings.ENGINE_WORKERS,
+                initializer=thread_budget.pin_current_thread,
+            )
+
+        # Learned per-call cost, used to size sub-chunks (see chunk_cost_model)
+        self.chunk_costs = (
+            ChunkCostModel(f"{type(self).__name__}:{Path(self.model_dir).name}", settings.CHUNK_COST_MODEL_PATH)
+            if settings.CHUNK_ADAPTIVE else None
+        )
+
+        self.idle_unloader = (
+            IdleUnloader(self, settings.MODEL_IDLE_UNLOAD_SEC).start()
+            if settings.MODEL_IDLE_UNLOAD_SEC > 0 else None
+        )
 
     def _setup_path(self):
         """Add CosyVoice repo to sys.path."""
@@ -68,11 +178,22 @@ class LocalLyrebirdService:
             # Use AutoModel to automatically detect model version (Lyrebird, Lyrebird2, Lyrebird3)
             # NOTE: Lyrebird3 does not support load_jit parameter in its constructor.
             # Enable fp16 for MPS/CUDA acceleration
-            self.model = AutoModel(
-                model_dir=self.model_dir, 
-                load_trt=False, 
-                fp16=True
-            )
+            def construct(weights: Optional[MmapWeightStore]):
+                with weights.loading() if weights is not None else nullcontext():
+                    return AutoModel(
+                        model_dir=self.model_dir, 
+                        load_trt=False, 
+                        fp16=True
+                    )
+
+            if self.weights is not None:
+                try:
+                    self.model = construct(self.weights)
+                except Exception as e:
+                    logger.warning(f"Memory-mapped weight loading failed, loading normally: {e}", exc_info=True)
+                    self.weights = None
+            if self.model is None:
+                self.model = construct(None)
             logger.info(f"SUCCESS: Local CosyVoice model loaded. Type: {type(self.model)}")
 
         except ImportError as ie:
@@ -83,6 +204,135 @@ class LocalLyrebirdService:
             logger.info(f"Python path: {sys.path}")
             logger.info(f"Current working directory: {os.getcwd()}")
 
+    def _install_preset_hooks(self) -> List[str]:
+        return install_model_hooks(self.model)
+
+    def _load_and_attach(self):
+        """Load the model and attach the helpers that wrap it, recording cost and footprint."""
+        rss_before = process_rss_mb()
+        started = time.perf_counter()
+        self._load_model()
+        if not self.model:
+            return
+
+        # Knobs the quality presets can reach in this model (see quality_presets)
+        self.preset_knobs = self._install_preset_hooks()
+        if self.text_cache is not None:
+            self.text_cache.install(self.model)
+        # Prompt features per (voice clip, instruction), reused across calls
+        self.prompt_cache = (
+            PromptCache(self.model, int(settings.PROMPT_CACHE_MAX_MB * 1e6))
+            if settings.PROMPT_CACHE_MAX_MB > 0 and PromptCache.supported(self.model) else None
+        )
+
+        self._sample_rate = self.model.sample_rate
+        self.loads += 1
+        self.last_load_sec = round(time.perf_counter() - started, 3)
+        self.load_rss_mb = round(process_rss_mb() - rss_before, 1)
+        self.footprint_mb = model_footprint_mb(self.model)
+        self.last_used = time.monotonic()
+        logger.info(f"Model loaded in {self.last_load_sec}s (+{self.load_rss_mb} MB RSS)")
+
+    @contextmanager
+    def model_in_use(self, before_load: Optional[Callable[[], None]] = None):
+        """Hold the model for one request, reloading it first if it was unloaded.
+
+        One caller reloads, outside the residency lock; concurrent callers wait
+        for it. `before_load` runs just before a reload (the model registry
+        uses it to make room under its memory budget).
+        """
+        with self._residency_lock:
+            while self._loading:
+                self._residency_lock.wait()
+            reload = self.model is None and self.unloads > 0
+            if reload:
+                self._loading = True
+            else:
+                self._active += 1
+        if reload:
+            try:
+                if before_load is not None:
+                    before_load()
+                logger.info(f"Reloading model '{self.model_name}'...")
+                self._load_and_attach()
+            finally:
+                with self._residency_lock:
+                    self._loading = False
+                    self._active += 1
+                    self._residency_lock.notify_all()
+        try:
+            yield
+        finally:
+            with self._residency_lock:
+                self._active -= 1
+                self.last_used = time.monotonic()
+
+    def unload_if_idle(self, idle_sec: float) -> bool:
+        """Release the model and its caches if no request used it for `idle_sec`."""
+        with self._residency_lock:
+            if time.monotonic() - self.last_used < idle_sec:
+                return False
+            return self.unload(f"{idle_sec:.0f}s idle")
+
+    def unload(self, reason: str) -> bool:
+        """Release the model and its caches unless a request is using it."""
+        with self._residency_lock:
+            if self.model is None or self._active or self._loading:
+                return False
+            rss_before = process_rss_mb()
+            # Counted first: lock-free readers take a None model with no unloads as a failed load
+            self.unloads += 1
+            self.model = None
+            self.prompt_cache = None
+            if self.text_cache is not None:
+                self.text_cache.clear_memory()
+            if self.chunk_costs is not None:
+                self.chunk_costs.save()
+            release_memory()
+            logger.info(
+                f"Model '{self.model_name}' unloaded ({reason}; RSS {rss_before} -> {process_rss_mb()} MB)"
+            )
+            return True
+
+    def memory_mb(self) -> float:
+        """Estimated memory held by the loaded model (0 when unloaded)."""
+        if self.model is None:
+            return 0.0
+        return self.footprint_mb or self.load_rss_mb or 0.0
+
+    def describe_metrics(self) -> dict:
+        metrics = dict(self.metrics)  # snapshot; no lock, see __init__
+        metrics["busy_sec"] = round(metrics["busy_sec"], 2)
+        metrics["audio_sec"] = round(metrics["audio_sec"], 2)
+        metrics["rtf"] = round(metrics["busy_sec"] / metrics["audio_sec"], 4) if metrics["audio_sec"] else None
+        return metrics
+
+    def describe_residency(self) -> dict:
+        """Snapshot read without the residency lock, so it never waits on a reload."""
+        if self._loading:
+            state = "loading"
+        elif self.model is not None:
+            state = "loaded"
+        else:
+            state = "unloaded" if self.unloads else "failed"
+        return {
+            "state": state,
+            "active_requests": self._active,
+            "idle_sec": round(time.monotonic() - self.last_used, 1),
+            "idle_unload_after_sec": settings.MODEL_IDLE_UNLOAD_SEC or None,
+            "loads": self.loads,
+            "unloads": self.unloads,
+            "last_load_sec": self.last_load_sec,
+            "load_rss_mb": self.load_rss_mb,
+            "weights_mb": self.footprint_mb,
+            "rss_mb": process_rss_mb(),
+        }
+
+    @property
+    def sample_rate(self) -> Optional[int]:
+        """Output sample rate of the model (kept while it is unloaded; None if never loaded)."""
+        return self._sample_rate
+
     def get_preset_voices(self) -> List[VoiceProfile]:
         """Return list of preset voices available in the model."""
         if not self.model:
@@ -111,174 +361,431 @@ class LocalLyrebirdService:
         guest_voice_profile: Optional[VoiceProfile] = None,
         speed: float = 1.0,
         pitch: float = 1.0, # Note: CosyVoice main API might not support pitch directly in inference_zero_shot yet without sft
-        emotion: str = "neutral" 
+        emotion: str = "neutral",
+        project: Optional[ProjectRender] = None,
+        latency_mode: str = "interactive",
+        task_checkpoint: Optional[TaskCheckpoint] = None,
+        quality: Optional[str] = None,
     ) -> Optional[np.ndarray]:
         """
         Generate audio using Local CosyVoice.
-        """
-        if not self.model:
-            logger.error("Model not loaded.")
-            return None
 
-        try:
-            # Parse text for multi-speaker check
-            # Pattern: "Speaker 0: Text..."
-            parsed_segments = []
-            
-            # Simple check if "Speaker" tag exists
-            if "Speaker " in text and ":" in text:
-                lines = text.split('\n')
-                current_speaker = None
-                current_text = []
-
-                for line in lines:
-                    match = re.search(r'^Speaker (\d+):\s*(.*)', line)
-                    if match:
-                        # Save previous segment if exists
-                        if current_speaker is not None and current_text:
-                            parsed_segments.append((current_speaker, "\n".join(current_text)))
-                        
-                        current_speaker = int(match.group(1))
-                        current_text = [match.group(2).strip()]
+        With a `project`, lines whose audio is already stored in its render
+        manifest are reused and only new or edited lines are synthesised.
+        `latency_mode` ("interactive" or "batch") picks how long sub-chunks
+        are sized for: early first audio, or throughput. With a
+        `task_checkpoint`, every model call's output is saved as it finishes
+        and a resumed task only synthesises what is missing. `quality` names
+        the speed/quality preset every model call runs with. A model unloaded
+        while idle is loaded again first.
+        """
+        with self.model_in_use():
+            if not self.model:
+                logger.error("Model not loaded.")
+                return None
+            started = time.perf_counter()
+            audio = None
+            try:
+                audio = self._generate_audio(
+                    text, voice_id, voice_profile, guest_voice_profile, speed, project, latency_mode,
+                    task_checkpoint, quality,
+                )
+                return audio
+            finally:
+                with self._residency_lock:
+                    self.metrics["requests"] += 1
+                    self.metrics["busy_sec"] += time.perf_counter() - started
+                    if audio is None:
+                        self.metrics["failed"] += 1
                     else:
-                        current_text.append(line)
-                
-                # Append the last segment
-                if current_speaker is not None and current_text:
-                    parsed_segments.append((current_speaker, "\n".join(current_text)))
-            
-            # Fallback if no valid parsing happened or plain text
-            if not parsed_segments:
-                parsed_segments.append((0, text)) # Default to speaker 0 (Host)
+                        self.metrics["audio_sec"] += audio.size / self._sample_rate
 
-            
-            full_audio_list = []
-            
-            for spk_id, segment_text in parsed_segments:
-                if not segment_text.strip():
-                    continue
+    def _generate_audio(
+        self,
+        text: str,
+        voice_id: str,
+        voice_profile: Optional[VoiceProfile],
+        guest_voice_profile: Optional[VoiceProfile],
+        speed: float,
+        project: Optional[ProjectRender],
+        latency_mode: str,
+        task_checkpoint: Optional[TaskCheckpoint],
+        quality: Optional[str],
+    ) -> Optional[np.ndarray]:
+        with preset_scope(quality) as preset, tracer.span(
+            "engine.generate_audio", voice_id=voice_id, text_length=len(text), latency_mode=latency_mode,
+            quality=preset.name,
+        ) as span:
+            try:
+                with tracer.span("engine.parse_text") as parse_span:
+                    parsed_segments = self._parse_segments(text)
+                    parse_span.set_attribute("segments", len(parsed_segments))
 
-                # Clean unstable tags that might cause crashes in zero-shot mode
-                segment_text = segment_text.replace("<strong>", "").replace("</strong>", "")
-
-                # Advanced CosyVoice 3.0 Processing: Multi-tag Splitting
-                emotion_map = {
-                    "happy": "说话者语气充满快乐和兴奋，声音欢快，语调上扬，带有明显的笑意，语速适中。",
-                    "sad": "说话者语气非常悲伤，声音低沉，语速缓慢，带有哽咽或叹息的感觉。",
-                    "angry": "说话者非常愤怒，声音紧绷有力，语速较快，语气强烈不满。",
-                    "fearful": "说话者感到恐惧和紧张，声音颤抖，呼吸急促，语速不稳定。",
-                    "surprised": "说话者感到非常惊讶，难以置信，语调极高，带有强烈的疑问感。",
-                    "disgusted": "说话者语气充满厌恶和不屑，声音冷淡，强调重读，带有排斥感。",
-                    "neutral": "说话者语气平和自然，情绪稳定，像日常交谈一样放松。",
-                    "whisper": "说话者在轻声耳语，声音极低，气息感强，像在说秘密。",
-                    "affectionate": "说话者语气温柔深情，声音柔软，带有关切和爱意，语速舒缓。",
-                    "serious": "说话者语气严肃认真，沉着冷静，声音笃定，语速适中，不带玩笑成分。",
-                    "fast": "说话者语速非常快，情绪激动或着急。",
-                    "slow": "说话者语速很慢，从容不迫或犹豫不决。",
-                    "high_pitch": "说话者音调很高，情绪高昂。",
-                    "low_pitch": "说话者音调很低，深沉稳重。"
-                }
-
-                # 1. Split segment into sub-chunks by XML tags
-                sub_chunks = []
-                tag_pattern = r"<([a-zA-Z_]+)>(.*?)</\1>"
-                matches = list(re.finditer(tag_pattern, segment_text, re.DOTALL))
-                
-                if matches:
-                    last_end = 0
-                    for match in matches:
-                        # Plain text before tag
-                        pre = segment_text[last_end:match.start()].strip()
-                        if pre: sub_chunks.append(("neutral", pre))
-                        
-                        # Tagged content
-                        sub_chunks.append((match.group(1).lower(), match.group(2).strip()))
-                        last_end = match.end()
-                    # Remaining text
-                    post = segment_text[last_end:].strip()
-                    if post: sub_chunks.append(("neutral", post))
-                else:
-                    # Fallback for old style prefix or plain text
-                    old_prefix = re.match(r"\s*你说话的情感是\s*([a-zA-Z]+)[。！!\.]?\s*(.*)", segment_text, re.DOTALL)
-                    if old_prefix:
-                        sub_chunks.append((old_prefix.group(1).lower(), old_prefix.group(2).strip()))
-                    else:
-                        sub_chunks.append(("neutral", segment_text))
-
-                segment_audio_parts = []
-                
-                # 2. Process each sub-chunk
-                for tag, chunk_text in sub_chunks:
-                    # CRITICAL FIX: Strip all tags and whitespace for validation
-                    # If the text is empty or just punctuation/tags, skip it to avoid model crashes
-                    clean_content = re.sub(r"</?[a-zA-Z_]+>", "", chunk_text).strip()
-                    if not clean_content:
+                full_audio_list = []
+                normalizer = (
+                    LoudnessNormalizer(self.model.sample_rate) if settings.LOUDNESS_NORMALIZE else None
+                )
+
+                for index, (spk_id, segment_text) in enumerate(parsed_segments):
+                    if not segment_text.strip():
                         continue
-                        
-                    # Prepare instruction
-                    inst_body = emotion_map.get(tag, f"用{tag}的语气")
-                    # Use official prefix and suffix for stability
-                    instruct_text = f"You are a helpful assistant. {inst_body}<|endofprompt|>"
-                    
-                    logger.info(f"Synthesizing sub-chunk ({tag}): {clean_content[:30]}...")
-
-                    try:
+
+                    with tracer.span("engine.segment", index=index, speaker=spk_id) as segment_span:
                         # Determine profile
                         active_profile = voice_profile if spk_id == 0 else (guest_voice_profile or voice_profile)
-                        
-                        # Generate
-                        chunk_output = []
-                        if active_profile and active_profile.file_path and hasattr(self.model, 'inference_instruct2'):
-                             # Use instruct mode for all chunks to maintain consistency
-                             chunk_output = list(self.model.inference_instruct2(
-                                 tts_text=clean_content,
-                                 instruct_text=instruct_text,
-                                 prompt_wav=active_profile.file_path,
-                                 speed=speed
-                             ))
-                        elif active_profile and active_profile.type == "preset":
-                             # Fallback for presets
-                             if hasattr(self.model, 'inference_instruct'):
-                                 chunk_output = list(self.model.inference_instruct(clean_content, active_profile.id, instruct_text, speed=speed))
-                             else:
-                                 chunk_output = list(self.model.inference_sft(clean_content, active_profile.id, speed=speed))
+                        if project is not None:
+                            segment_audio = self._render_project_line(
+                                project, index, spk_id, segment_text, active_profile, speed, normalizer,
+                                segment_span, latency_mode, task_checkpoint,
+                            )
                         else:
-                             # Plain synthesis fallback
-                             if active_profile and active_profile.file_path:
-                                 chunk_output = list(self.model.inference_cross_lingual(clean_content, active_profile.file_path, speed=speed))
-                             elif active_profile:
-                                 chunk_output = list(self.model.inference_sft(clean_content, active_profile.id, speed=speed))
-
-                        for o in chunk_output:
-                            if 'tts_speech' in o:
-                                segment_audio_parts.append(o['tts_speech'].numpy())
-                    except Exception as chunk_err:
-                        logger.error(f"Error synthesizing sub-chunk: {chunk_err}")
-                        continue
+                            segment_audio = self._synthesize_segment(
+                                segment_text, active_profile, speed, normalizer=normalizer, speaker=str(spk_id),
+                                latency_mode=latency_mode, task_checkpoint=task_checkpoint, unit=str(index),
+                            )
 
-                if segment_audio_parts:
-                    segment_audio = np.concatenate(segment_audio_parts, axis=1) # (1, samples)
-                    full_audio_list.append(segment_audio.squeeze())
-                
-                continue # Skip the old loop body
+                    if segment_audio is not None:
+                        full_audio_list.append(segment_audio)
 
-            # Original loop body for non-instructed or fallback flows (not reached if continue used)
-            for spk_id, segment_text in parsed_segments:
-                # ... this part is technically shadowed by the logic above now but kept as backup ...
-                pass
-            
-            if not full_audio_list:
+                if not full_audio_list:
+                    return None
+
+                if normalizer is not None:
+                    # Samples held back by the limiter lookahead
+                    full_audio_list.append(normalizer.flush())
+                    span.set_attribute("loudness_in", str(normalizer.loudness()))
+                    span.set_attribute("limiter_gain_reduction_db", round(normalizer.limiter.gain_reduction_db, 2))
+
+                if project is not None:
+                    span.set_attribute("lines_reused", project.reused)
+                    span.set_attribute("lines_rendered", project.rendered)
+                if task_checkpoint is not None:
+                    span.set_attribute("units_reused", task_checkpoint.reused)
+                    span.set_attribute("units_rendered", task_checkpoint.rendered)
+
+                # Concatenate all segments
+                final_audio = np.concatenate(full_audio_list)
+                span.set_attribute("samples", int(final_audio.size))
+
+                logger.info(f"Generation complete. Final Shape: {final_audio.shape}, Sample Rate: {self.model.sample_rate}")
+                return final_audio
+
+            except GenerationCancelled:
+                span.set_attribute("cancelled", True)
+                raise
+            except Exception as e:
+                logger.error(f"Local generation error: {e}", exc_info=True)
                 return None
-                
-            # Concatenate all segments
-            final_audio = np.concatenate(full_audio_list)
-            
-            logger.info(f"Generation complete. Final Shape: {final_audio.shape}, Sample Rate: {self.model.sample_rate}")
-            return final_audio
 
-        except Exception as e:
-            logger.error(f"Local generation error: {e}", exc_info=True)
+    @staticmethod
+    def _parse_segments(text: str) -> List[tuple]:
+        """Split text into (speaker_id, text) segments on "Speaker N:" lines."""
+        parsed_segments = []
+
+        # Simple check if "Speaker" tag exists
+        if "Speaker " in text and ":" in text:
+            lines = text.split('\n')
+            current_speaker = None
+            current_text = []
+
+            for line in lines:
+                match = re.search(r'^Speaker (\d+):\s*(.*)', line)
+                if match:
+                    # Save previous segment if exists
+                    if current_speaker is not None and current_text:
+                        parsed_segments.append((current_speaker, "\n".join(current_text)))
+
+                    current_speaker = int(match.group(1))
+                    current_text = [match.group(2).strip()]
+                else:
+                    current_text.append(line)
+
+            # Append the last segment
+            if current_speaker is not None and current_text:
+                parsed_segments.append((current_speaker, "\n".join(current_text)))
+
+        # Fallback if no valid parsing happened or plain text
+        if not parsed_segments:
+            parsed_segments.append((0, text)) # Default to speaker 0 (Host)
+
+        return parsed_segments
+
+    @classmethod
+    def preview_text(cls, text: str) -> str:
+        """The first sentence of `text`, keeping its speaker line and emotion tag."""
+        has_speakers = bool(re.search(r"^Speaker \d+:", text, re.MULTILINE))
+        for spk_id, segment_text in cls._parse_segments(text):
+            for tag, chunk_text in cls._split_sub_chunks(segment_text):
+                clean_content = re.sub(r"</?[a-zA-Z_]+>", "", chunk_text).strip()
+                if not clean_content:
+                    continue
+                sentence = split_sentences(clean_content)[0].strip()
+                if tag != "neutral":
+                    sentence = f"<{tag}>{sentence}</{tag}>"
+                return f"Speaker {spk_id}: {sentence}" if has_speakers else sentence
+        return text
+
+    @staticmethod
+    def _split_sub_chunks(segment_text: str) -> List[tuple]:
+        """Split a segment into (emotion_tag, text) sub-chunks by XML tags."""
+        # Clean unstable tags that might cause crashes in zero-shot mode
+        segment_text = segment_text.replace("<strong>", "").replace("</strong>", "")
+
+        sub_chunks = []
+        tag_pattern = r"<([a-zA-Z_]+)>(.*?)</\1>"
+        matches = list(re.finditer(tag_pattern, segment_text, re.DOTALL))
+
+        if matches:
+            last_end = 0
+            for match in matches:
+                # Plain text before tag
+                pre = segment_text[last_end:match.start()].strip()
+                if pre: sub_chunks.append(("neutral", pre))
+
+                # Tagged content
+                sub_chunks.append((match.group(1).lower(), match.group(2).strip()))
+                last_end = match.end()
+            # Remaining text
+            post = segment_text[last_end:].strip()
+            if post: sub_chunks.append(("neutral", post))
+        else:
+            # Fallback for old style prefix or plain text
+            old_prefix = re.match(r"\s*你说话的情感是\s*([a-zA-Z]+)[。！!\.]?\s*(.*)", segment_text, re.DOTALL)
+            if old_prefix:
+                sub_chunks.append((old_prefix.group(1).lower(), old_prefix.group(2).strip()))
+            else:
+                sub_chunks.append(("neutral", segment_text))
+
+        return sub_chunks
+
+    def _render_project_line(
+        self,
+        project: ProjectRender,
+        index: int,
+        spk_id: int,
+        segment_text: str,
+        active_profile: Optional[VoiceProfile],
+        speed: float,
+        normalizer: Optional[LoudnessNormalizer],
+        segment_span,
+        latency_mode: str = "interactive",
+        task_checkpoint: Optional[TaskCheckpoint] = None,
+    ) -> Optional[np.ndarray]:
+        """Reuse or synthesise one script line; store its raw audio, level it on stitch."""
+        key = project.line_key(spk_id, active_profile, segment_text, speed, current_preset().name)
+        raw = project.get(key)
+        reused = raw is not None
+        if raw is None:
+            raw = self._synthesize_segment(
+                segment_text, active_profile, speed, latency_mode=latency_mode,
+                task_checkpoint=task_checkpoint, unit=str(index),
+            )
+            if raw is None:
+                return None
+            project.put(key, raw)
+
+        segment_span.set_attribute("reused", reused)
+        project.record(index, spk_id, active_profile, segment_text, speed, key, raw.size, reused)
+        return normalizer.process(raw, str(spk_id)) if normalizer is not None else raw
+
+    def _synthesize_segment(
+        self,
+        segment_text: str,
+        active_profile: Optional[VoiceProfile],
+        speed: float,
+        normalizer: Optional[LoudnessNormalizer] = None,
+        speaker: str = "0",
+        latency_mode: str = "interactive",
+        task_checkpoint: Optional[TaskCheckpoint] = None,
+        unit: str = "",
+    ) -> Optional[np.ndarray]:
+        """Synthesize one speaker segment, one model call per emotion sub-chunk.
+
+        Long sub-chunks are further split at sentence ends into pieces sized
+        by the learned cost model for `latency_mode`. If `normalizer` is
+        given, each piece is levelled for `speaker` as it comes out of the
+        model. With a `task_checkpoint`, each piece's raw audio is saved
+        under the segment's `unit` id, and pieces already saved are reused.
+        """
+        # Advanced CosyVoice 3.0 Processing: Multi-tag Splitting
+        sub_chunks = self._split_sub_chunks(segment_text)
+        segment_audio_parts = []
+
+        # Process each sub-chunk
+        for sub_index, (tag, chunk_text) in enumerate(sub_chunks):
+            # CRITICAL FIX: Strip all tags and whitespace for validation
+            # If the text is empty or just punctuation/tags, skip it to avoid model crashes
+            clean_content = re.sub(r"</?[a-zA-Z_]+>", "", chunk_text).strip()
+            if not clean_content:
+                continue
+
+            # Prepare instruction
+            inst_body = EMOTION_MAP.get(tag, f"用{tag}的语气")
+            # Use official prefix and suffix for stability
+            instruct_text = f"You are a helpful assistant. {inst_body}<|endofprompt|>"
+
+            logger.info(f"Synthesizing sub-chunk ({tag}): {clean_content[:30]}...")
+
+            def make_plan():
+                if self.chunk_costs is None:
+                    return [clean_content]
+                return self.chunk_costs.plan(clean_content, latency_mode, speed)
+
+            if task_checkpoint is not None:
+                # Resumed tasks reuse the stored plan so unit keys still match
+                plan_key = task_checkpoint.key(unit, sub_index, clean_content)
+                pieces = task_checkpoint.plan(plan_key, make_plan)
+            else:
+                pieces = make_plan()
+
+            for piece_index, piece in enumerate(pieces):
+                unit_key = None
+                raw = None
+                if task_checkpoint is not None:
+                    unit_key = task_checkpoint.key(
+                        unit, sub_index, piece_index, speaker, active_profile.id if active_profile else "",
+                        instruct_text, f"{speed:.3f}", piece,
+                    )
+                    raw = task_checkpoint.get(unit_key)
+
+                if raw is None:
+                    # Cancelled or preempted jobs stop (or yield the worker) here
+                    checkpoint()
+                    raw = self._synthesize_piece(
+                        piece, tag, instruct_text, active_profile, speed, piece_index, len(pieces)
+                    )
+                    if raw is None:
+                        continue
+                    if task_checkpoint is not None:
+                        task_checkpoint.put(unit_key, raw)
+
+                segment_audio_parts.append(
+                    normalizer.process(raw, speaker) if normalizer is not None else raw
+                )
+
+        if not segment_audio_parts:
             return None
+        return np.concatenate(segment_audio_parts)
+
+    def _synthesize_piece(
+        self,
+        piece: str,
+        tag: str,
+        instruct_text: str,
+        active_profile: Optional[VoiceProfile],
+        speed: float,
+        piece_index: int,
+        pieces: int,
+    ) -> Optional[np.ndarray]:
+        """One model call; returns its raw mono audio, or None on failure."""
+        with tracer.span(
+            "engine.inference", tag=tag, text_length=len(piece), piece=piece_index, pieces=pieces
+        ) as span:
+            try:
+                chunk_output = self._infer(piece, instruct_text, active_profile, speed, span)
+                parts = [_to_numpy(o['tts_speech']).reshape(-1) for o in chunk_output if 'tts_speech' in o]
+                span.set_attribute("samples", sum(part.size for part in parts))
+                if not parts:
+                    return None
+                return np.concatenate(parts).astype(np.float32, copy=False)
+            except Exception as chunk_err:
+                logger.error(f"Error synthesizing sub-chunk: {chunk_err}")
+                span.set_attribute("error", str(chunk_err))
+                return None
+
+    def _infer(
+        self,
+        clean_content: str,
+        instruct_text: str,
+        active_profile: Optional[VoiceProfile],
+        speed: float,
+        span,
+    ) -> list:
+        """Run one sub-chunk, through the engine call queue when enabled."""
+        # Read here: engine threads do not see the caller's context
+        preset = current_preset().name
+        if self.call_queue is None:
+            return self._run_inference(clean_content, instruct_text, active_profile, speed, preset)
+
+        group_key = (
+            self.model_name, active_profile.id if active_profile else None, instruct_text, round(speed, 3), preset
+        )
+        chunk_output, queue_info = self.call_queue.submit(
+            group_key,
+            lambda: self._run_inference(clean_content, instruct_text, active_profile, speed, preset),
+        )
+        for key, value in queue_info.items():
+            span.set_attribute(key, value)
+        return chunk_output
+
+    def _run_inference(
+        self,
+        clean_content: str,
+        instruct_text: str,
+        active_profile: Optional[VoiceProfile],
+        speed: float,
+        preset: str = DEFAULT_PRESET,
+    ) -> list:
+        """Pick the CosyVoice inference mode for a profile and run it under `preset`.
+
+        The call's latency and output length feed the preset's measured RTF
+        and, for the default preset, the chunk cost model.
+        """
+        with model_call_scope(preset):
+            started = time.perf_counter()
+            chunk_output = self._call_model(clean_content, instruct_text, active_profile, speed)
+            elapsed = time.perf_counter() - started
+
+        if chunk_output:
+            samples = sum(_to_numpy(o['tts_speech']).shape[-1] for o in chunk_output if 'tts_speech' in o)
+            audio_sec = samples / self.model.sample_rate
+            preset_stats.record(preset, elapsed, audio_sec)
+            # Other presets run at a different cost; the sizing fit follows the default one
+            if self.chunk_costs is not None and preset == DEFAULT_PRESET:
+                # Speed scales audio length; normalise so the fit is per 1.0x character
+                self.chunk_costs.observe(len(clean_content), elapsed, audio_sec * speed)
+        return chunk_output
+
+    def _call_model(
+        self,
+        clean_content: str,
+        instruct_text: str,
+        active_profile: Optional[VoiceProfile],
+        speed: float,
+    ) -> list:
+        chunk_output = []
+        if active_profile and active_profile.file_path and hasattr(self.model, 'inference_instruct2'):
+             # Use instruct mode for all chunks to maintain consistency
+             if self.prompt_cache is not None:
+                 with self.prompt_cache.acquire(active_profile.file_path, instruct_text) as spk_id:
+                     # With a registered id the frontend skips prompt feature extraction
+                     chunk_output = list(self.model.inference_instruct2(
+                         tts_text=clean_content,
+                         instruct_text=instruct_text,
+                         prompt_wav=active_profile.file_path,
+                         zero_shot_spk_id=spk_id or "",
+                         speed=speed
+                     ))
+             else:
+                 chunk_output = list(self.model.inference_instruct2(
+                     tts_text=clean_content,
+                     instruct_text=instruct_text,
+                     prompt_wav=active_profile.file_path,
+                     speed=speed
+                 ))
+        elif active_profile and active_profile.type == "preset":
+             # Fallback for presets
+             if hasattr(self.model, 'inference_instruct'):
+                 chunk_output = list(self.model.inference_instruct(clean_content, active_profile.id, instruct_text, speed=speed))
+             else:
+                 chunk_output = list(self.model.inference_sft(clean_content, active_profile.id, speed=speed))
+        else:
+             # Plain synthesis fallback
+             if active_profile and active_profile.file_path:
+                 chunk_output = list(self.model.inference_cross_lingual(clean_content, active_profile.file_path, speed=speed))
+             elif active_profile:
+                 chunk_output = list(self.model.inference_sft(clean_content, active_profile.id, speed=speed))
+        return chunk_output
 
     def enroll_voice(self, audio_url: str, prefix: Optional[str] = None) -> Optional[str]:
         """
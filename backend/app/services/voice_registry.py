@@ -0,0 +1,296 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are only serialised within one process
+    fcntl = None
+
+from app.config import settings
+from app.models import VoiceProfile, VoiceType
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+LEGACY_VOICE_PATTERNS = ("*.wav", "*.mp3", "*.m4a", "*.flac", "*.ogg")
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VoiceRegistry:
+    """Persisted index of preset and local voices by id, name and content hash.
+
+    The manifest is a single JSON file, so startup is one read instead of a
+    directory scan; VOICES_DIR is only scanned once, to migrate voices saved
+    before the manifest existed. Every add/remove rewrites the manifest
+    atomically, so ids stay stable across restarts.
+
+    Worker processes share the manifest. A change re-reads it under a file
+    lock before writing, so concurrent saves do not drop each other's
+    voices, and lookups that miss (and listings) pick up voices another
+    process saved. Presets come from this process's engine; a local voice
+    keeps its id and name over a preset that has the same one.
+    """
+
+    def __init__(self, manifest_path: Optional[Path] = None):
+        self.manifest_path = Path(manifest_path or settings.VOICE_MANIFEST_PATH)
+        self._lock = threading.RLock()
+        self._voices: Dict[str, VoiceProfile] = {}
+        self._hashes: Dict[str, str] = {}  # voice id -> content hash
+        self._by_name: Dict[str, List[str]] = {}  # lower-cased name -> voice ids
+        self._by_hash: Dict[str, str] = {}  # content hash -> voice id
+        self._presets: Optional[List[VoiceProfile]] = None  # set by set_presets
+        self._manifest_stat: Optional[Tuple[int, int]] = None  # (mtime_ns, size) last read or written
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self):
+        with self._lock, self._file_lock():
+            if not self.manifest_path.exists():
+                self._migrate_from_directory()
+                return
+
+            try:
+                self._rebuild(self._read())
+                logger.info(f"Loaded {len(self._voices)} voices from {self.manifest_path}")
+            except Exception as e:
+                logger.error(f"Failed to read voice manifest {self.manifest_path}: {e}; rebuilding")
+                self._clear()
+                self._migrate_from_directory()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Serialise read-modify-write of the manifest across processes."""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path.with_suffix(".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield  # closing the file drops the lock
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.manifest_path.stat()
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self) -> List[Tuple[VoiceProfile, Optional[str]]]:
+        stat = self._stat()
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self._manifest_stat = stat
+        entries = []
+        for entry in data.get("voices", []):
+            content_hash = entry.pop("content_hash", None)
+            entries.append((VoiceProfile(**entry), content_hash))
+        return entries
+
+    def _rebuild(self, entries: List[Tuple[VoiceProfile, Optional[str]]]):
+        """Index local voices from `entries` and this process's presets (else the saved ones)."""
+        self._clear()
+        for profile, content_hash in entries:
+            if profile.type != VoiceType.PRESET:
+                self._index(profile, content_hash)
+        presets = self._presets
+        if presets is None:
+            presets = [profile for profile, _ in entries if profile.type == VoiceType.PRESET]
+        self._index_presets(presets)
+
+    def _refresh(self):
+        """Pick up voices another process saved since the manifest was last read."""
+        # Caller holds self._lock
+        stat = self._stat()
+        if stat is None or stat == self._manifest_stat:
+            return
+        try:
+            self._rebuild(self._read())
+        except Exception as e:
+            logger.warning(f"Could not re-read voice manifest {self.manifest_path}: {e}")
+
+    def _clear(self):
+        self._voices.clear()
+        self._hashes.clear()
+        self._by_name.clear()
+        self._by_hash.clear()
+
+    def _migrate_from_directory(self):
+        """One-off import of voice files saved before the manifest existed."""
+        settings.VOICES_DIR.mkdir(exist_ok=True, parents=True)
+        voice_files = []
+        for pattern in LEGACY_VOICE_PATTERNS:
+            voice_files.extend(settings.VOICES_DIR.glob(pattern))
+
+        for voice_file in sorted(voice_files):
+            # Filename stem was the id before the manifest existed; keep it
+            profile = VoiceProfile(
+                id=voice_file.stem,
+                name=voice_file.stem,
+                type=VoiceType.RECORDED if "record" in voice_file.name else VoiceType.UPLOADED,
+                file_path=str(voice_file),
+            )
+            self._index(profile, file_content_hash(str(voice_file)))
+
+        logger.info(f"Built voice manifest from {len(voice_files)} files in {settings.VOICES_DIR}")
+        self._save()
+
+    def _save(self):
+        entries = []
+        for voice_id, profile in self._voices.items():
+            entry = profile.model_dump(mode="json")
+            entry["content_hash"] = self._hashes.get(voice_id)
+            entries.append(entry)
+
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: a writer outside the file lock never shares it
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{self.manifest_path.name}.", suffix=".tmp", dir=self.manifest_path.parent
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "voices": entries}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._manifest_stat = self._stat()
+
+    # --- Indexing ---
+
+    def _index(self, profile: VoiceProfile, content_hash: Optional[str] = None):
+        self._unindex(profile.id)
+        self._voices[profile.id] = profile
+        self._by_name.setdefault(profile.name.lower(), []).append(profile.id)
+        if content_hash:
+            self._hashes[profile.id] = content_hash
+            self._by_hash.setdefault(content_hash, profile.id)
+
+    def _unindex(self, voice_id: str) -> Optional[VoiceProfile]:
+        profile = self._voices.pop(voice_id, None)
+        if profile is None:
+            return None
+        ids = self._by_name.get(profile.name.lower(), [])
+        if voice_id in ids:
+            ids.remove(voice_id)
+        if not ids:
+            self._by_name.pop(profile.name.lower(), None)
+        content_hash = self._hashes.pop(voice_id, None)
+        if content_hash and self._by_hash.get(content_hash) == voice_id:
+            del self._by_hash[content_hash]
+        return profile
+
+    def _index_presets(self, presets: List[VoiceProfile]):
+        for voice_id in [v.id for v in self._voices.values() if v.type == VoiceType.PRESET]:
+            self._unindex(voice_id)
+        for profile in presets:
+            existing = self._voices.get(profile.id)
+            if existing is not None and existing.type != VoiceType.PRESET:
+                logger.info(f"Preset voice '{profile.id}' is shadowed by a local voice with the same id")
+                continue
+            self._index(profile)
+
+    # --- Public API ---
+
+    def set_presets(self, presets: List[VoiceProfile]):
+        """Replace the indexed preset voices with the engine's current list."""
+        with self._lock, self._file_lock():
+            self._presets = list(presets)
+            self._refresh()
+            self._index_presets(self._presets)
+            self._save()
+
+    def add(self, profile: VoiceProfile, content_hash: Optional[str] = None) -> VoiceProfile:
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._index(profile, content_hash)
+            self._save()
+        return profile
+
+    def remove(self, voice_id: str) -> Optional[VoiceProfile]:
+        with self._lock, self._file_lock():
+            self._refresh()
+            profile = self._unindex(voice_id)
+            if profile is not None:
+                if profile.type != VoiceType.PRESET and self._presets:
+                    # A preset this local voice shadowed comes back
+                    self._index_presets(self._presets)
+                self._save()
+            return profile
+
+    def get(self, voice_id: str) -> Optional[VoiceProfile]:
+        with self._lock:
+            profile = self._voices.get(voice_id)
+            if profile is None:
+                self._refresh()
+                profile = self._voices.get(voice_id)
+            return profile
+
+    def find_by_name(self, name: str) -> List[VoiceProfile]:
+        with self._lock:
+            return [self._voices[i] for i in self._by_name.get(name.lower(), [])]
+
+    def find_by_hash(self, content_hash: str) -> Optional[VoiceProfile]:
+        with self._lock:
+            if content_hash not in self._by_hash:
+                self._refresh()
+            voice_id = self._by_hash.get(content_hash)
+            return self._voices.get(voice_id) if voice_id else None
+
+    def resolve(self, key: str) -> Optional[VoiceProfile]:
+        """Look a voice up by id, falling back to an unambiguous name.
+
+        A name shared by a preset and one local voice resolves to the local voice.
+        """
+        with self._lock:
+            profile = self._voices.get(key)
+            if profile is None and key.lower() not in self._by_name:
+                self._refresh()
+                profile = self._voices.get(key)
+            if profile is None:
+                matches = self.find_by_name(key)
+                if len(matches) > 1:
+                    matches = [v for v in matches if v.type != VoiceType.PRESET]
+                if len(matches) == 1:
+                    profile = matches[0]
+            return profile
+
+    def all(self) -> List[VoiceProfile]:
+        """Presets first, then local voices in insertion order."""
+        with self._lock:
+            self._refresh()
+            voices = list(self._voices.values())
+        return [v for v in voices if v.type == VoiceType.PRESET] + [
+            v for v in voices if v.type != VoiceType.PRESET
+        ]
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        voice_type: Optional[VoiceType] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[VoiceProfile], int]:
+        """Filter by name substring and type; returns (page, total matches)."""
+        voices = self.all()
+        if query:
+            query_lower = query.lower()
+            voices = [v for v in voices if query_lower in v.name.lower()]
+        if voice_type:
+            voices = [v for v in voices if v.type == voice_type]
+        total = len(voices)
+        end = None if limit is None else offset + limit
+        return voices[offset:end], total
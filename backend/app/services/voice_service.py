@@ -1,11 +1,20 @@
 import os
 import logging
-from typing import Optional, List, Dict
+from typing import Optional, List
 import uuid
+from pathlib import Path
 import numpy as np
 
 from app.config import settings
 from app.models import VoiceProfile, VoiceType
+from app.tracing import tracer
+from app.services.audio_effects import pitch_ratio
+from app.services.audio_service import AudioService
+from app.services.checkpoint_service import TaskCheckpoint
+from app.services.generation_scheduler import GenerationCancelled
+from app.services.model_registry import DEFAULT_MODEL, ModelRegistry, configured_models
+from app.services.project_render_service import ProjectRender
+from app.services.voice_registry import VoiceRegistry, file_content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -13,42 +22,30 @@ class VoiceService:
     """Service for voice synthesis operations using Lyrebird."""
 
     def __init__(self):
-        """Initialize the voice service with Local Lyrebird."""
-        from app.services.voice_engine_service import LocalLyrebirdService
-        self.service = LocalLyrebirdService()
-        logger.info("VoiceService initialized with Local Lyrebird Backend.")
-            
-        self.voices_cache: Dict[str, VoiceProfile] = {}
-        # Load local custom voices (uploaded by user)
-        self._load_local_voices()
-
-    def _load_local_voices(self):
-        """Load available voice profiles from the voices directory."""
-        settings.VOICES_DIR.mkdir(exist_ok=True)
-
-        voice_files = []
-        for ext in ("*.wav", "*.mp3", "*.m4a", "*.flac", "*.ogg"):
-            voice_files.extend(settings.VOICES_DIR.glob(ext))
-
-        for voice_file in voice_files:
-            # We use filename stem as ID if it looks like a UUID, or generate one?
-            # Existing logic was generating new UUID every start which is bad for persistence if ID matters.
-            # But the file saving logic in routes appends UUID to filename.
-            # Let's try to preserve ID if possible, or just generate new one for session.
-            # The current file naming convention in routes is: "{name}_{uuid}.{ext}"
-            # We can parse it? For now, let's stick to existing behavior: generate ID for session map.
-            # Generate consistent ID from filename to persist selection across restarts
-            # Filename format is usually: "{name}_{uuid_short}.{ext}" or just "{name}.{ext}"
-            # We use the filename stem as the unique ID.
-            voice_id = voice_file.stem
-            profile = VoiceProfile(
-                id=voice_id,
-                name=voice_file.stem, # This might include the appended UUID
-                type=VoiceType.RECORDED if "record" in voice_file.name else VoiceType.UPLOADED,
-                file_path=str(voice_file),
-            )
-            self.voices_cache[voice_id] = profile
-            logger.info(f"Loaded local voice: {voice_file.stem}")
+        """Initialize the voice service with the configured engine backend."""
+        if settings.VOICE_ENGINE == "stub":
+            from app.services.stub_engine_service import StubLyrebirdService as engine_cls
+            logger.info("VoiceService initialized with Stub engine backend (synthetic audio).")
+        else:
+            from app.services.voice_engine_service import LocalLyrebirdService as engine_cls
+            logger.info("VoiceService initialized with Local Lyrebird Backend.")
+
+        # One engine per model variant; the default one is loaded now and
+        # serves everything that names no model
+        self.models = ModelRegistry(
+            engine_cls,
+            configured_models(),
+            budget_mb=settings.MODEL_MEMORY_BUDGET_MB,
+            model_sizes_mb=settings.MODEL_SIZES_MB,
+        )
+        self.service = self.models.get(DEFAULT_MODEL)
+
+        # Presets and local voices in one persisted index; the model is asked
+        # for its preset list once here rather than on every lookup
+        self.registry = VoiceRegistry()
+        presets = self.service.get_preset_voices()
+        if presets:
+            self.registry.set_presets(presets)
 
     def generate_speech(
         self,
@@ -59,68 +56,169 @@ class VoiceService:
         guest_voice_id: Optional[str] = None,
         speed: float = 1.0, # New
         pitch: float = 1.0, # New
+        pitch_unit: str = "ratio",
+        project_id: Optional[str] = None,
+        latency_mode: str = "interactive",
+        task_checkpoint: Optional[TaskCheckpoint] = None,
+        quality: Optional[str] = None,
+        model: Optional[str] = None,
     ) -> Optional[tuple[np.ndarray, int]]:
         """
         Generate speech from text using Lyrebird.
         Returns Tuple of (audio_array, sample_rate)
+
+        latency_mode: "interactive" sizes model calls for early first audio,
+        "batch" for throughput.
+        task_checkpoint: saves progress so an interrupted task can resume.
+        quality: speed/quality preset name (draft, standard, studio).
+        model: model variant name (see model_registry); None uses the default.
         """
+        with tracer.span(
+            "voice_service.generate_speech", voice_id=voice_id, guest_voice_id=guest_voice_id,
+            model=model or DEFAULT_MODEL,
+        ):
+            return self._generate_speech(
+                text, voice_id, guest_voice_id=guest_voice_id, speed=speed, pitch=pitch,
+                pitch_unit=pitch_unit, project_id=project_id, latency_mode=latency_mode,
+                task_checkpoint=task_checkpoint, quality=quality, model=model,
+            )
+
+    def _generate_speech(
+        self,
+        text: str,
+        voice_id: str,
+        guest_voice_id: Optional[str] = None,
+        speed: float = 1.0,
+        pitch: float = 1.0,
+        pitch_unit: str = "ratio",
+        project_id: Optional[str] = None,
+        latency_mode: str = "interactive",
+        task_checkpoint: Optional[TaskCheckpoint] = None,
+        quality: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> Optional[tuple[np.ndarray, int]]:
         try:
+            with tracer.span("voice_service.resolve_voices"):
+                target_profile, guest_profile = self._resolve_profiles(voice_id, guest_voice_id)
 
-            # Check if it's a preset voice from Lyrebird
-            preset_voices = self.service.get_preset_voices()
-            target_profile = None
-            
-            # 1. Search in local cache (Uploaded/Cloned voices)
-            if voice_id in self.voices_cache:
-                target_profile = self.voices_cache[voice_id]
-            else:
-                # 2. Search in presets
-                for v in preset_voices:
-                    if v.id == voice_id:
-                        target_profile = v
-                        break
-            
             if not target_profile:
                 logger.error(f"Voice {voice_id} not found.")
                 return None
 
-            # Resolve Guest Profile if needed
-            guest_profile = None
-            if guest_voice_id:
-                if guest_voice_id in self.voices_cache:
-                    guest_profile = self.voices_cache[guest_voice_id]
-                else:
-                    for v in preset_voices:
-                        if v.id == guest_voice_id:
-                            guest_profile = v
-                            break
-            
+            with self.models.use(model) as engine:
+                return self._render(
+                    engine, text, voice_id, target_profile, guest_profile, speed, pitch, pitch_unit,
+                    project_id, latency_mode, task_checkpoint, quality,
+                )
+
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Speech generation error: {e}", exc_info=True)
+            return None
+
+    def _render(
+        self, engine, text, voice_id, target_profile, guest_profile, speed, pitch, pitch_unit,
+        project_id, latency_mode, task_checkpoint, quality,
+    ) -> Optional[tuple[np.ndarray, int]]:
+        """Run one generation on `engine` (held resident by the caller)."""
+        if project_id:
+            engine_name = type(engine).__name__
+            if engine.model_name != DEFAULT_MODEL:
+                # Lines rendered by another variant must not be reused
+                engine_name = f"{engine_name}:{engine.model_name}"
+            with ProjectRender.open(project_id, engine_name, engine.sample_rate) as project:
+                audio_data = engine.generate_audio(
+                    text=text,
+                    voice_id=voice_id,
+                    voice_profile=target_profile,
+                    guest_voice_profile=guest_profile,
+                    speed=speed,
+                    pitch=pitch,
+                    emotion="neutral",
+                    project=project,
+                    latency_mode=latency_mode,
+                    task_checkpoint=task_checkpoint,
+                    quality=quality,
+                )
+                if audio_data is not None:
+                    project.save()
+        else:
             # Generate and get actual sample rate
-            audio_data = self.service.generate_audio(
+            audio_data = engine.generate_audio(
                 text=text,
                 voice_id=voice_id,
                 voice_profile=target_profile,
                 guest_voice_profile=guest_profile,
                 speed=speed,
                 pitch=pitch,
-                emotion="neutral"
+                emotion="neutral",
+                latency_mode=latency_mode,
+                task_checkpoint=task_checkpoint,
+                quality=quality,
             )
-            if audio_data is None:
-                return None
-                
-            return audio_data, self.service.model.sample_rate
-
-        except Exception as e:
-            logger.error(f"Speech generation error: {e}", exc_info=True)
+        if audio_data is None:
             return None
 
+        # The engine applies speed natively but has no pitch control
+        if pitch_ratio(pitch, pitch_unit) != 1.0:
+            audio_data = AudioService.process_effects(
+                audio_data, pitch=pitch, sample_rate=engine.sample_rate,
+                pitch_unit=pitch_unit,
+            )
+
+        return audio_data, engine.sample_rate
+
+    def _resolve_profiles(
+        self, voice_id: str, guest_voice_id: Optional[str]
+    ) -> tuple[Optional[VoiceProfile], Optional[VoiceProfile]]:
+        """Look up host and guest profiles in the voice registry."""
+        target_profile = self.registry.resolve(voice_id)
+        guest_profile = self.registry.resolve(guest_voice_id) if guest_voice_id else None
+        return target_profile, guest_profile
+
+    @staticmethod
+    def _owns_file(path: str) -> bool:
+        """True for files under VOICES_DIR, i.e. written by the upload/record routes."""
+        try:
+            Path(path).resolve().relative_to(settings.VOICES_DIR.resolve())
+            return True
+        except ValueError:
+            return False
+
+    def _find_duplicate(self, audio_path: str) -> tuple[Optional[VoiceProfile], str]:
+        """Return an existing local voice with identical audio, and the file hash."""
+        content_hash = file_content_hash(audio_path)
+        existing = self.registry.find_by_hash(content_hash)
+        if existing and existing.file_path != audio_path and os.path.exists(existing.file_path):
+            # Same audio uploaded again: keep the registered file, drop our copy
+            # (a caller-supplied file is never ours to remove)
+            if self._owns_file(audio_path):
+                os.remove(audio_path)
+            logger.info(f"Audio matches existing voice {existing.id}; reusing it")
+            return existing, content_hash
+        return None, content_hash
+
+    def transient_profile(self, name: str, audio_path: str) -> VoiceProfile:
+        """A profile for a WAV used in place (e.g. by benchmarks); nothing is registered."""
+        return VoiceProfile(
+            id=f"transient-{file_content_hash(audio_path)[:16]}",
+            name=name,
+            type=VoiceType.UPLOADED,
+            file_path=audio_path,
+        )
+
     def add_voice_profile(
         self,
         name: str,
         audio_path: str,
         voice_type: VoiceType = VoiceType.UPLOADED,
     ) -> VoiceProfile:
-        """Add a new voice profile to the in-memory cache."""
+        """Add a new voice profile to the persisted voice registry."""
+        existing, content_hash = self._find_duplicate(audio_path)
+        if existing:
+            return existing
+
         voice_id = str(uuid.uuid4())
         profile = VoiceProfile(
             id=voice_id,
@@ -128,24 +226,24 @@ class VoiceService:
             type=voice_type,
             file_path=audio_path,
         )
-        self.voices_cache[voice_id] = profile
+        self.registry.add(profile, content_hash)
         logger.info(f"Added voice profile: {name} (type: {voice_type})")
         return profile
 
     def delete_voice_profile(self, voice_id: str) -> bool:
         """Delete a voice profile and its associated file."""
         try:
-            profile = self.voices_cache.get(voice_id)
-            if not profile:
+            profile = self.registry.get(voice_id)
+            if not profile or profile.type == VoiceType.PRESET:
                 return False
 
-            # Delete the audio file
-            if os.path.exists(profile.file_path):
+            # Delete the audio file, if the service wrote it
+            if os.path.exists(profile.file_path) and self._owns_file(profile.file_path):
                 os.remove(profile.file_path)
                 logger.info(f"Deleted voice file: {profile.file_path}")
 
-            # Remove from cache
-            del self.voices_cache[voice_id]
+            # Remove from registry
+            self.registry.remove(voice_id)
             logger.info(f"Deleted voice profile: {profile.name}")
             return True
 
@@ -161,39 +259,43 @@ class VoiceService:
     ) -> VoiceProfile:
         """Enroll a new voice using Local Lyrebird cloning."""
         logger.info(f"Enrolling voice: {name} from {audio_path}")
-        
+
+        existing, content_hash = self._find_duplicate(audio_path)
+        if existing:
+            return existing
+
         voice_id = self.service.enroll_voice(audio_url=audio_path) # Pass local path
         if not voice_id:
             raise Exception("Local voice enrollment failed.")
 
-        # 3. Save to local cache/persistence
+        # 3. Save to the persisted registry so the id survives restarts
         profile = VoiceProfile(
             id=voice_id,
             name=name,
             type=voice_type,
             file_path=audio_path, # Keep local path for sample playback
         )
-        self.voices_cache[voice_id] = profile
+        self.registry.add(profile, content_hash)
         logger.info(f"Successfully enrolled voice: {name} (ID: {voice_id})")
         return profile
 
     def get_voice_profiles(self) -> List[VoiceProfile]:
         """Return all available voice profiles (Presets + Local)."""
-        presets = self.service.get_preset_voices()
-        local_voices = list(self.voices_cache.values())
-        return presets + local_voices
+        return self.registry.all()
+
+    def search_voice_profiles(
+        self,
+        search: Optional[str] = None,
+        voice_type: Optional[VoiceType] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> tuple[List[VoiceProfile], int]:
+        """Return a page of matching voice profiles and the total match count."""
+        return self.registry.search(search, voice_type, offset, limit)
 
     def get_voice_profile(self, voice_id: str) -> Optional[VoiceProfile]:
-        """Return a specific voice profile by id."""
-        # Check local first
-        if voice_id in self.voices_cache:
-            return self.voices_cache[voice_id]
-        
-        # Check presets
-        for v in self.service.get_preset_voices():
-            if v.id == voice_id:
-                return v
-        return None
+        """Return a specific voice profile by id (or unambiguous name)."""
+        return self.registry.resolve(voice_id)
 
     def is_model_loaded(self) -> bool:
         """Return True if model is loaded (Always true for API service)."""
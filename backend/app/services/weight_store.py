@@ -0,0 +1,130 @@
+"""Memory-mapped model weights shared by every worker process on a host.
+
+``torch.load`` normally reads ``llm.pt``, ``flow.pt`` and ``hift.pt`` into
+private memory, so N worker processes hold N copies of the weights. With
+``MODEL_WEIGHTS_MMAP`` each checkpoint is converted once to a torch zipfile
+with contiguous tensors (under ``MODEL_WEIGHTS_CACHE_DIR``; other processes
+wait on a file lock while one converts). While the model is constructed,
+loads of those checkpoints are served with ``torch.load(mmap=True)`` and
+modules take the mapped tensors as their parameters
+(``load_state_dict(assign=True)``) instead of copying them. The pages are
+file-backed and only read, so every process shares the same page cache,
+and a warm cache makes loading nearly free.
+
+This only applies on CPU: moving or casting weights to a GPU makes private
+copies anyway.
+"""
+
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: conversions are not serialised between processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_FILES = ("llm.pt", "flow.pt", "hift.pt")
+
+# torch.load / load_state_dict are patched process-wide while a model loads
+_patch_lock = threading.Lock()
+
+
+class MmapWeightStore:
+    """Converted, mappable copies of a model directory's checkpoints."""
+
+    def __init__(self, model_dir: str, cache_dir: Path):
+        self.model_dir = Path(model_dir)
+        self.cache_dir = Path(cache_dir) / self.model_dir.name
+        self.mapped: Dict[str, int] = {}  # file name -> bytes mapped
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / ".lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _source_stamp(self, source: Path) -> dict:
+        import torch
+
+        stat = source.stat()
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "torch": torch.__version__}
+
+    def prepare(self) -> Dict[Path, Path]:
+        """Convert stale or missing checkpoints; returns {source path: mappable path}."""
+        import torch
+
+        converted = {}
+        with self._file_lock():
+            for name in WEIGHT_FILES:
+                source = self.model_dir / name
+                if not source.exists():
+                    continue
+                target = self.cache_dir / name
+                meta_path = self.cache_dir / f"{name}.json"
+                stamp = self._source_stamp(source)
+                current = None
+                if meta_path.exists() and target.exists():
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        current = json.load(f)
+                if current != stamp:
+                    logger.info(f"Converting {source} for memory-mapped loading...")
+                    state = torch.load(source, map_location="cpu")
+                    state = {k: v.contiguous() if torch.is_tensor(v) else v for k, v in state.items()}
+                    tmp_path = target.with_suffix(".tmp")
+                    torch.save(state, tmp_path)
+                    os.replace(tmp_path, target)
+                    with open(meta_path, "w", encoding="utf-8") as f:
+                        json.dump(stamp, f)
+                converted[source.resolve()] = target
+        return converted
+
+    @contextmanager
+    def loading(self) -> Iterator[None]:
+        """Serve this model's checkpoints memory-mapped while the model is built."""
+        import torch
+
+        converted = self.prepare()
+        original_load = torch.load
+        original_load_state_dict = torch.nn.Module.load_state_dict
+
+        def load(f, *args, **kwargs):
+            target = converted.get(Path(f).resolve()) if isinstance(f, (str, os.PathLike)) else None
+            if target is None:
+                return original_load(f, *args, **kwargs)
+            # Mapped tensors live on the CPU; the model moves its modules afterwards
+            self.mapped[target.name] = target.stat().st_size
+            return original_load(target, map_location="cpu", mmap=True, weights_only=True)
+
+        def load_state_dict(module, state_dict, strict=True, assign=False):
+            # Adopt the mapped tensors rather than copying them into fresh parameters
+            return original_load_state_dict(module, state_dict, strict=strict, assign=True)
+
+        with _patch_lock:
+            torch.load = load
+            torch.nn.Module.load_state_dict = load_state_dict
+            try:
+                yield
+            finally:
+                torch.load = original_load
+                torch.nn.Module.load_state_dict = original_load_state_dict
+        logger.info(f"Memory-mapped weights: {sorted(self.mapped) or 'none'}")
+
+    def describe(self) -> Dict[str, Optional[float]]:
+        return {
+            "mode": "mmap" if self.mapped else "private",
+            "files": sorted(self.mapped),
+            "mapped_mb": round(sum(self.mapped.values()) / 1e6, 1),
+        }
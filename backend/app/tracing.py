@@ -0,0 +1,352 @@
+"""Lightweight span tracing with an OpenTelemetry-compatible exporter.
+
+Spans are grouped per trace and exported once the root span ends, as one
+OTLP/JSON ``ExportTraceServiceRequest`` per line. That file can be replayed
+into a collector with the ``otlpjsonfile`` receiver, or the same payload can
+be POSTed directly to an OTLP/HTTP collector (``TRACE_COLLECTOR_URL``).
+
+Usage::
+
+    with tracer.span("audio_service.save_audio", filename=name) as span:
+        ...
+        span.set_attribute("bytes", size)
+"""
+
+import json
+import queue
+import logging
+import numbers
+import os
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Request id of the HTTP request currently being handled (set by middleware)
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+# Attributes copied from the root span onto every span of the trace
+_BAGGAGE_KEYS = ("request_id", "task_id")
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+def _plain(value: Any) -> Any:
+    """A numpy (or torch) scalar as the Python number it holds; anything else as is."""
+    if getattr(value, "ndim", None) == 0 and hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    value = _plain(value)
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, numbers.Integral):
+        return {"intValue": str(int(value))}
+    if isinstance(value, numbers.Real):
+        return {"doubleValue": float(value)}
+    return {"stringValue": str(value)}
+
+
+def _json_default(value: Any) -> Any:
+    value = _plain(value)
+    return value if isinstance(value, (bool, int, float)) else str(value)
+
+
+class Trace:
+    """All spans sharing one trace id."""
+
+    def __init__(self, baggage: Dict[str, Any]):
+        self.trace_id = _new_id(16)
+        self.baggage = baggage
+        self.spans: List["Span"] = []
+        self.lock = threading.Lock()
+
+
+class Span:
+    """A timed unit of work."""
+
+    def __init__(self, name: str, trace: Trace, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.parent = parent
+        self.span_id = _new_id(8)
+        self.attributes = dict(attributes)
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes})
+
+    def to_otlp(self) -> Dict[str, Any]:
+        attributes = {**self.trace.baggage, **self.attributes}
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None
+            ],
+            "events": [
+                {
+                    "name": e["name"],
+                    "timeUnixNano": str(e["time_ns"]),
+                    "attributes": [
+                        {"key": k, "value": _otlp_value(v)} for k, v in e["attributes"].items()
+                    ],
+                }
+                for e in self.events
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class _NoopSpan:
+    """Stand-in returned when tracing is disabled."""
+
+    duration = 0.0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        pass
+
+
+# Finished traces waiting for the exporter thread; beyond this they are dropped
+EXPORT_QUEUE_SIZE = 1000
+
+
+def _append_line(path: Path, line: str) -> None:
+    """Append to a JSON-lines file, first rotating it to ``<name>.1`` past TRACE_FILE_MAX_MB."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    max_bytes = settings.TRACE_FILE_MAX_MB * 1e6
+    if max_bytes > 0 and path.exists() and path.stat().st_size >= max_bytes:
+        os.replace(path, path.with_name(path.name + ".1"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+class Tracer:
+    """Creates spans and exports finished traces.
+
+    File writes and collector posts run on one background exporter thread,
+    so a slow disk or collector never blocks generation.
+    """
+
+    def __init__(self):
+        self.enabled = settings.TRACING_ENABLED
+        self._listeners: List[Callable[[List[Span]], None]] = []
+        self._exports: "queue.Queue[Callable[[], None]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._exporter: Optional[threading.Thread] = None
+        self._exporter_lock = threading.Lock()
+        self.dropped_exports = 0
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Open a child of the current span (or a new trace if there is none)."""
+        if not self.enabled:
+            yield _NoopSpan()
+            return
+
+        parent = _current_span.get()
+        if parent is None:
+            baggage = {k: attributes.pop(k) for k in _BAGGAGE_KEYS if k in attributes}
+            baggage.setdefault("request_id", request_id_var.get())
+            trace = Trace(baggage)
+        else:
+            trace = parent.trace
+
+        span = Span(name, trace, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            with trace.lock:
+                trace.spans.append(span)
+            if parent is None:
+                self._finish_trace(span)
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def attach(self, span: Optional[Span]) -> Iterator[None]:
+        """Make `span` the current parent, e.g. inside a worker thread."""
+        token = _current_span.set(span)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def add_listener(self, listener: Callable[[List[Span]], None]) -> None:
+        """Call `listener` with the spans of every finished trace."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[List[Span]], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _finish_trace(self, root: Span) -> None:
+        try:
+            with root.trace.lock:
+                spans = list(root.trace.spans)
+            for listener in list(self._listeners):
+                listener(spans)
+            payload = self._to_otlp_request(spans)
+            self._export(payload)
+            if root.duration >= settings.SLOW_TASK_THRESHOLD_SEC:
+                self._log_slow_task(root, spans)
+        except Exception as e:
+            logger.warning(f"Failed to export trace: {e}")
+
+    def _to_otlp_request(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": settings.APP_NAME}},
+                            {"key": "service.version", "value": {"stringValue": settings.APP_VERSION}},
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app.tracing"},
+                            "spans": [s.to_otlp() for s in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _submit_export(self, job: Callable[[], None]) -> None:
+        if self._exporter is None:
+            with self._exporter_lock:
+                if self._exporter is None:
+                    self._exporter = threading.Thread(target=self._export_loop, name="trace_exporter", daemon=True)
+                    self._exporter.start()
+        try:
+            self._exports.put_nowait(job)
+        except queue.Full:
+            self.dropped_exports += 1
+
+    def _export_loop(self) -> None:
+        while True:
+            job = self._exports.get()
+            try:
+                job()
+            except Exception as e:
+                logger.warning(f"Failed to export trace: {e}")
+
+    def _export(self, payload: Dict[str, Any]) -> None:
+        path = settings.TRACE_EXPORT_PATH
+        if path:
+            line = json.dumps(payload, ensure_ascii=False)
+            self._submit_export(lambda: _append_line(path, line))
+        if settings.TRACE_COLLECTOR_URL:
+            self._submit_export(lambda: self._post_to_collector(payload))
+
+    @staticmethod
+    def _post_to_collector(payload: Dict[str, Any]) -> None:
+        try:
+            import httpx
+
+            url = settings.TRACE_COLLECTOR_URL.rstrip("/") + "/v1/traces"
+            httpx.post(url, json=payload, timeout=5.0)
+        except Exception as e:
+            logger.warning(f"Failed to send trace to collector: {e}")
+
+    def _log_slow_task(self, root: Span, spans: List[Span]) -> None:
+        tree = self.format_tree(spans)
+        logger.warning(
+            f"Slow task: '{root.name}' took {root.duration:.2f}s "
+            f"(threshold {settings.SLOW_TASK_THRESHOLD_SEC}s)\n{tree}"
+        )
+        if settings.SLOW_TASK_LOG_PATH:
+            path = settings.SLOW_TASK_LOG_PATH
+            record = {
+                "trace_id": root.trace.trace_id,
+                "name": root.name,
+                "duration_sec": round(root.duration, 4),
+                **{k: v for k, v in root.trace.baggage.items() if v is not None},
+                "tree": self._tree_dict(root, spans),
+            }
+            line = json.dumps(record, ensure_ascii=False, default=_json_default)
+            self._submit_export(lambda: _append_line(path, line))
+
+    @staticmethod
+    def _children(spans: List[Span]) -> Dict[Optional[str], List[Span]]:
+        children: Dict[Optional[str], List[Span]] = {}
+        for s in sorted(spans, key=lambda s: s.start_ns):
+            key = s.parent.span_id if s.parent else None
+            children.setdefault(key, []).append(s)
+        return children
+
+    def _tree_dict(self, root: Span, spans: List[Span]) -> Dict[str, Any]:
+        children = self._children(spans)
+
+        def build(span: Span) -> Dict[str, Any]:
+            return {
+                "name": span.name,
+                "duration_sec": round(span.duration, 4),
+                "attributes": span.attributes,
+                "error": span.error,
+                "children": [build(c) for c in children.get(span.span_id, [])],
+            }
+
+        return build(root)
+
+    def format_tree(self, spans: List[Span]) -> str:
+        """Render spans as an indented tree with durations."""
+        children = self._children(spans)
+        lines: List[str] = []
+
+        def walk(span: Span, depth: int) -> None:
+            attrs = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+            lines.append(f"{'  ' * depth}{span.name} {span.duration * 1000:.1f}ms {attrs}".rstrip())
+            for child in children.get(span.span_id, []):
+                walk(child, depth + 1)
+
+        for root in children.get(None, []):
+            walk(root, 0)
+        return "\n".join(lines)
+
+
+tracer = Tracer()
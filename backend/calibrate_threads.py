@@ -0,0 +1,154 @@
+"""
+THREAD LAYOUT CALIBRATION
+Finds the split of CPU cores between engine workers and intra-op threads that
+gives the highest generation throughput on this host.
+
+For every (ENGINE_WORKERS, ENGINE_THREADS_PER_WORKER) pair that fits in the
+available cores, a fresh process loads the engine with that layout (torch
+fixes its thread pools at start-up, so layouts cannot be switched in place),
+runs a fixed set of concurrent generations and reports seconds of audio
+produced per wall-clock second. The best layout is printed as .env lines.
+
+Usage:
+    python calibrate_threads.py
+    python calibrate_threads.py --requests 16 --max-workers 4 --output layouts.json
+    VOICE_ENGINE=stub python calibrate_threads.py --requests 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Make the `app` package importable when run as `python calibrate_threads.py`
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+CALIBRATION_TEXT = (
+    "Artificial intelligence is rapidly transforming the creative economy through advanced voice synthesis. "
+    "This technology enables content creators to produce high-quality audio at unprecedented scale."
+)
+
+
+def run_child(requests: int, voice_id: str | None) -> dict:
+    """Measure throughput of the layout given by the environment."""
+    from app.config import settings
+    from app.services import VoiceService
+    from app.services.thread_budget import thread_budget
+
+    settings.TRACE_EXPORT_PATH = None
+    settings.SLOW_TASK_LOG_PATH = None
+
+    voice_service = VoiceService()
+    if not voice_service.is_model_loaded():
+        raise RuntimeError("Engine failed to load")
+    if voice_id is None:
+        voice_id = voice_service.get_voice_profiles()[0].id
+
+    def generate(_):
+        audio, sample_rate = voice_service.generate_speech(text=CALIBRATION_TEXT, voice_id=voice_id)
+        return len(audio) / sample_rate
+
+    # Warm-up so lazy initialisation is not timed
+    generate(0)
+
+    concurrency = max(settings.GENERATION_WORKERS, settings.ENGINE_WORKERS)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        audio_sec = sum(pool.map(generate, range(requests)))
+    wall_sec = time.perf_counter() - start
+
+    return {
+        "engine_workers": settings.ENGINE_WORKERS,
+        "threads_per_worker": settings.ENGINE_THREADS_PER_WORKER,
+        "requests": requests,
+        "wall_sec": round(wall_sec, 3),
+        "audio_sec": round(audio_sec, 3),
+        "throughput": round(audio_sec / wall_sec, 3),
+        "layout": thread_budget.describe()["workers"],
+    }
+
+
+def candidate_layouts(cores: int, max_workers: int) -> list[tuple[int, int]]:
+    """(workers, threads per worker) pairs using at most `cores` cores."""
+    layouts = []
+    for workers in range(1, min(cores, max_workers) + 1):
+        threads = 1
+        while workers * threads <= cores:
+            layouts.append((workers, threads))
+            threads *= 2
+        if cores // workers != threads // 2:
+            layouts.append((workers, cores // workers))
+    return layouts
+
+
+def measure(workers: int, threads: int, args) -> dict | None:
+    env = dict(os.environ)
+    env.update({
+        "ENGINE_WORKERS": str(workers),
+        "ENGINE_THREADS_PER_WORKER": str(threads),
+        # ENGINE_WORKERS only takes effect behind the engine call queue
+        "ENGINE_CALL_QUEUE": "true",
+        # Enough generation workers to keep every engine worker busy
+        "GENERATION_WORKERS": str(max(int(env.get("GENERATION_WORKERS", 2)), 2 * workers)),
+        "OMP_NUM_THREADS": str(threads),
+    })
+    cmd = [sys.executable, __file__, "--child", "--requests", str(args.requests)]
+    if args.voice_id:
+        cmd += ["--voice-id", args.voice_id]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"  ⚠ {workers}x{threads} failed: {proc.stderr.strip().splitlines()[-1:]}")
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick ENGINE_WORKERS x ENGINE_THREADS_PER_WORKER")
+    parser.add_argument("--requests", type=int, default=8, help="Generations per layout (default: 8)")
+    parser.add_argument("--voice-id", type=str, help="Voice to synthesise with (default: first voice)")
+    parser.add_argument("--max-workers", type=int, default=8, help="Largest ENGINE_WORKERS tried (default: 8)")
+    parser.add_argument("--output", type=str, help="Write all results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.requests, args.voice_id)))
+        return
+
+    from app.services.thread_budget import detect_topology
+
+    topology = detect_topology()
+    cores = sum(len(cpus) for cpus in topology)
+    layouts = candidate_layouts(cores, args.max_workers)
+    print(f"{cores} cores on {len(topology)} NUMA node(s); trying {len(layouts)} layouts")
+    print(f"{'workers':>8} {'threads':>8} {'wall s':>8} {'audio s/s':>10}")
+
+    results = []
+    for workers, threads in layouts:
+        result = measure(workers, threads, args)
+        if result is None:
+            continue
+        results.append(result)
+        print(f"{workers:>8} {threads:>8} {result['wall_sec']:>8.2f} {result['throughput']:>10.2f}")
+
+    if not results:
+        print("No layout completed")
+        sys.exit(1)
+
+    best = max(results, key=lambda r: r["throughput"])
+    print("\nBest layout:")
+    print(f"ENGINE_WORKERS={best['engine_workers']}")
+    print(f"ENGINE_THREADS_PER_WORKER={best['threads_per_worker']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cores": cores, "numa_nodes": len(topology), "results": results, "best": best}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+COLD-START CHECK
+Measures how long a fresh process takes to import the API and to start
+serving, and fails (exit status 1) when either exceeds its budget. Run it in
+CI or before building an image so slow imports do not creep back in.
+
+Each measurement runs in a new interpreter, so nothing is already imported:
+
+* import: ``python -X importtime -c "import app.main"``, with the slowest
+  top-level packages listed by their own (self) import time;
+* serving: import plus application start-up until /api/health answers;
+* ready (with --ready): until /api/ready answers 200, i.e. the model loaded.
+
+Usage:
+    python check_startup.py
+    python check_startup.py --import-budget 1.0 --serving-budget 2.0 --top 15
+    VOICE_ENGINE=stub python check_startup.py --ready --ready-budget 10
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+SERVING_PROBE = """
+import json, time
+started = time.perf_counter()
+import app.main
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get("/api/health").raise_for_status()
+    serving = time.perf_counter() - started
+    ready = None
+    if {wait_ready}:
+        while client.get("/api/ready").status_code != 200:
+            if time.perf_counter() - started > {timeout}:
+                break
+            time.sleep(0.05)
+        else:
+            ready = time.perf_counter() - started
+print("STARTUP " + json.dumps({{"serving_sec": serving, "ready_sec": ready}}))
+"""
+
+
+def _run(args: list) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+
+
+def measure_imports() -> tuple:
+    """(total seconds to import app.main, self seconds per top-level package)."""
+    proc = _run(["-X", "importtime", "-c", "import app.main"])
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app.main failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    per_package = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        per_package[name.strip().split(".")[0]] += int(self_us)
+        if name.strip() == "app.main":
+            total_us = int(cumulative_us)
+    return total_us / 1e6, {name: us / 1e6 for name, us in per_package.items()}
+
+
+def measure_startup(wait_ready: bool, timeout: float) -> dict:
+    proc = _run(["-c", SERVING_PROBE.format(wait_ready=wait_ready, timeout=timeout)])
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise RuntimeError(f"Start-up probe failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check API cold-start time against a budget")
+    parser.add_argument("--import-budget", type=float, default=1.5, help="max seconds to import app.main")
+    parser.add_argument("--serving-budget", type=float, default=3.0, help="max seconds until /api/health answers")
+    parser.add_argument("--ready", action="store_true", help="also wait for /api/ready (model loaded)")
+    parser.add_argument("--ready-budget", type=float, default=120.0)
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list")
+    args = parser.parse_args()
+
+    import_sec, per_package = measure_imports()
+    print(f"\nimport app.main: {import_sec:.2f}s (budget {args.import_budget:.2f}s)")
+    print("Slowest packages (self import time):")
+    for name, seconds in sorted(per_package.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+    startup = measure_startup(args.ready, args.ready_budget)
+    print(f"\nServing after: {startup['serving_sec']:.2f}s (budget {args.serving_budget:.2f}s)")
+    failures = []
+    if import_sec > args.import_budget:
+        failures.append(f"import took {import_sec:.2f}s > {args.import_budget:.2f}s")
+    if startup["serving_sec"] > args.serving_budget:
+        failures.append(f"serving took {startup['serving_sec']:.2f}s > {args.serving_budget:.2f}s")
+    if args.ready:
+        ready = startup["ready_sec"]
+        print(f"Ready after:   {ready:.2f}s (budget {args.ready_budget:.2f}s)" if ready else "Never became ready")
+        if ready is None or ready > args.ready_budget:
+            failures.append("model did not become ready within budget")
+
+    if failures:
+        print("\nFAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nOK: cold start within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+HTTP LOAD TEST FOR THE GENERATE/POLL API
+Drives /api/generate, /api/tasks/{id}, /api/audio/library and /api/voices with
+a weighted mix of virtual users, ramped up over time, and reports throughput,
+p50/p95/p99 latency, error rates, and task-store and RSS growth (from /api/health).
+
+With --workers-sweep the script starts a local server per GENERATION_WORKERS
+value, runs the same load against each, and plots the concurrency-scaling curve.
+
+Usage:
+    python load_test.py --voice-id <id> --users 20 --ramp-up 30 --duration 120
+    python load_test.py --voice-id <id> --workers-sweep 1 2 4 8 --plot scaling.png
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+DEFAULT_MIX = {"generate": 1.0, "library": 2.0, "voices": 2.0}
+
+DEFAULT_TEXTS = [
+    "Hello, this is a short load test line.",
+    "Speaker 0: Welcome back to the show.\nSpeaker 1: Thanks, it's great to be here.",
+    "Artificial intelligence is rapidly transforming the creative economy through advanced voice synthesis. "
+    "This technology enables content creators to produce high-quality audio at unprecedented scale.",
+]
+
+
+class LoadStats:
+    """Collects per-endpoint latencies, errors and generation outcomes."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.generations = []  # (status, seconds from submit to terminal state)
+        self.health = []  # samples from /api/health
+
+    def record(self, endpoint, latency, ok):
+        self.latencies.setdefault(endpoint, []).append(latency)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            arr = np.array(values) * 1000
+            errors = self.errors.get(endpoint, 0)
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(float(np.percentile(arr, 50)), 1),
+                "p95_ms": round(float(np.percentile(arr, 95)), 1),
+                "p99_ms": round(float(np.percentile(arr, 99)), 1),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4),
+            }
+
+        total = sum(len(v) for v in self.latencies.values())
+        total_errors = sum(self.errors.values())
+        completed = [d for status, d in self.generations if status == "completed"]
+
+        report = {
+            "elapsed_sec": round(elapsed, 1),
+            "total_requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "error_rate": round(total_errors / total, 4) if total else 0,
+            "endpoints": endpoints,
+            "generations": {
+                "submitted": len(self.generations),
+                "completed": len(completed),
+                "failed": sum(1 for status, _ in self.generations if status != "completed"),
+                "per_min": round(60 * len(completed) / elapsed, 2) if elapsed else 0,
+                "p50_sec": round(float(np.percentile(completed, 50)), 2) if completed else None,
+                "p95_sec": round(float(np.percentile(completed, 95)), 2) if completed else None,
+            },
+            "health_samples": self.health,
+        }
+        if len(self.health) >= 2:
+            first, last = self.health[0], self.health[-1]
+            span = max(last["t"] - first["t"], 1e-9)
+            report["growth"] = {
+                "tasks_start": first["tasks"],
+                "tasks_end": last["tasks"],
+                "tasks_per_min": round(60 * (last["tasks"] - first["tasks"]) / span, 2),
+                "rss_start_mb": first["rss_mb"],
+                "rss_end_mb": last["rss_mb"],
+                "rss_peak_mb": max(h["rss_mb"] for h in self.health),
+                "rss_mb_per_min": round(60 * (last["rss_mb"] - first["rss_mb"]) / span, 2),
+            }
+        return report
+
+
+class LoadTest:
+    """Runs weighted virtual users against one server."""
+
+    def __init__(self, base_url, voice_id, users, ramp_up, duration, mix, texts,
+                 poll_interval=1.0, task_timeout=600.0):
+        self.base_url = base_url.rstrip("/")
+        self.voice_id = voice_id
+        self.users = users
+        self.ramp_up = ramp_up
+        self.duration = duration
+        self.mix = mix
+        self.texts = texts
+        self.poll_interval = poll_interval
+        self.task_timeout = task_timeout
+        self.stats = LoadStats()
+        self._deadline = 0.0
+
+    async def _request(self, client, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.stats.record(endpoint, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    async def _generate(self, client):
+        payload = {"text": random.choice(self.texts), "voice_id": self.voice_id}
+        response = await self._request(client, "POST /api/generate", "POST", "/api/generate", json=payload)
+        if response is None:
+            self.stats.generations.append(("error", 0.0))
+            return
+
+        task_id = response.json()["task_id"]
+        submitted = time.perf_counter()
+        while time.perf_counter() - submitted < self.task_timeout:
+            await asyncio.sleep(self.poll_interval)
+            response = await self._request(client, "GET /api/tasks/{id}", "GET", f"/api/tasks/{task_id}")
+            if response is None:
+                continue
+            status = response.json()["status"]
+            if status in ("completed", "failed", "cancelled"):
+                self.stats.generations.append((status, time.perf_counter() - submitted))
+                return
+        self.stats.generations.append(("timeout", time.perf_counter() - submitted))
+
+    async def _user(self, client, start_delay):
+        await asyncio.sleep(start_delay)
+        actions = list(self.mix)
+        weights = [self.mix[a] for a in actions]
+        while time.perf_counter() < self._deadline:
+            action = random.choices(actions, weights)[0]
+            if action == "generate":
+                await self._generate(client)
+            elif action == "library":
+                await self._request(client, "GET /api/audio/library", "GET", "/api/audio/library")
+            elif action == "voices":
+                await self._request(client, "GET /api/voices", "GET", "/api/voices")
+            # Think time between actions
+            await asyncio.sleep(random.uniform(0.1, 0.5))
+
+    async def _monitor(self, client, started):
+        while time.perf_counter() < self._deadline:
+            try:
+                health = (await client.get("/api/health")).json()
+                self.stats.health.append({
+                    "t": round(time.perf_counter() - started, 1),
+                    "tasks": health.get("tasks", {}).get("total", 0),
+                    "processing": health.get("tasks", {}).get("processing", 0),
+                    "pending": health.get("tasks", {}).get("pending", 0),
+                    "rss_mb": health.get("rss_mb", 0.0),
+                })
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(1.0)
+
+    async def run(self):
+        started = time.perf_counter()
+        self._deadline = started + self.duration
+        limits = httpx.Limits(max_connections=self.users + 1)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=60.0, limits=limits) as client:
+            delays = [self.ramp_up * i / max(self.users, 1) for i in range(self.users)]
+            await asyncio.gather(
+                self._monitor(client, started),
+                *(self._user(client, d) for d in delays),
+            )
+        return self.stats.report(time.perf_counter() - started)
+
+
+def start_server(port, workers):
+    """Start a local server with the given GENERATION_WORKERS and wait for /api/health."""
+    # Direct model calls, so GENERATION_WORKERS really is the model concurrency
+    env = {**os.environ, "GENERATION_WORKERS": str(workers), "ENGINE_CALL_QUEUE": "false"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=str(Path(__file__).resolve().parent),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 600
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited during startup (code {proc.returncode})")
+        try:
+            if httpx.get(f"{url}/api/health", timeout=2.0).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(1.0)
+    proc.terminate()
+    raise RuntimeError("Server did not become healthy in time")
+
+
+def print_report(report, label=""):
+    print("\n" + "=" * 70)
+    print(f"LOAD TEST RESULTS {label}".rstrip())
+    print("=" * 70)
+    print(f"Elapsed: {report['elapsed_sec']}s  Requests: {report['total_requests']}  "
+          f"Throughput: {report['throughput_rps']} req/s  Error rate: {report['error_rate'] * 100:.2f}%")
+    print(f"\n{'Endpoint':<28}{'req':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}")
+    for endpoint, e in report["endpoints"].items():
+        print(f"{endpoint:<28}{e['requests']:>7}{e['throughput_rps']:>8}{e['p50_ms']:>9}"
+              f"{e['p95_ms']:>9}{e['p99_ms']:>9}{e['error_rate'] * 100:>7.2f}")
+    g = report["generations"]
+    print(f"\nGenerations: {g['submitted']} submitted, {g['completed']} completed, {g['failed']} failed "
+          f"({g['per_min']}/min, p50 {g['p50_sec']}s, p95 {g['p95_sec']}s)")
+    if "growth" in report:
+        gr = report["growth"]
+        print(f"Task store: {gr['tasks_start']} → {gr['tasks_end']} ({gr['tasks_per_min']}/min)")
+        print(f"RSS: {gr['rss_start_mb']} → {gr['rss_end_mb']} MB (peak {gr['rss_peak_mb']} MB, "
+              f"{gr['rss_mb_per_min']} MB/min)")
+    print("=" * 70)
+
+
+def plot_scaling(sweep, path):
+    """Plot completed generations/min and p95 turnaround against worker count."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    workers = [s["workers"] for s in sweep]
+    per_min = [s["report"]["generations"]["per_min"] for s in sweep]
+    p95 = [s["report"]["generations"]["p95_sec"] or 0 for s in sweep]
+
+    fig, ax1 = plt.subplots(figsize=(7, 4))
+    ax1.plot(workers, per_min, "o-", color="tab:blue", label="generations/min")
+    ax1.set_xlabel("GENERATION_WORKERS")
+    ax1.set_ylabel("completed generations / min", color="tab:blue")
+    ax2 = ax1.twinx()
+    ax2.plot(workers, p95, "s--", color="tab:red", label="p95 turnaround")
+    ax2.set_ylabel("p95 turnaround (s)", color="tab:red")
+    ax1.set_title("Concurrency scaling")
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f"✓ Scaling curve saved to: {path}")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown action '{name}' (use {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lyrebird HTTP load test")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server to test (ignored with --workers-sweep)")
+    parser.add_argument("--voice-id", required=True, help="Voice id used for /api/generate")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users (default: 10)")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Seconds to start all users (default: 10)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test duration in seconds (default: 60)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Action weights, e.g. generate=1,library=2,voices=2")
+    parser.add_argument("--text-file", type=str, help="File with one generation text per line")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Task poll interval in seconds")
+    parser.add_argument("--workers-sweep", nargs="+", type=int,
+                        help="Start a local server per GENERATION_WORKERS value and compare")
+    parser.add_argument("--port", type=int, default=8765, help="Port for locally started servers")
+    parser.add_argument("--plot", type=str, default="load_scaling.png", help="Scaling curve output (sweep only)")
+    parser.add_argument("--output", type=str, default="load_test_results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    texts = DEFAULT_TEXTS
+    if args.text_file:
+        texts = [line.strip() for line in Path(args.text_file).read_text(encoding="utf-8").splitlines() if line.strip()]
+
+    def run_once(base_url):
+        test = LoadTest(base_url, args.voice_id, args.users, args.ramp_up, args.duration,
+                        args.mix, texts, poll_interval=args.poll_interval)
+        return asyncio.run(test.run())
+
+    output = {
+        "timestamp": datetime.now().isoformat(),
+        "users": args.users,
+        "ramp_up_sec": args.ramp_up,
+        "duration_sec": args.duration,
+        "mix": args.mix,
+    }
+
+    if args.workers_sweep:
+        sweep = []
+        for workers in args.workers_sweep:
+            print(f"\nStarting local server with GENERATION_WORKERS={workers}...")
+            proc, url = start_server(args.port, workers)
+            try:
+                report = run_once(url)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+            print_report(report, f"(workers={workers})")
+            sweep.append({"workers": workers, "report": report})
+        output["sweep"] = sweep
+        plot_scaling(sweep, args.plot)
+    else:
+        report = run_once(args.base_url)
+        print_report(report)
+        output["report"] = report
+
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\n✓ Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
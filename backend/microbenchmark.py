@@ -0,0 +1,324 @@
+"""
+MICROBENCHMARKS FOR TEXT PARSING AND AUDIO HOT PATHS
+Times the regex-heavy script parsing in the engine and LLMService, and the
+AudioService paths that scale with input size, on synthetic fixtures of
+realistic size (10k-line scripts, hour-long audio, 50k library entries).
+
+Results can be stored as a baseline; later runs are compared against it and
+the script exits non-zero if any benchmark is slower than baseline by more
+than the threshold, or if there is no baseline for the run's --scale.
+Fixture sizes depend on the scale, so baselines are kept per scale and a
+run is only ever compared with one recorded at the same scale.
+
+Usage:
+    python microbenchmark.py --save-baseline            # record baseline
+    python microbenchmark.py                            # compare (exit 1 on regression)
+    python microbenchmark.py --scale 0.05 --only parse  # quick subset
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import soundfile as sf
+
+# Make the `app` package importable when run as `python microbenchmark.py`
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.config import settings  # noqa: E402
+
+# Span export would add file I/O to every timed call
+settings.TRACE_EXPORT_PATH = None
+settings.SLOW_TASK_LOG_PATH = None
+
+DEFAULT_BASELINE = "microbenchmark_baseline.json"
+
+WORDS = (
+    "voice synthesis creative economy model latency podcast guest host audio "
+    "studio consent rights compensation deployment quality streaming"
+).split()
+TAGS = ["happy", "sad", "serious", "surprised", "whisper", "affectionate"]
+
+
+def _sentence(rng, n_words):
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + "."
+
+
+def make_engine_script(n_lines, rng):
+    """Speaker-labelled script with emotion tags on roughly a third of lines."""
+    lines = []
+    for i in range(n_lines):
+        text = _sentence(rng, rng.randint(6, 20))
+        if rng.random() < 0.33:
+            tag = rng.choice(TAGS)
+            text = f"{_sentence(rng, 4)} <{tag}>{text}</{tag}> {_sentence(rng, 3)}"
+        lines.append(f"Speaker {i % 2}: {text}")
+    return "\n".join(lines)
+
+
+def make_llm_script(n_lines, rng):
+    """LLM-style "Host: ... / Guest: ..." output with wrapped continuation lines."""
+    lines = []
+    for i in range(n_lines):
+        speaker = "Host" if i % 2 == 0 else "Guest"
+        lines.append(f"{speaker}: {_sentence(rng, rng.randint(6, 20))}")
+        if rng.random() < 0.2:
+            lines.append(_sentence(rng, rng.randint(4, 10)))
+        if rng.random() < 0.1:
+            lines.append("")
+    return "\n".join(lines)
+
+
+def make_audio(seconds, sample_rate, channels=1, seed=0):
+    """Speech-like synthetic audio: harmonics with a syllable envelope and noise."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n, dtype=np.float32) / sample_rate
+    audio = np.sin(2 * np.pi * 140 * t) + 0.5 * np.sin(2 * np.pi * 280 * t)
+    audio *= 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    audio += 0.01 * rng.standard_normal(n).astype(np.float32)
+    audio = (0.3 * audio).astype(np.float32)
+    if channels > 1:
+        audio = np.stack([audio] * channels, axis=1)
+    return audio
+
+
+def make_library(directory, n_entries, rng):
+    """Write n tiny WAVs, most with metadata JSON, like OUTPUTS_DIR."""
+    silence = np.zeros(16, dtype=np.float32)
+    for i in range(n_entries):
+        name = f"voice{i % 37}_{i:06d}.wav"
+        sf.write(str(directory / name), silence, 16000)
+        if i % 10:  # ~10% of files have no metadata
+            metadata = {
+                "filename": name,
+                "voice_name": f"voice{i % 37}",
+                "duration": round(rng.uniform(1, 600), 2),
+                "text_preview": _sentence(rng, 12)[:100],
+                "created_at": datetime(2025, 1, 1 + i % 28, i % 24, i % 60).isoformat(),
+            }
+            (directory / name).with_suffix(".json").write_text(json.dumps(metadata))
+
+
+class Microbenchmarks:
+    """Registry of named benchmarks with lazily built, shared fixtures."""
+
+    def __init__(self, scale, workdir):
+        self.scale = scale
+        self.workdir = Path(workdir)
+        self.rng = random.Random(42)
+        self._fixtures = {}
+
+    def fixture(self, name, build):
+        if name not in self._fixtures:
+            started = time.perf_counter()
+            self._fixtures[name] = build()
+            print(f"  (fixture '{name}' built in {time.perf_counter() - started:.1f}s)")
+        return self._fixtures[name]
+
+    def n(self, full_size):
+        return max(1, int(full_size * self.scale))
+
+    # --- Text parsing ---
+
+    def engine_script(self):
+        return self.fixture("engine_script", lambda: make_engine_script(self.n(10_000), self.rng))
+
+    def bench_parse_segments(self):
+        from app.services.voice_engine_service import LocalLyrebirdService
+        text = self.engine_script()
+        return lambda: LocalLyrebirdService._parse_segments(text)
+
+    def bench_split_sub_chunks(self):
+        from app.services.voice_engine_service import LocalLyrebirdService
+        segments = [seg for _, seg in LocalLyrebirdService._parse_segments(self.engine_script())]
+        return lambda: [LocalLyrebirdService._split_sub_chunks(seg) for seg in segments]
+
+    def bench_parse_llm_script(self):
+        from app.services.llm_service import LLMService
+        text = self.fixture("llm_script", lambda: make_llm_script(self.n(10_000), self.rng))
+        service = LLMService.__new__(LLMService)  # parsing needs no client
+        return lambda: service._parse_script_text(text, "Host", "Guest")
+
+    # --- Audio ---
+
+    def hour_audio(self):
+        return self.fixture("hour_audio", lambda: make_audio(self.n(3600), 24000))
+
+    def bench_resample(self):
+        from app.services.audio_service import AudioService
+        audio = self.hour_audio()
+        return lambda: AudioService._resample_if_needed(audio, 24000, settings.SAMPLE_RATE)
+
+    def bench_normalize(self):
+        from app.services.audio_service import AudioService
+        audio = self.hour_audio()
+        return lambda: AudioService.normalize_audio(audio)
+
+    def bench_process_effects(self):
+        from app.services.audio_service import AudioService
+        audio = self.hour_audio()
+        return lambda: AudioService.process_effects(
+            audio, speed=1.1, pitch=2.0, sample_rate=24000, pitch_unit="semitones"
+        )
+
+    def bench_convert_to_wav(self):
+        from app.services.audio_service import AudioService
+
+        def build():
+            # 44.1kHz stereo FLAC so conversion has to decode, mix down and resample
+            path = self.workdir / "hour.flac"
+            sf.write(str(path), make_audio(self.n(3600), 44100, channels=2), 44100)
+            return path
+
+        src = self.fixture("hour_flac", build)
+        dst = self.workdir / "converted.wav"
+        return lambda: AudioService.convert_to_wav(str(src), str(dst))
+
+    def bench_audio_library(self):
+        from app.services.audio_service import AudioService
+
+        def build():
+            directory = self.workdir / "library"
+            directory.mkdir(exist_ok=True)
+            make_library(directory, self.n(50_000), self.rng)
+            return directory
+
+        directory = self.fixture("library", build)
+
+        def run():
+            previous = settings.OUTPUTS_DIR
+            settings.OUTPUTS_DIR = directory
+            try:
+                AudioService.get_audio_library("voice1")
+            finally:
+                settings.OUTPUTS_DIR = previous
+
+        return run
+
+    def benchmarks(self):
+        """(name, factory, repeats) for every benchmark."""
+        return [
+            ("parse.engine_segments", self.bench_parse_segments, 5),
+            ("parse.engine_sub_chunks", self.bench_split_sub_chunks, 5),
+            ("parse.llm_script", self.bench_parse_llm_script, 5),
+            ("audio.resample", self.bench_resample, 3),
+            ("audio.normalize", self.bench_normalize, 3),
+            ("audio.process_effects", self.bench_process_effects, 3),
+            ("audio.convert_to_wav", self.bench_convert_to_wav, 3),
+            ("audio.library", self.bench_audio_library, 3),
+        ]
+
+
+def run_benchmarks(suite, only=None):
+    results = {}
+    for name, factory, repeats in suite.benchmarks():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        print(f"\n[{name}]")
+        fn = factory()
+        if repeats > 1:
+            fn()  # warm-up: lazy imports, filter caches, page cache
+        times = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+        results[name] = {
+            "min_sec": round(min(times), 6),
+            "mean_sec": round(float(np.mean(times)), 6),
+            "repeats": repeats,
+        }
+        print(f"  min {min(times) * 1000:.2f}ms  mean {np.mean(times) * 1000:.2f}ms  ({repeats} runs)")
+    return results
+
+
+def load_baselines(path):
+    """Baselines by scale ("1.0" -> {"results": ...}) from `path`, or {}."""
+    if not path.exists():
+        return {}
+    data = json.loads(path.read_text())
+    if "scales" in data:
+        return data["scales"]
+    # Single-scale file written before baselines were kept per scale
+    return {str(float(data["scale"])): data} if "scale" in data else {}
+
+
+def compare(results, baseline, threshold):
+    """Return names of benchmarks slower than baseline by more than threshold."""
+    regressions = []
+    print("\n" + "=" * 70)
+    print(f"COMPARISON AGAINST BASELINE (threshold +{threshold * 100:.0f}%)")
+    print("=" * 70)
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<28} {'new':>10}")
+            continue
+        ratio = result["min_sec"] / base["min_sec"] if base["min_sec"] else 1.0
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<28} {base['min_sec'] * 1000:>10.2f}ms → {result['min_sec'] * 1000:>10.2f}ms "
+              f"({(ratio - 1) * 100:+6.1f}%) {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lyrebird microbenchmarks")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Fixture size multiplier (1.0 = 10k lines, 1h audio, 50k entries)")
+    parser.add_argument("--only", nargs="+", help="Run benchmarks whose name starts with these prefixes")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown vs baseline before failing (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="lyrebird-bench-") as workdir:
+        suite = Microbenchmarks(args.scale, workdir)
+        results = run_benchmarks(suite, args.only)
+
+    output = {
+        "timestamp": datetime.now().isoformat(),
+        "scale": args.scale,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    baseline_path = Path(args.baseline)
+    baselines = load_baselines(baseline_path)
+    scale_key = str(float(args.scale))
+    if args.save_baseline:
+        # Benchmarks left out by --only keep their earlier numbers at this scale
+        previous = baselines.get(scale_key, {})
+        output["results"] = {**previous.get("results", {}), **results}
+        baselines[scale_key] = output
+        baseline_path.write_text(json.dumps({"scales": baselines}, indent=2))
+        print(f"\n✓ Baseline for scale {args.scale} saved to: {baseline_path}")
+        return
+
+    baseline = baselines.get(scale_key)
+    if baseline is None:
+        recorded = ", ".join(sorted(baselines)) or "none"
+        print(f"\n✗ No baseline for scale {args.scale} in {baseline_path} (recorded scales: {recorded}); "
+              f"run with --save-baseline first.")
+        sys.exit(2)
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
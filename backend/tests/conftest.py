@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+# Settings create their data directories on import; keep them and every
+# cache file out of the tree, and run the synthetic engine
+_data_dir = tempfile.mkdtemp(prefix="lyrebird-tests-")
+for name in ("VOICES_DIR", "OUTPUTS_DIR", "UPLOADS_DIR", "PROJECTS_DIR", "CHECKPOINTS_DIR"):
+    os.environ.setdefault(name, os.path.join(_data_dir, name.lower()))
+os.environ.setdefault("CHUNK_COST_MODEL_PATH", os.path.join(_data_dir, "chunk_cost_model.json"))
+os.environ.setdefault("TEXT_CACHE_PATH", os.path.join(_data_dir, "text_frontend_cache.sqlite3"))
+os.environ.setdefault("SLOW_TASK_LOG_PATH", os.path.join(_data_dir, "slow_tasks.jsonl"))
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.setdefault("VOICE_ENGINE", "stub")
+os.environ.setdefault("STUB_LATENCY_SEC", "0")
+os.environ.setdefault("STUB_RTF", "0")
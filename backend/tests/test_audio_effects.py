@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.services.audio_effects import apply_effects, pitch_ratio
+
+SR = 24000
+
+
+def tone(seconds: float, freq: float) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def dominant_frequency(audio: np.ndarray) -> float:
+    spectrum = np.abs(np.fft.rfft(audio * np.hanning(audio.size)))
+    return float(np.fft.rfftfreq(audio.size, 1 / SR)[np.argmax(spectrum)])
+
+
+def test_pitch_ratio_units():
+    assert pitch_ratio(1.5) == 1.5
+    assert pitch_ratio(12, "semitones") == pytest.approx(2.0)
+    assert pitch_ratio(0.0, "semitones") == 1.0
+    with pytest.raises(ValueError):
+        pitch_ratio(0.0, "ratio")
+
+
+@pytest.mark.parametrize("speed", [0.75, 1.0, 1.5])
+def test_speed_scales_length_and_keeps_pitch(speed):
+    audio = tone(2.0, 220.0)
+    out = apply_effects(audio, SR, speed=speed)
+    assert out.size == pytest.approx(audio.size / speed, rel=0.02)
+    assert dominant_frequency(out) == pytest.approx(220.0, rel=0.02)
+
+
+@pytest.mark.parametrize("pitch,unit,ratio", [(1.25, "ratio", 1.25), (-5.0, "semitones", 2 ** (-5 / 12))])
+def test_pitch_scales_f0_and_keeps_length(pitch, unit, ratio):
+    audio = tone(2.0, 220.0)
+    out = apply_effects(audio, SR, pitch=pitch, pitch_unit=unit)
+    assert out.size == pytest.approx(audio.size, rel=0.02)
+    assert dominant_frequency(out) == pytest.approx(220.0 * ratio, rel=0.02)
+
+
+def test_speed_and_pitch_together():
+    audio = tone(2.0, 220.0)
+    out = apply_effects(audio, SR, speed=1.25, pitch=3.0, pitch_unit="semitones")
+    assert out.size == pytest.approx(audio.size / 1.25, rel=0.02)
+    assert dominant_frequency(out) == pytest.approx(220.0 * 2 ** (3 / 12), rel=0.02)
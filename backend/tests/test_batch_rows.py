@@ -0,0 +1,51 @@
+import pytest
+
+from app.config import settings
+from app.services.batch_service import parse_batch_rows
+
+
+def ids(content: bytes, filename: str = "rows.csv"):
+    return [row.id for row in parse_batch_rows(content, filename)]
+
+
+def test_missing_ids_default_to_line_numbers():
+    assert ids(b"text,voice\nhello,v\nworld,v\n") == ["row_2", "row_3"]
+    assert ids(b'{"text": "a", "voice": "v"}\n\n{"text": "b", "voice": "v"}\n', "rows.jsonl") == ["row_1", "row_3"]
+
+
+def test_duplicate_ids_get_unique_suffixes():
+    assert ids(b"id,text,voice\na,x,v\na,x,v\na,x,v\n") == ["a", "a_1", "a_2"]
+
+
+def test_suffixes_skip_ids_used_literally():
+    assert ids(b"id,text,voice\na,x,v\na,x,v\na_1,x,v\n") == ["a", "a_1", "a_1_1"]
+    assert ids(b"id,text,voice\na_1,x,v\na,x,v\na,x,v\n") == ["a_1", "a", "a_2"]
+
+
+def test_ids_are_sanitised_for_archive_names():
+    (row_id,) = ids(b"id,text,voice\n../../etc/passwd,x,v\n")
+    assert "/" not in row_id and ".." not in row_id
+
+
+def test_default_voice_and_bad_rows():
+    (row,) = parse_batch_rows(b"text\nhello\n", "rows.csv", default_voice_id="fallback")
+    assert row.voice_id == "fallback"
+    with pytest.raises(ValueError, match="Line 2"):
+        parse_batch_rows(b'{"text": "a", "voice": "v"}\n{not json\n', "rows.jsonl")
+
+
+def test_non_object_json_line_is_a_bad_row():
+    with pytest.raises(ValueError, match="Line 2: expected a JSON object"):
+        parse_batch_rows(b'{"text": "a", "voice": "v"}\n["text", "b"]\n', "rows.jsonl")
+
+
+def test_numeric_ids_are_coerced():
+    rows = parse_batch_rows(b'{"id": 7, "text": "a", "voice": 3}\n{"id": 7, "text": "b", "voice": "v"}\n', "rows.jsonl")
+    assert [row.id for row in rows] == ["7", "7_1"]
+    assert rows[0].voice_id == "3"
+
+
+def test_row_limit(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_ROWS", 2)
+    with pytest.raises(ValueError, match="limit"):
+        parse_batch_rows(b"text,voice\na,v\nb,v\nc,v\n", "rows.csv")
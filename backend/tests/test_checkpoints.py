@@ -0,0 +1,89 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.config import settings
+from app.main import app
+from app.services import checkpoint_service
+from app.services.checkpoint_service import STATE_CANCELLED, TaskCheckpoint
+
+LONG_TEXT = "Speaker 0: " + "This sentence is here to make the task long enough. " * 12
+
+
+def new_checkpoint(task_id):
+    return TaskCheckpoint.create(task_id, {"text": "x", "voice_id": "v"}, datetime.now(), None)
+
+
+def test_units_and_plans_survive_without_a_manifest():
+    checkpoint = new_checkpoint("units-and-plans")
+    for i in range(3):
+        checkpoint.put(f"u{i}", np.ones(10, dtype=np.float32))
+    checkpoint.plan("p0", lambda: ["a", "b"])
+    checkpoint.release()
+
+    reopened = TaskCheckpoint("units-and-plans")
+    assert reopened.units == {"u0", "u1", "u2"}
+    assert reopened.plan("p0", lambda: ["changed"]) == ["a", "b"]
+    assert reopened.get("u1").shape == (10,)
+
+
+def test_torn_plan_record_is_skipped():
+    checkpoint = new_checkpoint("torn-plan")
+    checkpoint.plan("p0", lambda: ["a"])
+    with open(checkpoint.plans_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "p1", "pie')  # crash mid-append
+    reopened = TaskCheckpoint("torn-plan")
+    assert list(reopened.plans) == ["p0"]
+    reopened.plan("p2", lambda: ["c"])
+    assert TaskCheckpoint("torn-plan").plans == {"p0": ["a"], "p2": ["c"]}
+    checkpoint.release()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_MIN_CHARS", 0)
+    with TestClient(app) as client:
+        yield client
+
+
+def slow_engine(monkeypatch, seconds):
+    monkeypatch.setattr(routes.voice_service.service.model, "latency_sec", seconds)
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_cancel_keeps_the_claim_until_the_job_stops(client, monkeypatch):
+    slow_engine(monkeypatch, 0.05)
+    task_id = client.post("/api/generate", json={"text": LONG_TEXT, "voice_id": "stub-female"}).json()["task_id"]
+    wait_until(lambda: routes.tasks[task_id]["status"].value == "processing")
+
+    client.delete(f"/api/tasks/{task_id}")
+    # The job is still unwinding to its next checkpoint and holds the task
+    assert task_id in checkpoint_service._claims
+    wait_until(lambda: task_id not in checkpoint_service._claims)
+    assert TaskCheckpoint(task_id).task()["state"] == STATE_CANCELLED
+
+
+def test_resume_attached_to_a_running_job_releases_its_claim(client, monkeypatch):
+    body = {"text": LONG_TEXT, "voice_id": "stub-female"}
+    slow_engine(monkeypatch, 0.05)
+    first = client.post("/api/generate", json=body).json()["task_id"]
+    client.delete(f"/api/tasks/{first}")
+    wait_until(lambda: first not in checkpoint_service._claims)
+
+    second = client.post("/api/generate", json=body).json()["task_id"]
+    resumed = client.post(f"/api/tasks/{first}/resume").json()
+    assert resumed["job_id"] == second
+    assert first not in checkpoint_service._claims
+    client.delete(f"/api/tasks/{first}")
+    client.delete(f"/api/tasks/{second}")
+    wait_until(lambda: second not in checkpoint_service._claims)
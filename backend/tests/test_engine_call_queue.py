@@ -0,0 +1,37 @@
+import threading
+import time
+
+import pytest
+
+from app.services.engine_call_queue import EngineCallQueue, create_call_queue
+
+
+def test_disabled_queue_is_none():
+    assert create_call_queue(False, 5.0) is None
+
+
+def test_calls_in_one_window_run_grouped_by_voice():
+    call_queue = EngineCallQueue(window_ms=300)
+    order, infos = [], {}
+
+    def submit(name, key):
+        _, infos[name] = call_queue.submit(key, lambda: order.append(name))
+
+    threads = []
+    for name, key in (("a1", "voice-a"), ("b1", "voice-b"), ("a2", "voice-a")):
+        threads.append(threading.Thread(target=submit, args=(name, key)))
+        threads[-1].start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["a1", "a2", "b1"]
+    assert infos["a2"]["queue_same_voice_calls"] == 2
+    stats = call_queue.stats()
+    assert stats["calls"] == 3 and stats["same_voice_runs"] == 1
+
+
+def test_errors_reach_the_caller():
+    call_queue = EngineCallQueue(window_ms=0)
+    with pytest.raises(ZeroDivisionError):
+        call_queue.submit("voice", lambda: 1 / 0)
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.main import app
+from app.services.generation_scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    GenerationCancelled,
+    GenerationScheduler,
+    checkpoint,
+)
+
+
+def wait_for_status(client, task_id, statuses=("completed", "failed", "cancelled")):
+    for _ in range(200):
+        task = client.get(f"/api/tasks/{task_id}").json()
+        if task["status"] in statuses:
+            return task
+        time.sleep(0.02)
+    raise AssertionError(f"task {task_id} still {task['status']}")
+
+
+def test_failing_initializer_still_runs_the_job():
+    def initializer():
+        raise RuntimeError("no cores")
+
+    scheduler = GenerationScheduler(workers=1, initializer=initializer)
+    ran = threading.Event()
+    scheduler.submit(ran.set)
+    assert ran.wait(5)
+
+
+def test_failing_initializer_settles_the_task(monkeypatch):
+    def initializer():
+        raise RuntimeError("no cores")
+
+    monkeypatch.setattr(routes.generation_scheduler, "initializer", initializer)
+    client = TestClient(app)
+    response = client.post("/api/generate", json={"text": "Speaker 0: Hello there.", "voice_id": "stub-female"})
+    task = wait_for_status(client, response.json()["task_id"])
+    assert task["status"] == "completed"
+    assert routes.generation_jobs.stats()["in_flight"] == 0
+
+
+def test_batch_job_yields_its_slot_at_a_checkpoint():
+    scheduler = GenerationScheduler(workers=1)
+    order, batch_started, done = [], threading.Event(), threading.Event()
+
+    def batch():
+        batch_started.set()
+        order.append("batch start")
+        while "interactive" not in order:
+            checkpoint()  # hands the slot over once the interactive job is queued
+            time.sleep(0.005)
+        order.append("batch end")
+        done.set()
+
+    scheduler.submit(batch, priority=PRIORITY_BATCH)
+    assert batch_started.wait(5)
+    scheduler.submit(lambda: order.append("interactive"), priority=PRIORITY_INTERACTIVE)
+    assert done.wait(5)
+    assert order == ["batch start", "interactive", "batch end"]
+    assert scheduler.stats()["preemptions"] == 1
+
+
+def test_cancelled_jobs_stop_at_a_checkpoint_or_never_start():
+    scheduler = GenerationScheduler(workers=1)
+    started, stopped, queued_ran = threading.Event(), threading.Event(), threading.Event()
+
+    def running():
+        started.set()
+        try:
+            while True:
+                checkpoint()
+                time.sleep(0.005)
+        except GenerationCancelled:
+            stopped.set()
+            raise
+
+    scheduler.submit(running, job_id="running")
+    assert started.wait(5)
+    queued = scheduler.submit(queued_ran.set, job_id="queued")
+    assert not scheduler.cancel("queued").started
+    assert scheduler.cancel("running").started
+    assert stopped.wait(5)
+    time.sleep(0.05)
+    assert not queued_ran.is_set() and not queued.started
+    assert scheduler.stats()["running"] == 0
+
+
+def test_failed_job_frees_its_slot():
+    scheduler = GenerationScheduler(workers=1)
+    ran = threading.Event()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler.submit(fail)
+    scheduler.submit(ran.set)
+    assert ran.wait(5)
+
+
+def generate(client, text):
+    return client.post("/api/generate", json={"text": text, "voice_id": "stub-female"}).json()
+
+
+def test_cancelling_the_last_shared_task_stops_the_job(monkeypatch):
+    monkeypatch.setattr(routes.voice_service.service.model, "latency_sec", 0.05)
+    client = TestClient(app)
+    text = "Speaker 0: " + "A sentence that keeps the shared job busy. " * 6
+    cancelled = routes.generation_scheduler.stats()["cancelled"]
+    first, second = generate(client, text), generate(client, text)
+    assert second["job_id"] == first["task_id"] and second["ref_count"] == 2
+
+    client.delete(f"/api/tasks/{first['task_id']}")
+    assert routes.tasks[second["task_id"]]["ref_count"] == 1
+    # The job only stops when no task is left on it
+    assert routes.generation_scheduler.stats()["cancelled"] == cancelled
+
+    client.delete(f"/api/tasks/{second['task_id']}")
+    assert wait_for_status(client, second["task_id"])["status"] == "cancelled"
+    for _ in range(200):
+        if routes.generation_scheduler.stats()["running"] == 0:
+            break
+        time.sleep(0.02)
+    assert routes.generation_scheduler.stats()["running"] == 0
+    assert routes.generation_jobs.stats()["in_flight"] == 0
+
+
+def test_failed_job_is_closed_to_later_requests(monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError("engine exploded")
+
+    monkeypatch.setattr(routes.voice_service, "generate_speech", fail)
+    client = TestClient(app)
+    failed = generate(client, "Speaker 0: Failing request.")
+    task = wait_for_status(client, failed["task_id"])
+    assert task["status"] == "failed" and "engine exploded" in task["error"]
+    assert routes.generation_jobs.stats()["in_flight"] == 0
+
+    monkeypatch.undo()
+    retry = generate(client, "Speaker 0: Failing request.")
+    assert retry["job_id"] == retry["task_id"]
+    assert wait_for_status(client, retry["task_id"])["status"] == "completed"
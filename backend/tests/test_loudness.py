@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from app.services.loudness import LoudnessMeter, LoudnessNormalizer
+
+SR = 24000
+
+
+def tone(seconds: float, amplitude: float, freq: float = 440.0) -> np.ndarray:
+    t = np.arange(int(seconds * SR)) / SR
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def measure(audio: np.ndarray) -> float:
+    meter = LoudnessMeter(SR)
+    meter.add(audio)
+    return meter.integrated()
+
+
+def test_output_length_matches_input_across_chunks():
+    normalizer = LoudnessNormalizer(SR, target_lufs=-16.0)
+    chunks = [tone(0.37, 0.1), tone(1.1, 0.3), tone(0.05, 0.2)]
+    out = [normalizer.process(chunk) for chunk in chunks] + [normalizer.flush()]
+    assert sum(o.size for o in out) == sum(c.size for c in chunks)
+
+
+def test_peak_stays_under_ceiling():
+    # A quiet tone with loud spikes: levelling it up pushes the spikes over the ceiling
+    audio = tone(3.0, 0.05)
+    audio[SR::SR // 2] = 0.9
+    out = LoudnessNormalizer(SR, target_lufs=-10.0, true_peak_db=-1.0).normalize(audio)
+    assert np.abs(out).max() <= 10 ** (-1.0 / 20) + 1e-4
+
+
+@pytest.mark.parametrize("amplitude", [0.02, 0.5])
+def test_converges_to_target_loudness(amplitude):
+    normalizer = LoudnessNormalizer(SR, target_lufs=-18.0, true_peak_db=0.0)
+    audio = tone(4.0, amplitude)
+    out = np.concatenate(
+        [normalizer.process(audio[i : i + SR // 2]) for i in range(0, audio.size, SR // 2)]
+        + [normalizer.flush()]
+    )
+    # The first chunks are levelled on little history; judge the settled second half
+    assert measure(out[out.size // 2 :]) == pytest.approx(-18.0, abs=0.5)
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+import app.services.voice_engine_service as voice_engine_service
+from app.services.model_registry import ModelRegistry, UnknownModelError
+from app.services.model_residency import IdleUnloader
+from app.services.stub_engine_service import StubLyrebirdService
+
+
+@pytest.fixture(autouse=True)
+def model_size(monkeypatch):
+    # The stub model has no weights to measure
+    monkeypatch.setattr(voice_engine_service, "model_footprint_mb", lambda model: 100.0)
+
+
+def registry(budget_mb, peaks):
+    def factory(**kwargs):
+        peaks.append(sum(e.memory_mb() for e in models._engines.values()))
+        return StubLyrebirdService(**kwargs)
+
+    models = ModelRegistry(
+        factory, {name: f"/models/{name}" for name in "abc"}, budget_mb=budget_mb,
+        model_sizes_mb={name: 100.0 for name in "abc"},
+    )
+    return models
+
+
+def resident(models):
+    return sorted(name for name, e in models._engines.items() if e.model is not None)
+
+
+def test_least_recently_used_is_evicted_before_a_new_model_loads():
+    peaks = []
+    models = registry(250, peaks)
+    for name in "ab":
+        with models.use(name):
+            pass
+    with models.use("a"):  # b is now the least recently used
+        pass
+    with models.use("c"):
+        assert resident(models) == ["a", "c"]
+    # Room was made before each construction: at most one other model resident when c loaded
+    assert max(peaks) <= 150
+    assert models.evictions["b"] == 1
+
+
+def test_room_is_made_before_a_reload():
+    models = registry(250, [])
+    for name in "abc":
+        with models.use(name):
+            pass
+    assert resident(models) == ["b", "c"]
+
+    reloads = []
+    engine_a = models._engines["a"]
+    load = engine_a._load_model
+    engine_a._load_model = lambda: (reloads.append(resident(models)), load())
+    with models.use("a"):
+        pass
+    assert reloads == [["c"]]
+    assert models.describe()["resident_mb"] <= 250
+
+
+def test_model_in_use_is_not_evicted():
+    models = registry(150, [])
+    with models.use("a"):
+        with models.use("b"):
+            assert resident(models) == ["a", "b"]
+    assert models.evictions["a"] == 0
+    with models.use("c"):
+        assert resident(models) == ["c"]
+
+
+def test_unknown_model():
+    with pytest.raises(UnknownModelError):
+        registry(0, []).get("nope")
+
+
+def test_idle_engine_unloads_and_reloads_on_use():
+    engine = StubLyrebirdService()
+    unloader = IdleUnloader(engine, idle_sec=0.05).start()
+    try:
+        deadline = time.monotonic() + 5
+        while engine.model is not None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert engine.describe_residency()["state"] == "unloaded"
+    finally:
+        unloader.stop()
+    with engine.model_in_use():
+        assert engine.model is not None
+    assert engine.loads == 2
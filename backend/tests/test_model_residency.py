@@ -0,0 +1,63 @@
+import threading
+import time
+
+from app.services.stub_engine_service import StubLyrebirdService
+
+
+def unloaded_engine_with_slow_load():
+    engine = StubLyrebirdService()
+    assert engine.unload("test")
+    entered, release = threading.Event(), threading.Event()
+    load = engine._load_model
+
+    def slow_load():
+        entered.set()
+        release.wait(5)
+        load()
+
+    engine._load_model = slow_load
+    return engine, entered, release
+
+
+def use(engine, done):
+    with engine.model_in_use():
+        done.append(engine.model is not None)
+
+
+def test_reload_does_not_block_status_reads():
+    engine, entered, release = unloaded_engine_with_slow_load()
+    done = []
+    threads = [threading.Thread(target=use, args=(engine, done)) for _ in range(2)]
+    threads[0].start()
+    assert entered.wait(5)
+    threads[1].start()
+
+    started = time.perf_counter()
+    assert engine.describe_residency()["state"] == "loading"
+    engine.describe_metrics()
+    assert time.perf_counter() - started < 0.5
+    # The second request waits for the reload instead of starting its own
+    time.sleep(0.05)
+    assert done == []
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert done == [True, True]
+    assert engine.loads == 2
+    assert engine.describe_residency()["state"] == "loaded"
+
+
+def test_unload_refused_while_loading_or_in_use():
+    engine, entered, release = unloaded_engine_with_slow_load()
+    thread = threading.Thread(target=use, args=(engine, []))
+    thread.start()
+    assert entered.wait(5)
+    assert not engine.unload("test")
+    release.set()
+    thread.join(5)
+
+    with engine.model_in_use():
+        assert not engine.unload("test")
+    assert engine.unload("test")
+    assert engine.describe_residency()["state"] == "unloaded"
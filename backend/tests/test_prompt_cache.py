@@ -0,0 +1,37 @@
+import pytest
+
+from app.models.voice_model import VoiceProfile, VoiceType
+from app.services.prompt_cache import PromptCache
+from app.services.stub_engine_service import StubCosyVoiceModel, StubLyrebirdService
+
+
+def synthesize(model, spk_id):
+    return list(model.inference_instruct2("Hello there.", "Speak calmly.", "clip.wav", zero_shot_spk_id=spk_id))
+
+
+def test_stub_mutates_a_shared_entry_like_upstream():
+    model = StubCosyVoiceModel(sample_rate=24000, latency_sec=0, rtf=0)
+    model.add_zero_shot_spk("Speak calmly.", "clip.wav", "spk")
+    synthesize(model, "spk")
+    with pytest.raises(KeyError):
+        synthesize(model, "spk")
+
+
+def test_consecutive_cached_calls():
+    model = StubCosyVoiceModel(sample_rate=24000, latency_sec=0, rtf=0)
+    cache = PromptCache(model, max_bytes=10**9)
+    for _ in range(2):
+        with cache.acquire("clip.wav", "Speak calmly.") as spk_id:
+            assert spk_id is not None
+            assert synthesize(model, spk_id)
+    assert cache.stats()["hits"] == 1
+    assert "llm_prompt_speech_token" in model.frontend.spk2info.get(spk_id)
+
+
+def test_engine_reuses_the_cached_prompt():
+    engine = StubLyrebirdService()
+    profile = VoiceProfile(id="v", name="v", type=VoiceType.UPLOADED, file_path="clip.wav")
+    first = engine._call_model("Hello there.", "Speak calmly.", profile, 1.0)
+    second = engine._call_model("Hello there.", "Speak calmly.", profile, 1.0)
+    assert (first[0]["tts_speech"] == second[0]["tts_speech"]).all()
+    assert engine.prompt_cache.stats()["hits"] == 1
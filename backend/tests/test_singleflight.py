@@ -0,0 +1,54 @@
+from app.models.voice_model import TaskStatus
+from app.services.singleflight import SingleFlight
+
+
+def new_tasks(*task_ids):
+    return {
+        task_id: {"task_id": task_id, "status": TaskStatus.PENDING, "result": None, "error": None}
+        for task_id in task_ids
+    }
+
+
+def test_identical_requests_share_one_job():
+    tasks = new_tasks("a", "b")
+    jobs = SingleFlight(tasks)
+    job, created = jobs.attach("fp", "a")
+    assert created
+    same, created = jobs.attach("fp", "b")
+    assert same is job and not created
+    assert tasks["a"]["ref_count"] == tasks["b"]["ref_count"] == 2
+    assert tasks["b"]["job_id"] == "a"
+
+    jobs.update("a", status=TaskStatus.PROCESSING)
+    assert tasks["b"]["status"] == TaskStatus.PROCESSING
+    assert jobs.stats() == {"in_flight": 1, "coalesced": 1}
+
+
+def test_detach_counts_down_and_closes_with_the_last_task():
+    tasks = new_tasks("a", "b", "c")
+    jobs = SingleFlight(tasks)
+    jobs.attach("fp", "a")
+    jobs.attach("fp", "b")
+
+    assert jobs.detach("a", status=TaskStatus.CANCELLED) == 1
+    assert tasks["a"]["status"] == TaskStatus.CANCELLED and tasks["a"]["ref_count"] == 0
+    assert tasks["b"]["ref_count"] == 1
+    # Updates no longer reach the detached task
+    jobs.update("a", status=TaskStatus.PROCESSING)
+    assert tasks["a"]["status"] == TaskStatus.CANCELLED
+
+    assert jobs.detach("b", status=TaskStatus.CANCELLED) == 0
+    assert jobs.finish("a") is None
+    # A later identical request starts a fresh job
+    assert jobs.attach("fp", "c") == (jobs._jobs["c"], True)
+
+
+def test_finished_job_takes_no_more_tasks():
+    tasks = new_tasks("a", "b")
+    jobs = SingleFlight(tasks)
+    jobs.attach("fp", "a")
+    jobs.update("a", status=TaskStatus.FAILED, error="boom")
+    assert jobs.finish("a")["status"] == TaskStatus.FAILED
+    _, created = jobs.attach("fp", "b")
+    assert created
+    assert tasks["b"]["status"] == TaskStatus.PENDING
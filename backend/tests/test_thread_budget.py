@@ -0,0 +1,79 @@
+import threading
+import time
+
+from app.config import settings
+from app.services.generation_scheduler import GenerationScheduler
+from app.services.thread_budget import ThreadBudget, WorkerSlot
+
+
+def budget_with_slots(n):
+    budget = ThreadBudget()
+    budget.slots = [WorkerSlot(i, 0, [0], 1) for i in range(n)]
+    return budget
+
+
+def test_slots_are_handed_back(monkeypatch):
+    monkeypatch.setattr(settings, "ENGINE_PIN_CPUS", False)
+    budget = budget_with_slots(2)
+    scheduler = GenerationScheduler(
+        workers=2, initializer=budget.pin_current_thread, finalizer=budget.release_current_thread
+    )
+    both_running = threading.Barrier(3, timeout=5)
+    taken = []
+
+    def job():
+        taken.append(budget._held[threading.get_ident()].index)
+        both_running.wait()
+
+    done = [threading.Event() for _ in range(6)]
+    for round_ in range(3):
+        for i in range(2):
+            event = done[round_ * 2 + i]
+            scheduler.submit(lambda e=event: (job(), e.set()))
+        both_running.wait()
+        for event in done[round_ * 2:round_ * 2 + 2]:
+            assert event.wait(5)
+    # Every pair of concurrent jobs got distinct slots, round after round
+    assert [sorted(taken[i:i + 2]) for i in range(0, 6, 2)] == [[0, 1]] * 3
+
+
+def test_preempted_job_hands_its_slot_over(monkeypatch):
+    monkeypatch.setattr(settings, "ENGINE_PIN_CPUS", False)
+    budget = budget_with_slots(1)
+    scheduler = GenerationScheduler(
+        workers=1, initializer=budget.pin_current_thread, finalizer=budget.release_current_thread
+    )
+    started, urgent_ran, batch_done = threading.Event(), threading.Event(), threading.Event()
+    holders = {}
+
+    def batch():
+        started.set()
+        while not scheduler.stats()["queued"]:
+            time.sleep(0.001)
+        scheduler.checkpoint(job)  # yields to the interactive job
+        holders["batch_after"] = list(budget.slots[0].threads)
+        batch_done.set()
+
+    def interactive():
+        holders["interactive"] = list(budget.slots[0].threads)
+        urgent_ran.set()
+
+    job = scheduler.submit(batch, priority=1)
+    assert started.wait(5)
+    scheduler.submit(interactive, priority=0)
+    assert urgent_ran.wait(5) and batch_done.wait(5)
+    # Only the running job held the slot each time
+    assert len(holders["interactive"]) == 1
+    assert len(holders["batch_after"]) == 1
+    assert holders["interactive"] != holders["batch_after"]
+
+
+def test_release_is_idempotent(monkeypatch):
+    monkeypatch.setattr(settings, "ENGINE_PIN_CPUS", False)
+    budget = budget_with_slots(1)
+    slot = budget.pin_current_thread()
+    assert budget.pin_current_thread() is slot
+    assert slot.threads == [threading.current_thread().name]
+    budget.release_current_thread()
+    budget.release_current_thread()
+    assert slot.threads == []
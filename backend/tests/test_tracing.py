@@ -0,0 +1,20 @@
+import json
+
+import numpy as np
+
+from app.tracing import _json_default, _otlp_value
+
+
+def test_numpy_scalars_keep_their_otlp_type():
+    assert _otlp_value(np.int64(3)) == {"intValue": "3"}
+    assert _otlp_value(np.float32(0.5)) == {"doubleValue": 0.5}
+    assert _otlp_value(np.bool_(True)) == {"boolValue": True}
+    assert _otlp_value(7) == {"intValue": "7"}
+    assert _otlp_value("cpu") == {"stringValue": "cpu"}
+
+
+def test_slow_task_records_serialise_numpy_scalars():
+    record = {"rtf": np.float32(0.25), "units": np.int64(4), "shape": np.zeros(2)}
+    assert json.loads(json.dumps(record, default=_json_default)) == {
+        "rtf": 0.25, "units": 4, "shape": "[0. 0.]",
+    }
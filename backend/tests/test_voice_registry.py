@@ -0,0 +1,56 @@
+import threading
+
+from app.models import VoiceProfile, VoiceType
+from app.services.voice_registry import VoiceRegistry
+
+
+def local(voice_id, name=None):
+    return VoiceProfile(id=voice_id, name=name or voice_id, type=VoiceType.UPLOADED, file_path=f"/{voice_id}.wav")
+
+
+def preset(voice_id, name=None):
+    return VoiceProfile(id=voice_id, name=name or voice_id, type=VoiceType.PRESET, file_path="")
+
+
+def test_processes_sharing_a_manifest_keep_each_others_voices(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    first, second = VoiceRegistry(manifest), VoiceRegistry(manifest)
+
+    def add_many(registry, prefix):
+        for i in range(20):
+            registry.add(local(f"{prefix}{i}"), content_hash=f"{prefix}{i}")
+
+    threads = [threading.Thread(target=add_many, args=(r, p)) for r, p in ((first, "a"), (second, "b"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(VoiceRegistry(manifest).all()) == 40
+    # A miss re-reads what the other process saved
+    assert first.get("b7") is not None
+    assert second.find_by_hash("a3").id == "a3"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_removal_in_one_process_is_seen_by_another(tmp_path):
+    manifest = tmp_path / "manifest.json"
+    first, second = VoiceRegistry(manifest), VoiceRegistry(manifest)
+    first.add(local("v1"))
+    first.add(local("v2"))
+    assert {v.id for v in second.all()} == {"v1", "v2"}
+    second.remove("v1")
+    assert [v.id for v in first.all()] == ["v2"]
+
+
+def test_local_voice_wins_over_a_preset_with_the_same_id(tmp_path):
+    registry = VoiceRegistry(tmp_path / "manifest.json")
+    registry.add(local("narrator"))
+    registry.set_presets([preset("narrator"), preset("stub-female", name="Anna")])
+    assert registry.get("narrator").type == VoiceType.UPLOADED
+
+    registry.add(local("mine", name="Anna"))
+    assert registry.resolve("Anna").id == "mine"
+
+    registry.remove("narrator")
+    assert registry.get("narrator").type == VoiceType.PRESET
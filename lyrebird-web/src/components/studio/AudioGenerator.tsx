@@ -78,7 +78,7 @@ export default function AudioGenerator({ hostId, guestId, scriptLines, onAudioGe
                             } else {
                                 alert("Generation completed but no audio URL found.");
                             }
-                        } else if (statusRes.status === "failed") {
+                        } else if (statusRes.status === "failed" || statusRes.status === "cancelled") {
                             clearInterval(pollInterval);
                             setGenerating(false);
                             setStatusMsg("");